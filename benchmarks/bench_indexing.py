@@ -0,0 +1,57 @@
+"""
+Measures the time to index a large log file with an increasing number of worker processes.
+
+The log file is generated by replicating the example log file up to the requested size:
+
+    $ python benchmarks/bench_indexing.py --size 2048 --workers 1 2 4 8
+"""
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from textualog.index import LineIndex
+
+HERE = Path(__file__).parent
+EXAMPLE_LOG = HERE.parent / "examples/general.log"
+
+
+def generate_log(filename: Path, size: int):
+    """Writes a log file of at least `size` bytes by replicating the example log file."""
+    data = EXAMPLE_LOG.read_bytes()
+    with filename.open('wb') as fd:
+        for _ in range(size // len(data) + 1):
+            fd.write(data)
+
+
+def bench(filename: Path, workers: int) -> float:
+    """Returns the time in seconds to index the complete log file."""
+    index = LineIndex(str(filename), workers=workers)
+    start = time.perf_counter()
+    index.load()
+    elapsed = time.perf_counter() - start
+    index.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=1024, help="the size of the log file in MB")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = Path(tmpdir) / "general.log"
+        generate_log(filename, args.size * 1024 * 1024)
+        print(f"Indexing {filename.stat().st_size / 1024 / 1024:.0f} MB on {os.cpu_count()} cores")
+
+        baseline = None
+        for workers in sorted(set(args.workers)):
+            elapsed = bench(filename, workers)
+            baseline = baseline or elapsed
+            print(f"  {workers:3d} workers: {elapsed:7.2f}s  speedup {baseline / elapsed:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
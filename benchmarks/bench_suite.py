@@ -0,0 +1,292 @@
+"""
+Measures the hot paths of the viewer on synthetic log files and reports the results as JSON.
+
+The log files are written with `setup_logging()`, i.e. in the `LOG_FORMAT_KEY_VALUE` format of a
+real application, with records from a number of loggers at all levels and a Traceback attached to
+a configurable fraction of the records. The creation times are synthetic, so the log files are
+reproducible. Writing a log file through the logging module takes about a second per MB, so a
+generated log file is kept in the data directory and reused by the next runs.
+
+For every log file size, the suite measures:
+
+    load             indexing the complete log file
+    process          reading a page of records, parsed cold, the mean of a page at the start, the
+                     middle and the end of the log file
+    level_toggle     switching the ERROR level off and on again in the Records panel
+    follow_tick      indexing and showing records that were appended to the log file
+    search_rare      searching a text that is in few records
+    search_common    searching a text that is in most records
+    histogram        counting the records per level in time buckets for the Activity panel
+    render_cold      rendering a page of the Records panel, nothing cached
+    render_warm      rendering the same page again
+
+Each measurement reports the best time in seconds of a number of repeats and the peak memory in
+bytes that was allocated during one more run, traced with tracemalloc. The memory mapped log file
+is not included in the peak memory, the index is.
+
+    $ python benchmarks/bench_suite.py --sizes 10 100 1024 --traceback-density 0.01 --output results.json
+"""
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable
+from typing import Dict
+from typing import Optional
+
+from textualog import __version__
+from textualog.loader import KeyValueLoader
+from textualog.log import setup_logging
+from textualog.widgets.records import Records
+
+LOGGERS = [
+    "egse.system", "egse.setup", "egse.settings", "egse.dsi.esl", "egse.dsi.spw",
+    "egse.fee.n_fee_hk", "egse.hexapod.symetrie", "egse.powermeter.thorlabs", "egse.confman", "root",
+]
+"""The loggers of the synthetic records, the namespaces of the log file."""
+LEVELS = [logging.DEBUG] * 50 + [logging.INFO] * 40 + [logging.WARNING] * 6 + [logging.ERROR] * 3 + [logging.CRITICAL]
+"""The distribution of the levels of the synthetic records."""
+MESSAGES = [
+    "Housekeeping telemetry received",
+    "Command {} sent to the device",
+    "Connection to {} established",
+    "Setup {} loaded from the configuration manager",
+    "Temperature {} out of range, retrying",
+    "Unable to open file {}, the file is locked",
+]
+RARE_TEXT = "RareNeedle"
+"""A text that is in one of every 10000 records."""
+COMMON_TEXT = "MainProcess"
+"""A text that is in every record."""
+PAGE_SIZE = 50
+"""The number of records in a page of the Records panel."""
+FOLLOW_RECORDS = 100
+"""The number of records that are appended to the log file for a follow tick."""
+
+
+class EnabledLevels:
+    """The logging levels that are switched on, like the Levels panel."""
+
+    def __init__(self):
+        self.off = set()
+
+    def is_on(self, level: int) -> bool:
+        return level not in self.off
+
+
+def generate_log(filename: Path, size: int, traceback_density: float, seed: int = 0):
+    """
+    Writes a log file of at least `size` bytes with `setup_logging()`. The records are created
+    10 ms apart on average, a fraction `traceback_density` of the records has a Traceback.
+    """
+    rng = random.Random(seed)
+    clock = [1649408400.0]  # 2022-04-08 10:00:00 UTC
+
+    default_factory = logging.getLogRecordFactory()
+
+    def record_factory(*args, **kwargs):
+        record = default_factory(*args, **kwargs)
+        clock[0] += rng.expovariate(100.0)
+        record.created = clock[0]
+        record.msecs = (clock[0] % 1) * 1000
+        return record
+
+    try:
+        raise FileNotFoundError("The file no-name.txt doesn't exist")
+    except FileNotFoundError:
+        exc_info = sys.exc_info()
+
+    root = logging.getLogger()
+    handlers = list(root.handlers)
+    setup_logging(str(filename))
+    handler = root.handlers[-1]
+    loggers = [logging.getLogger(name) for name in LOGGERS]
+    logging.setLogRecordFactory(record_factory)
+    try:
+        nr_records = 0
+        while nr_records % 10000 or handler.stream.tell() < size:
+            message = rng.choice(MESSAGES).format(rng.randrange(1000))
+            if nr_records % 10000 == 5000:
+                message = f"{message} {RARE_TEXT}"
+            loggers[rng.randrange(len(loggers))].log(
+                rng.choice(LEVELS), message, exc_info=exc_info if rng.random() < traceback_density else None,
+            )
+            nr_records += 1
+    finally:
+        logging.setLogRecordFactory(default_factory)
+        root.removeHandler(handler)
+        handler.close()
+        root.handlers[:] = handlers
+
+
+def measure(func: Callable[[], None], repeat: int, setup: Optional[Callable[[], None]] = None) -> Dict[str, float]:
+    """
+    Returns the best time in seconds of `repeat` calls of the function and the peak memory in
+    bytes that was allocated during one more call. The setup is called before each call.
+    """
+    best = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    if setup is not None:
+        setup()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {"seconds": best, "peak_bytes": peak}
+
+
+def bench_log(filename: Path, repeat: int, workers: int) -> Dict[str, Dict[str, float]]:
+    """Runs the benchmarks on one log file, the log file is restored afterwards."""
+    results = {}
+    state = {}
+
+    def new_loader():
+        state["loader"] = KeyValueLoader(str(filename), workers=workers)
+
+    results["load"] = measure(lambda: state["loader"].load(), repeat, setup=new_loader)
+    loader = state["loader"]
+    size = loader.size()
+
+    def process_pages():
+        for start in (0, size // 2, size - 1):
+            loader.cache.clear()
+            loader.process(start, PAGE_SIZE)
+
+    results["process"] = measure(process_pages, repeat)
+    results["process"]["seconds"] /= 3
+
+    levels = EnabledLevels()
+    records = Records(height=PAGE_SIZE + 2)
+    records.attach(loader, levels)
+    records.show(size // 2)
+
+    def toggle_levels():
+        for off in ({logging.ERROR}, set()):
+            levels.off = off
+            records.show(records.top_line)
+            assert records.records
+
+    results["level_toggle"] = measure(toggle_levels, repeat)
+
+    for name, text in (("search_rare", RARE_TEXT), ("search_common", COMMON_TEXT)):
+        def search(text=text):
+            found = loader.search(text)
+            while not found.is_done():
+                found.run()
+
+        results[name] = measure(search, repeat)
+
+    def histogram():
+        loader._histogram.reset()
+        loader.histogram()
+
+    results["histogram"] = measure(histogram, repeat)
+
+    def render_cold():
+        records._lines.clear()
+        loader.cache.clear()
+        records._generate_renderable()
+
+    results["render_cold"] = measure(render_cold, repeat)
+    results["render_warm"] = measure(records._generate_renderable, repeat)
+
+    # Following appends records to the log file, the original content is restored afterwards
+
+    original_size = filename.stat().st_size
+    lines = loader.lines.text(loader.line_of_record(max(loader.record_count() - FOLLOW_RECORDS, 0)), size)
+    records.scroll_to_end()
+
+    def append():
+        with filename.open('a') as fd:
+            fd.write(lines)
+
+    def follow_tick():
+        loader.load()
+        records.scroll_to_end()
+        assert records.records
+        loader.histogram()
+
+    try:
+        results["follow_tick"] = measure(follow_tick, repeat, setup=append)
+    finally:
+        loader.lines.close()
+        os.truncate(filename, original_size)
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1024],
+                        help="the sizes of the log files in MB")
+    parser.add_argument("--traceback-density", type=float, default=0.01,
+                        help="the fraction of the records that have a Traceback")
+    parser.add_argument("--repeat", type=int, default=3, help="the number of runs of each benchmark, the best is kept")
+    parser.add_argument("--workers", type=int, default=1, help="the number of processes to index the log files")
+    parser.add_argument("--data-dir", type=Path, default=Path(tempfile.gettempdir()) / "textualog-bench",
+                        help="the directory where the generated log files are kept")
+    parser.add_argument("--output", "-o", type=Path, help="write the results to this file instead of stdout")
+    args = parser.parse_args()
+
+    args.data_dir.mkdir(parents=True, exist_ok=True)
+
+    report = {
+        "textualog": __version__.__version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "repeat": args.repeat,
+        "workers": args.workers,
+        "traceback_density": args.traceback_density,
+        "logs": [],
+    }
+
+    for size in args.sizes:
+        filename = args.data_dir / f"general-{size}MB-{args.traceback_density:g}.log"
+        if not filename.exists():
+            print(f"Generating {filename}", file=sys.stderr)
+            tmp_filename = filename.with_suffix(".tmp")
+            generate_log(tmp_filename, size * 1024 * 1024, args.traceback_density)
+            tmp_filename.replace(filename)
+
+        print(f"Benchmarking {filename}", file=sys.stderr)
+        loader = KeyValueLoader(str(filename))
+        loader.load()
+        report["logs"].append({
+            "size_mb": size,
+            "bytes": filename.stat().st_size,
+            "lines": loader.size(),
+            "records": loader.record_count(),
+            "results": bench_log(filename, args.repeat, args.workers),
+        })
+        loader.lines.close()
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
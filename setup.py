@@ -133,6 +133,7 @@ setup(
     package_data={"": ["textualog.png", "examples/*.log"]},
     include_package_data=True,
     install_requires=["rich", "textual"],
+    extras_require={"zstd": ["zstandard"]},
     entry_points={
         "console_scripts": [
             "textualog=textualog.__main__:main",
@@ -0,0 +1,131 @@
+import logging
+
+from textualog import histogram as histogram_module
+from textualog.histogram import TimeHistogram
+from textualog.loader import KeyValueLoader
+from textualog.merged import MergedLoader
+from textualog.renderables.activity import activity_chart
+from textualog.renderables.activity import sparkline
+from textualog.renderables.logrecord import to_timestamp
+
+from test_loader import LINES
+from test_loader import write_log
+from test_merged import record
+from test_merged import write_logs
+
+
+def totals(histogram):
+    return {level: sum(buckets) for level, buckets in histogram.counts.items() if sum(buckets)}
+
+
+def test_histogram(tmp_path):
+
+    loader = KeyValueLoader(write_log(tmp_path, LINES))
+    loader.load()
+
+    histogram = loader.histogram()
+    assert histogram.width == 1.0
+    assert histogram.start(0) == int(to_timestamp("2022-04-08T10:52:20,371211"))
+    assert len(histogram) == 3
+    assert histogram.counts[logging.DEBUG].tolist() == [1, 0, 0]
+    assert histogram.counts[logging.ERROR].tolist() == [0, 1, 0]
+    assert histogram.counts[logging.INFO].tolist() == [0, 0, 1]
+
+    start, width, counts = histogram.columns(2)
+    assert (start, width) == (histogram.start(0), 2.0)
+    assert counts[logging.ERROR] == [1, 0] and counts[logging.INFO] == [0, 1]
+
+
+def test_histogram_follows_the_log_file(tmp_path, monkeypatch):
+
+    monkeypatch.setattr(histogram_module, "HISTOGRAM_SIZE", 4)
+
+    filename = write_log(tmp_path, [record("10:00:00,000000", "a")])
+    loader = KeyValueLoader(filename)
+    loader.load()
+    assert totals(loader.histogram()) == {logging.INFO: 1}
+
+    # The last line is not complete, its record is counted again when it is
+
+    last = record("10:00:09,000000", "c", "ERROR")
+    with open(filename, 'a') as fd:
+        fd.write(record("10:00:01,000000", "b") + "\n" + last[:9])
+    loader.load()
+    assert totals(loader.histogram()) == {logging.INFO: 2}
+
+    with open(filename, 'a') as fd:
+        fd.write(last[9:] + "\n" + record("10:00:09,500000", "d", "WARNING") + "\n")
+    loader.load()
+
+    # The records span 10 seconds, the buckets are 4 seconds wide to fit in 4 buckets
+
+    histogram = loader.histogram()
+    assert histogram.width == 4.0
+    assert histogram.counts[logging.INFO].tolist() == [2, 0, 0]
+    assert histogram.counts[logging.ERROR].tolist() == [0, 0, 1]
+    assert histogram.counts[logging.WARNING].tolist() == [0, 0, 1]
+
+    # A rotated log file is counted from scratch
+
+    with open(filename, 'w') as fd:
+        fd.write(record("11:00:00,000000", "e", "DEBUG") + "\n")
+    loader.load()
+    assert totals(loader.histogram()) == {logging.DEBUG: 1}
+
+
+def test_histogram_skips_unparsable_timestamps(tmp_path):
+
+    lines = [
+        record("10:00:00,000000", "a", "ERROR").replace("ts=2022-04-08T10:00:00,000000", "ts=garbage"),
+        record("10:00:01,000000", "b"),
+        record("10:00:02,000000", "c", "DEBUG"),
+        record("10:00:02,500000", "d", "WARNING").replace("ts=2022-04-08T10:00:02,500000", "ts=garbage"),
+        record("10:00:03,000000", "e", "ERROR"),
+        record("10:00:04,000000", "f"),
+    ]
+    loader = KeyValueLoader(write_log(tmp_path, lines))
+    loader.load()
+
+    # Only the records with a creation time are counted, the histogram spans their times
+
+    histogram = loader.histogram()
+    assert histogram.start(0) == int(to_timestamp("2022-04-08T10:00:01,000000"))
+    assert len(histogram) == 4
+    assert histogram.counts[logging.INFO].tolist() == [1, 0, 0, 1]
+    assert histogram.counts[logging.DEBUG].tolist() == [0, 1, 0, 0]
+    assert histogram.counts[logging.ERROR].tolist() == [0, 0, 1, 0]
+    assert totals(histogram) == {logging.INFO: 2, logging.DEBUG: 1, logging.ERROR: 1}
+
+
+def test_histogram_doesnt_look_at_records(tmp_path, monkeypatch):
+
+    loader = KeyValueLoader(write_log(tmp_path, LINES * 1000))
+    loader.load()
+
+    monkeypatch.setattr(KeyValueLoader, "_parse_record", None)
+    monkeypatch.setattr(loader.lines.snapshot(), "level_of", lambda rid: None)
+    assert totals(loader.histogram()) == {logging.DEBUG: 1000, logging.ERROR: 1000, logging.INFO: 1000}
+
+
+def test_merged_histogram(tmp_path):
+
+    loader = MergedLoader(write_logs(tmp_path))
+    loader.load()
+
+    histogram = loader.histogram()
+    assert totals(histogram) == {logging.INFO: 4, logging.ERROR: 2}
+    assert histogram.counts[logging.INFO].tolist() == [1, 1, 1, 0, 1, 0]
+    assert histogram.counts[logging.ERROR].tolist() == [0, 0, 1, 0, 0, 1]
+
+    assert len(TimeHistogram.combine([])) == 0
+
+
+def test_activity_chart(tmp_path):
+
+    assert sparkline([0, 1, 50, 100]) == " ▁▄█"
+    assert sparkline([0, 0]) == "  "
+
+    loader = KeyValueLoader(write_log(tmp_path, LINES))
+    loader.load()
+    chart = activity_chart(loader.histogram(), 12).plain.split("\n")
+    assert chart == ["DEBUG    █  ", "INFO       █", "WARNING     ", "ERROR     █ ", "CRITICAL    "]
@@ -0,0 +1,532 @@
+import logging
+import math
+import threading
+from pathlib import Path
+
+import pytest
+
+from textualog.index import LineIndex
+from textualog.index import _index_file_range
+from textualog.index import index_chunk
+from textualog.index import namespace_children
+from textualog.index import namespace_totals
+from textualog.loader import KeyValueLoader
+from textualog.parsers import get_parser
+from textualog.renderables.logrecord import to_timestamp
+
+HERE = Path(__file__).parent
+EXAMPLE_LOG = HERE.parent.parent / "examples/general.log"
+
+LINES = [
+    'level=DEBUG ts=2022-04-08T10:52:20,371211 process=MainProcess process_id=1 caller=egse.system:10 msg="first"',
+    'level=ERROR ts=2022-04-08T10:52:21,000001 process=MainProcess process_id=1 caller=egse.system:20 msg="second"',
+    'Traceback (most recent call last):',
+    '  File "<stdin>", line 1, in <module>',
+    'level=INFO ts=2022-04-08T10:52:22,500000 process=MainProcess process_id=1 caller=egse.setup:30 msg="third"',
+]
+
+
+def write_log(tmp_path, lines, end="\n"):
+    filename = tmp_path / "general.log"
+    filename.write_text("\n".join(lines) + end)
+    return str(filename)
+
+
+def test_line_index(tmp_path):
+
+    index = LineIndex(write_log(tmp_path, LINES))
+    index.load()
+
+    assert len(index) == len(LINES)
+    assert index[0] == LINES[0]
+    assert index[-1] == LINES[-1]
+    assert list(index.iter_lines(2)) == LINES[2:]
+
+
+def test_line_index_without_trailing_newline(tmp_path):
+
+    index = LineIndex(write_log(tmp_path, LINES, end=""))
+    index.load()
+
+    assert len(index) == len(LINES)
+    assert index[len(LINES) - 1] == LINES[-1]
+
+
+def test_line_index_empty_file(tmp_path):
+
+    index = LineIndex(write_log(tmp_path, [], end=""))
+    index.load()
+
+    assert len(index) == 0
+    assert list(index.iter_lines()) == []
+
+
+def test_line_index_example_log():
+
+    index = LineIndex(str(EXAMPLE_LOG))
+    index.load()
+
+    assert list(index.iter_lines()) == EXAMPLE_LOG.read_text().splitlines()
+
+
+def test_process(tmp_path):
+
+    loader = KeyValueLoader(write_log(tmp_path, LINES))
+    loader.load()
+
+    records = loader.get_records(0, 10)
+
+    assert [record.msg for record in records] == ["first", "second", "third"]
+    assert records[1].level == logging.ERROR
+    assert records[1].extra == "\n".join(LINES[2:4])
+
+    records = loader.get_records(3, 10, direction=-1)
+
+    assert loader.offset == 1
+    assert records[0].msg == "second"
+
+
+def test_load_appended_lines(tmp_path):
+
+    filename = write_log(tmp_path, LINES[:2])
+    loader = KeyValueLoader(filename)
+
+    assert loader.load() == 2
+    assert loader.load() == 0
+
+    with open(filename, 'a') as fd:
+        fd.write(LINES[2] + "\n" + LINES[3][:10])
+
+    assert loader.load() == 2
+    assert loader._lines[3] == LINES[3][:10]
+
+    with open(filename, 'a') as fd:
+        fd.write(LINES[3][10:] + "\n" + LINES[4] + "\n")
+
+    assert loader.load() == 2  # the completed line is counted as well
+    assert loader.size() == len(LINES)
+    assert list(loader._lines.iter_lines()) == LINES
+
+
+def test_load_truncated_and_rotated_file(tmp_path):
+
+    filename = write_log(tmp_path, LINES)
+    loader = KeyValueLoader(filename)
+    loader.load()
+
+    Path(filename).write_text(LINES[4] + "\n")
+
+    assert loader.load() == 1
+    assert loader._lines[0] == LINES[4]
+
+    Path(filename).rename(tmp_path / "general.log.1")
+    Path(filename).write_text("\n".join(LINES[:3]) + "\n")
+
+    assert loader.load() == 3
+    assert list(loader._lines.iter_lines()) == LINES[:3]
+
+
+def test_load_while_rotating(tmp_path):
+
+    filename = write_log(tmp_path, LINES)
+    loader = KeyValueLoader(filename)
+    loader.load()
+
+    # Between renaming the log file and creating the new one, the index is kept
+
+    Path(filename).rename(tmp_path / "general.log.1")
+    with pytest.raises(FileNotFoundError):
+        loader.load()
+    assert loader.record_count() == 3
+
+    Path(filename).write_text(LINES[4] + "\n")
+    assert loader.load() == 1
+    assert [record.msg for record in loader.get_records(0, 10)] == ["third"]
+
+
+def test_record_index(tmp_path):
+
+    index = LineIndex(write_log(tmp_path, ["orphan line"] + LINES))
+    index.load()
+
+    assert index.record_count() == 3
+    assert index.record_of_line(0) == -1
+    assert index.record_of_line(1) == 0
+    assert index.record_of_line(4) == 1
+    assert index.record_lines(1) == (2, 5)
+    assert index.record_lines(2) == (5, 6)
+    assert index.text(3, 5) == "\n".join(LINES[2:4])
+
+
+def test_level_index(tmp_path):
+
+    index = LineIndex(write_log(tmp_path, LINES))
+    index.load()
+
+    assert index.level_counts() == {
+        logging.DEBUG: 1, logging.INFO: 1, logging.WARNING: 0, logging.ERROR: 1, logging.CRITICAL: 0
+    }
+    assert index.next_records(0, 2, [logging.INFO, logging.DEBUG]) == [0, 2]
+    assert index.next_records(1, 5, [logging.INFO, logging.DEBUG]) == [2]
+    assert index.previous_records(2, 5, [logging.ERROR, logging.DEBUG]) == [0, 1]
+    assert index.previous_records(2, 1, [logging.INFO]) == []
+
+
+def test_namespace_index(tmp_path):
+
+    lines = LINES + [LINES[0].replace("caller=egse.system:10", "caller=egse.system.tools:5"), "orphan line"]
+    index = LineIndex(write_log(tmp_path, lines + ["level=INFO msg=no caller"]))
+    index.load()
+
+    assert index.namespace_counts() == {"egse.system": 2, "egse.setup": 1, "egse.system.tools": 1, "": 1}
+    assert namespace_totals(index.namespace_counts()) == {
+        "": 5, "egse": 4, "egse.system": 3, "egse.setup": 1, "egse.system.tools": 1
+    }
+    assert namespace_children(namespace_totals(index.namespace_counts())) == {
+        "": ["egse"], "egse": ["egse.setup", "egse.system"], "egse.system": ["egse.system.tools"]
+    }
+
+    snapshot = index.snapshot()
+    assert snapshot.subtree("egse.system") == ["egse.system", "egse.system.tools"]
+    assert snapshot.subtree("egse.sys") == []
+    assert index.next_records(0, 10, namespaces=snapshot.subtree("egse.system")) == [0, 1, 3]
+    assert index.next_records(2, 10, namespaces=["egse.system"]) == []
+    assert index.previous_records(4, 2, namespaces=snapshot.subtree("egse")) == [2, 3]
+    assert index.next_records(0, 10, [logging.DEBUG], snapshot.subtree("egse.system")) == [0, 3]
+    assert index.previous_records(3, 10, [logging.INFO], ["egse.system", "egse.setup"]) == [2]
+
+
+def test_namespace_filtering(tmp_path):
+
+    loader = KeyValueLoader(write_log(tmp_path, LINES * 3))
+    loader.load()
+
+    records = loader.get_records(0, 10, namespace="egse.setup")
+    assert [record.msg for record in records] == ["third"] * 3
+    assert loader.seek(0, 1, namespace="egse.setup") == 9
+    assert loader.record_ids(5, 1, 1, namespace="egse") == ([2, 3], 1)
+    assert loader.get_records(0, 10, namespace="egse.nothing") == []
+
+    search = loader.search("ir")
+    search.run()
+    assert loader.next_match(search, 0, +1, namespace="egse.system") == 5
+    assert loader.next_match(search, 9, -1, namespace="egse.setup") == 4
+    assert loader.next_match(search, 9, -1, namespace="egse.system") == 5
+
+
+def test_level_filtering(tmp_path):
+
+    class ErrorsOnly:
+        @staticmethod
+        def is_on(level):
+            return level >= logging.ERROR
+
+    loader = KeyValueLoader(write_log(tmp_path, LINES * 3))
+    loader.load()
+
+    records = loader.get_records(0, 10, ErrorsOnly())
+
+    assert [record.msg for record in records] == ["second"] * 3
+    assert loader.offset == 1
+
+    assert loader.seek(loader.offset, 1, ErrorsOnly()) == 6
+    assert loader.seek(loader.size(), -2, ErrorsOnly()) == 6
+    assert loader.seek(6, -5, ErrorsOnly()) == 1
+
+
+def test_record_cache(tmp_path):
+
+    filename = write_log(tmp_path, LINES[:3])
+    loader = KeyValueLoader(filename, cache_size=2)
+    loader.load()
+
+    first = loader.get_records(0, 2)
+    assert loader.cache.misses == 2
+
+    assert loader.get_records(0, 2) is first
+    assert loader.get_records(0, 1)[0] is first[0]
+    assert loader.cache.hits == 1
+
+    # Appended extra lines invalidate the cached last record
+
+    with open(filename, 'a') as fd:
+        fd.write(LINES[3] + "\n")
+    loader.load()
+
+    assert loader.get_records(0, 2)[1].extra == "\n".join(LINES[2:4])
+
+
+def test_completed_last_line(tmp_path):
+
+    # The last line is written in two parts, the message is cut in the middle
+
+    filename = write_log(tmp_path, [LINES[0], LINES[4][:-4]], end="")
+    loader = KeyValueLoader(filename)
+    loader.load()
+    assert loader.get_records(0, 2)[1].msg != "third"
+
+    with open(filename, 'a') as fd:
+        fd.write(LINES[4][-4:] + "\n")
+    loader.load()
+
+    loader.process(0, 2)
+    assert [record.msg for record in loader.get_records(0, 2)] == ["first", "third"]
+
+
+def test_load_in_chunks():
+
+    loader = KeyValueLoader(str(EXAMPLE_LOG))
+
+    loader.load(max_bytes=1024)
+
+    assert not loader.is_indexed()
+    assert 0 < loader.progress()[0] < loader.progress()[1]
+
+    while not loader.is_indexed():
+        loader.load(max_bytes=1024)
+
+    expected = KeyValueLoader(str(EXAMPLE_LOG))
+    expected.load()
+
+    assert loader.size() == expected.size()
+    assert loader.level_counts() == expected.level_counts()
+    assert loader._lines._record_starts == expected._lines._record_starts
+
+
+def test_find_time():
+
+    loader = KeyValueLoader(str(EXAMPLE_LOG))
+    loader.load()
+
+    timestamp = to_timestamp("2022-05-02T11:20:00,000000")
+
+    assert loader.find_time(timestamp) == 281
+    assert loader.find_time(0.0) == 0
+    assert loader.find_time(float("inf")) == loader.size()
+
+
+def test_find_time_with_unparsable_timestamps(tmp_path, monkeypatch):
+
+    monkeypatch.setattr("textualog.loader.SIDECAR_MIN_BYTES", 0)
+
+    lines = [line.replace("ts=2022-04-08T10:52:20,371211", "ts=garbage") for line in LINES]
+    lines.insert(2, lines[0].replace("msg=\"first\"", "msg=\"between\"").replace("ts=garbage", "ts=nonsense"))
+    filename = write_log(tmp_path, lines)
+    index_dir = str(tmp_path / "index")
+
+    loader = KeyValueLoader(filename, index_dir=index_dir)
+    loader.load()
+
+    # The records without a time are found at the time of the record before them
+
+    snapshot = loader.lines.snapshot()
+    assert [math.isnan(snapshot.created(rid)) for rid in range(4)] == [True, False, True, False]
+    assert snapshot.untimed() == [0, 2]
+    assert loader.find_time(0.0) == 1
+    assert loader.find_time(to_timestamp("2022-04-08T10:52:21,000001")) == 1
+    assert loader.find_time(to_timestamp("2022-04-08T10:52:21,500000")) == 5
+    assert loader.find_time(float("inf")) == loader.size()
+    assert snapshot.find_time_after(-math.inf) == 1
+
+    assert loader.save_index()
+    reopened = KeyValueLoader(filename, index_dir=index_dir)
+    assert reopened.load() == 0
+    assert reopened.find_time(to_timestamp("2022-04-08T10:52:21,500000")) == 5
+    assert math.isnan(reopened.lines.created(2))
+
+
+def test_parallel_indexing(tmp_path, monkeypatch):
+
+    monkeypatch.setattr("textualog.index.PARALLEL_MIN_BYTES", 1024)
+
+    # Chunk boundaries fall in the middle of records, i.e. before the lines of a Traceback
+
+    filename = tmp_path / "general.log"
+    filename.write_bytes(EXAMPLE_LOG.read_bytes() * 5)
+
+    index = LineIndex(str(filename), workers=3)
+    index.load(max_bytes=filename.stat().st_size // 2)
+    index.load()
+
+    expected = LineIndex(str(filename))
+    expected.load()
+
+    assert index._pool is None
+    assert index._offsets == expected._offsets
+    assert index._record_starts == expected._record_starts
+    assert index._level_records == expected._level_records
+    assert index._namespace_records == expected._namespace_records
+    assert index._created.tobytes() == expected._created.tobytes()
+
+
+def test_worker_stops_at_the_mapped_size(tmp_path):
+
+    # The file grows after the index mapped it, a worker maps the longer file
+
+    filename = write_log(tmp_path, LINES[:1] + [LINES[1][:20]], end="")
+    size = Path(filename).stat().st_size
+    with open(filename, 'a') as fd:
+        fd.write(LINES[1][20:] + "\n")
+
+    parser = get_parser("key-value")
+    chunk = _index_file_range(filename, 0, size, parser, size)
+    with open(filename, 'rb') as fd:
+        expected = index_chunk(fd.read()[:size], 0, size, parser)
+
+    assert chunk.offsets == expected.offsets
+    assert chunk.offsets[-1] == size
+    assert chunk.record_lines == expected.record_lines
+
+
+def test_sidecar_index(tmp_path, monkeypatch):
+
+    monkeypatch.setattr("textualog.loader.SIDECAR_MIN_BYTES", 0)
+
+    filename = write_log(tmp_path, LINES[:3])
+    index_dir = str(tmp_path / "index")
+
+    loader = KeyValueLoader(filename, index_dir=index_dir)
+    loader.load()
+    assert loader.save_index()
+    assert not loader.save_index()  # the index didn't change
+
+    with open(filename, 'a') as fd:
+        fd.write("\n".join(LINES[3:]) + "\n")
+
+    reopened = KeyValueLoader(filename, index_dir=index_dir)
+    assert reopened.load() == 2  # only the appended lines are indexed
+    assert reopened.record_count() == 3
+    assert reopened.get_records(0, 10)[1].extra == "\n".join(LINES[2:4])
+    assert reopened.namespace_counts() == {"egse.system": 2, "egse.setup": 1}
+    assert reopened.save_index()
+
+    # The sidecar is not used when the log file was changed
+
+    Path(filename).write_text("\n".join(LINES[::-1]) + "\n")
+
+    changed = KeyValueLoader(filename, index_dir=index_dir)
+    assert changed.load() == len(LINES)
+    assert [record.msg for record in changed.get_records(0, 10)] == ["third", "second", "first"]
+
+
+def test_compressed_log(tmp_path, monkeypatch):
+
+    import bz2
+    import gzip
+    import lzma
+    import zlib
+
+    # Small blocks and checkpoints, so pages are decompressed from seek points
+
+    monkeypatch.setattr("textualog.compressed.BLOCK_SIZE", 4096)
+    monkeypatch.setattr("textualog.compressed.BLOCK_CACHE_SIZE", 2)
+    monkeypatch.setattr("textualog.compressed.INPUT_SIZE", 1024)
+    monkeypatch.setattr("textualog.compressed.CHECKPOINT_INTERVAL", 8192)
+
+    content = EXAMPLE_LOG.read_bytes()
+    expected = KeyValueLoader(str(EXAMPLE_LOG))
+    expected.load()
+
+    half = len(content) // 2
+    # gzip with a member per half, like pigz or appending to a gzip file
+    members = gzip.compress(content[:half]) + gzip.compress(content[half:])
+
+    for name, compressed in [
+        ("general.log.gz", zlib.compress(content, wbits=zlib.MAX_WBITS | 16)),
+        ("general.log.1.gz", members),
+        ("general.log.bz2", bz2.compress(content)),
+        ("general.log.xz", lzma.compress(content)),
+    ]:
+        filename = tmp_path / name
+        filename.write_bytes(compressed)
+
+        loader = KeyValueLoader(str(filename))
+        loader.load(max_bytes=1024)
+        assert not loader.is_indexed()
+
+        while not loader.is_indexed():
+            loader.load(max_bytes=1024)
+
+        assert loader.progress() == (len(content), len(content))
+        assert loader.size() == expected.size()
+        assert loader.level_counts() == expected.level_counts()
+        assert loader._lines._record_starts == expected._lines._record_starts
+        assert loader.load() == 0
+
+        # Random access, backwards and forwards through the file
+
+        for start in (expected.size() - 10, 0, expected.size() // 2, 5):
+            records = loader.get_records(start, 10)
+            assert [(record.msg, record.extra) for record in records] == [
+                (record.msg, record.extra) for record in expected.get_records(start, 10)
+            ]
+            assert loader.offset == expected.offset
+
+        assert loader._lines.data.find(b"Traceback") == content.find(b"Traceback")
+        assert not loader.save_index()
+
+        filename.unlink()
+
+
+def test_concurrent_follow_and_navigation(tmp_path):
+
+    # One thread appends records and loads them, like following a log file, while records are
+    # navigated. Every navigation shall see a consistent index, also while the last line is
+    # incomplete and scanned again.
+
+    class ErrorsOnly:
+        @staticmethod
+        def is_on(level):
+            return level >= logging.ERROR
+
+    def record_line(n: int) -> str:
+        level = "ERROR" if n % 2 == 0 else "INFO"
+        return f'level={level} ts=2022-04-08T10:52:20,{n:06d} process=MainProcess process_id=1 caller=egse:1 msg="{n}"'
+
+    filename = tmp_path / "general.log"
+    filename.write_text("")
+    loader = KeyValueLoader(str(filename), cache_size=64)
+    loader.load()
+
+    nr_records = 1000
+    done = threading.Event()
+    errors = []
+
+    def follow():
+        try:
+            with open(filename, 'a') as fd:
+                for n in range(nr_records):
+                    fd.write(record_line(n))  # the newline is written later
+                    fd.flush()
+                    loader.load()
+                    fd.write("\n" + (f"extra {n}\n" if n % 3 == 0 else ""))
+                    fd.flush()
+                    loader.load()
+        except Exception as exc:
+            errors.append(exc)
+        finally:
+            done.set()
+
+    thread = threading.Thread(target=follow)
+    thread.start()
+
+    navigations = 0
+    while not done.is_set() or navigations == 0:
+        navigations += 1
+
+        rids, top = loader.record_ids(loader.seek(loader.size(), -10), 10, 10)
+        records = [loader.get_record(rid) for rid in rids]
+        assert [int(record.msg) for record in records] == rids
+        for record in records[:-1]:
+            assert record.extra == (f"extra {record.msg}" if int(record.msg) % 3 == 0 else None)
+
+        records = loader.get_records(max(0, loader.size() - 50), 20, ErrorsOnly())
+        numbers = [int(record.msg) for record in records]
+        assert numbers == list(range(numbers[0], numbers[0] + 2 * len(numbers), 2)) if numbers else True
+        assert all(record.level == logging.ERROR for record in records)
+
+    thread.join()
+    assert not errors
+    assert navigations > 1
+    assert loader.record_count() == nr_records
+    assert [int(record.msg) for record in loader.get_records(0, nr_records)] == list(range(nr_records))
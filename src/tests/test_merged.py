@@ -0,0 +1,177 @@
+import logging
+
+from textualog.loader import KeyValueLoader
+from textualog.merged import MergedLoader
+from textualog.merged import expand_filenames
+from textualog.renderables.logrecord import to_timestamp
+from textualog.widgets.levels import Levels
+
+from test_loader import EXAMPLE_LOG
+
+
+def record(ts: str, msg: str, level: str = "INFO", caller: str = "egse.system") -> str:
+    return f'level={level} ts=2022-04-08T{ts} process=MainProcess process_id=1 caller={caller}:10 msg="{msg}"'
+
+
+def write_logs(tmp_path):
+    old = tmp_path / "general.log.2022-04-08"
+    old.write_text("\n".join([
+        record("10:00:00,000000", "a"),
+        record("10:00:02,000000", "c", "ERROR"),
+        "Traceback (most recent call last):",
+        record("10:00:04,000000", "e"),
+    ]) + "\n")
+    new = tmp_path / "general.log"
+    new.write_text("\n".join([
+        record("10:00:01,000000", "b"),
+        record("10:00:02,000000", "d", caller="egse.setup"),
+        record("10:00:05,000000", "f", "ERROR"),
+    ]) + "\n")
+    return [str(old), str(new)]
+
+
+def messages(loader, rids):
+    return [loader.get_record(rid).msg for rid in rids]
+
+
+def test_merged_timeline(tmp_path):
+
+    loader = MergedLoader(write_logs(tmp_path))
+    assert loader.load() == 6
+
+    assert loader.size() == loader.record_count() == 6
+    assert loader.level_counts()[logging.ERROR] == 2
+
+    rids, top = loader.record_ids(0, 10, 10)
+    assert top == 0
+    assert messages(loader, rids) == ["a", "b", "c", "d", "e", "f"]
+    assert [loader.line_of_record(rid) for rid in rids] == list(range(6))
+
+    rids, top = loader.record_ids(3, 2, 2)
+    assert messages(loader, rids) == ["b", "c", "d", "e"]
+    assert top == 2
+
+    record = loader.get_record(rids[1])
+    assert record.source == "general.log.2022-04-08"
+    assert record.extra == "Traceback (most recent call last):"
+
+    assert loader.seek(1, 3) == 4
+    assert loader.seek(4, -2) == 2
+    assert loader.seek(loader.size(), -1) == 5
+
+    assert loader.find_time(to_timestamp("2022-04-08T10:00:02,000000")) == 2
+    assert loader.find_time(to_timestamp("2022-04-08T10:00:02,500000")) == 4
+
+
+def test_merged_level_filtering(tmp_path):
+
+    loader = MergedLoader(write_logs(tmp_path))
+    loader.load()
+
+    levels = Levels()
+    levels.info_level = False
+
+    rids, top = loader.record_ids(0, 10, 10, levels)
+    assert messages(loader, rids) == ["c", "f"]
+    assert loader.seek(0, 1, levels) == 5
+    assert loader.seek(5, -1, levels) == 2
+
+
+def test_merged_namespace_filtering(tmp_path):
+
+    loader = MergedLoader(write_logs(tmp_path))
+    loader.load()
+
+    assert loader.namespace_counts() == {"egse.system": 5, "egse.setup": 1}
+
+    rids, top = loader.record_ids(0, 10, 10, namespace="egse.system")
+    assert messages(loader, rids) == ["a", "b", "c", "e", "f"]
+    assert loader.seek(0, 1, namespace="egse.setup") == 3
+
+    levels = Levels()
+    levels.info_level = False
+    rids, top = loader.record_ids(5, 10, 10, levels, namespace="egse")
+    assert messages(loader, rids) == ["c", "f"]
+    assert top == 1
+
+
+def test_merged_search_and_follow(tmp_path):
+
+    filenames = write_logs(tmp_path)
+    loader = MergedLoader(filenames)
+    loader.load()
+
+    search = loader.search("msg=\"[ce]\"", regex=True)
+    search.run(max_bytes=None)
+    assert search.is_done()
+    assert len(search) == 2
+
+    assert loader.next_match(search, 0, +1) == 2
+    assert loader.next_match(search, 2, +1) == 4
+    assert loader.next_match(search, 4, +1) is None
+    assert loader.next_match(search, 4, -1) == 2
+
+    # All log files are followed
+
+    with open(filenames[0], 'a') as fd:
+        fd.write(record("10:00:06,000000", "g") + "\n")
+    with open(filenames[1], 'a') as fd:
+        fd.write(record("10:00:07,000000", "h") + "\n")
+
+    assert loader.load() == 2
+    rids, _ = loader.record_ids(loader.seek(loader.size(), -3), 0, 10)
+    assert messages(loader, rids) == ["f", "g", "h"]
+
+
+def test_merged_example_log_with_itself(tmp_path):
+
+    copy = tmp_path / "general.log.1"
+    copy.write_bytes(EXAMPLE_LOG.read_bytes())
+
+    expected = KeyValueLoader(str(EXAMPLE_LOG))
+    expected.load()
+    loader = MergedLoader([str(EXAMPLE_LOG), str(copy)])
+    loader.load()
+
+    assert loader.size() == 2 * expected.record_count()
+
+    # Records with the same creation time are ordered by log file
+
+    rids, _ = loader.record_ids(100, 0, 50)
+    assert [rid % 2 for rid in rids] == [0, 1] * 25
+    assert [loader.line_of_record(rid) for rid in rids] == list(range(100, 150))
+
+
+def test_merged_logs_without_creation_times(tmp_path):
+
+    # The logging.BASIC_FORMAT has no creation time, the log files are shown one after the other
+
+    first = tmp_path / "first.log"
+    first.write_text("INFO:egse.system:a\nERROR:egse.system:b\nINFO:egse.setup:c\n")
+    second = tmp_path / "second.log"
+    second.write_text("WARNING:egse.system:d\nINFO:egse.system:e\n")
+
+    loader = MergedLoader([str(first), str(second)])
+    loader.load()
+
+    rids, top = loader.record_ids(0, 10, 10)
+    assert messages(loader, rids) == ["a", "b", "c", "d", "e"]
+    assert [loader.line_of_record(rid) for rid in rids] == list(range(5))
+
+    assert loader.seek(0, 1) == 1
+    assert loader.seek(1, 3) == 4
+    assert loader.seek(4, -2) == 2
+
+    levels = Levels()
+    levels.info_level = False
+    assert loader.seek(0, 1, levels) == 3
+    assert loader.seek(3, -1, levels) == 1
+
+
+def test_expand_filenames(tmp_path):
+
+    filenames = write_logs(tmp_path)
+
+    assert expand_filenames([str(tmp_path / "general.log*")]) == sorted(filenames)
+    assert expand_filenames([filenames[1], str(tmp_path / "*.log*")]) == [filenames[1], filenames[0]]
+    assert expand_filenames(["no-such-file.log"]) == ["no-such-file.log"]
@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+namespace_tree = pytest.importorskip(
+    "textualog.renderables.namespace_tree", reason="the tree control of textual 0.1 is not available",
+    exc_type=ImportError,
+)
+
+COUNTS = {"egse.system": 2, "egse.system.tools": 1, "egse.setup": 1, "root": 1}
+
+
+def test_namespace_tree_adds_children_on_expand():
+
+    async def main():
+        tree = namespace_tree.NamespaceTree()
+        await tree.update_counts(COUNTS)
+
+        # Only the sub-namespaces of the expanded root have a node
+
+        assert set(tree._namespace_nodes) == {"", "egse", "root"}
+        egse = tree._namespace_nodes["egse"]
+        assert not egse.loaded and egse.data.count == 4
+
+        await tree.handle_tree_click(namespace_tree.TreeClick(tree, egse))
+        assert set(tree._namespace_nodes) == {"", "egse", "root", "egse.setup", "egse.system"}
+        assert tree._namespace_nodes["egse.system"].data.count == 3
+        assert not tree._namespace_nodes["egse.system"].loaded
+
+        # A new namespace gets a node when its parent was expanded before
+
+        await tree.update_counts({**COUNTS, "egse.hexapod": 1, "egse.system.other": 1})
+        assert "egse.hexapod" in tree._namespace_nodes
+        assert "egse.system.other" not in tree._namespace_nodes
+        assert tree._namespace_nodes["egse.system"].data.count == 4
+
+    asyncio.run(main())
+
+
+def test_namespace_tree_hover_restyles_only_the_hovered_labels(monkeypatch):
+
+    async def main():
+        tree = namespace_tree.NamespaceTree()
+        await tree.update_counts(COUNTS)
+        nodes = list(tree._namespace_nodes.values())
+
+        rendered = []
+        render_tree_label = tree.render_tree_label
+
+        def count_renders(node, *state):
+            rendered.append(node.data.name)
+            return render_tree_label(node, *state)
+
+        monkeypatch.setattr(tree, "render_tree_label", count_renders)
+
+        labels = [tree.render_node(node) for node in nodes]
+        assert sorted(rendered) == ["", "egse", "root"]
+
+        # Hovering a node renders its label again, the other labels come from the cache
+
+        rendered.clear()
+        tree.hover_node = tree._namespace_nodes["egse"].id
+        await tree.watch_hover_node(tree.hover_node)
+        hovered = [tree.render_node(node) for node in nodes]
+        assert rendered == ["egse"]
+        assert [label is before for label, before in zip(hovered, labels)] == [
+            node.data.name != "egse" for node in nodes
+        ]
+        assert tree._namespace_nodes["egse"].tree.guide_style == "bold not dim red"
+
+        # Moving the hover restyles the node that was hovered, its label was rendered before
+
+        rendered.clear()
+        tree.hover_node = tree._namespace_nodes["root"].id
+        await tree.watch_hover_node(tree.hover_node)
+        moved = [tree.render_node(node) for node in nodes]
+        assert rendered == ["root"]
+        egse = nodes.index(tree._namespace_nodes["egse"])
+        assert moved[egse] is labels[egse]
+        assert tree._namespace_nodes["egse"].tree.guide_style == "black"
+
+    asyncio.run(main())
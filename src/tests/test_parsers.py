@@ -0,0 +1,238 @@
+import json
+import logging
+import math
+import pickle
+
+import pytest
+
+from textualog.index import LineIndex
+from textualog.loader import JsonLinesLoader
+from textualog.loader import KeyValueLoader
+from textualog.parsers import BasicFormatParser
+from textualog.parsers import JsonLinesParser
+from textualog.parsers import KeyValueParser
+from textualog.parsers import PARSERS
+from textualog.parsers import SyslogParser
+from textualog.parsers import detect_parser
+from textualog.parsers import get_parser
+from textualog.renderables.logrecord import to_timestamp
+
+from test_loader import LINES
+from test_loader import write_log
+
+BASIC_LINES = [
+    "INFO:egse.system:first",
+    "ERROR:egse.setup:second: with a colon",
+    "Traceback (most recent call last):",
+    "DEBUG:root:third",
+]
+
+SYSLOG_LINES = [
+    "Apr  8 10:52:20 cslserver systemd[1]: Started Session 1 of user rik.",
+    "Apr  8 10:52:21 cslserver kernel: [ 12.345] usb 1-1: new device",
+    "Apr 18 10:52:22 cslserver CRON[2004]: (root) CMD (command -v debian-sa1 > /dev/null)",
+]
+
+
+@pytest.mark.parametrize("lines, parser", [
+    (LINES, KeyValueParser), (BASIC_LINES, BasicFormatParser), (SYSLOG_LINES, SyslogParser), ([], KeyValueParser),
+])
+def test_detect_parser(lines, parser):
+
+    assert isinstance(detect_parser("\n".join(lines * 5).encode()), parser)
+
+
+def test_basic_format(tmp_path):
+
+    loader = KeyValueLoader(write_log(tmp_path, BASIC_LINES))
+    loader.load()
+
+    assert isinstance(loader.lines.parser, BasicFormatParser)
+    assert loader.record_count() == 3
+    assert loader.namespace_counts() == {"egse.system": 1, "egse.setup": 1, "root": 1}
+    assert loader.level_counts()[logging.ERROR] == 1
+    assert math.isnan(loader.lines.created(0))
+
+    records = loader.get_records(0, 10)
+    assert [(record.level, record.caller, record.msg) for record in records] == [
+        (logging.INFO, "egse.system", "first"),
+        (logging.ERROR, "egse.setup", "second: with a colon"),
+        (logging.DEBUG, "root", "third"),
+    ]
+    assert records[1].extra == "Traceback (most recent call last):"
+
+    # The records have no creation time, the timestamp column is blank
+
+    assert records[0].created is None
+    assert records[0].get_text().plain.startswith(" " * 24 + "    INFO egse.system")
+
+    # The creation time from the index is kept
+
+    record = get_parser("basic").parse_record("INFO:root:msg", 1649408400.0, None)
+    assert record.created == 1649408400.0
+
+
+def test_syslog_format(tmp_path):
+
+    loader = KeyValueLoader(write_log(tmp_path, SYSLOG_LINES))
+    loader.load()
+
+    assert isinstance(loader.lines.parser, SyslogParser)
+    assert loader.namespace_counts() == {"systemd": 1, "kernel": 1, "CRON": 1}
+    assert loader.lines.created(1) - loader.lines.created(0) == 1.0
+
+    record = loader.get_records(0, 10)[2]
+    assert (record.process, record.caller, record.process_id) == ("cslserver", "CRON", "2004")
+    assert record.msg == "(root) CMD (command -v debian-sa1 > /dev/null)"
+    assert record.created == loader.lines.created(2)
+
+
+def test_unexpected_lines(tmp_path):
+
+    # A record that doesn't match the format is shown with the line as its message
+
+    lines = [LINES[0], "level=INFO ts=yesterday msg=short", "level=NOTSET " + LINES[1][12:]]
+    loader = KeyValueLoader(write_log(tmp_path, lines))
+    loader.load()
+
+    records = loader.get_records(0, 10)
+    assert [record.msg for record in records] == ["first"] + lines[1:]
+    assert [record.level for record in records] == [logging.DEBUG, logging.INFO, logging.INFO]
+
+
+def test_given_parser(tmp_path):
+
+    # A key-value log file read as syslog has no records, all lines belong to no record
+
+    index = LineIndex(write_log(tmp_path, LINES), parser=get_parser("syslog"))
+    index.load()
+    assert index.record_count() == 0
+
+    with pytest.raises(ValueError):
+        get_parser("unknown")
+
+
+def test_parser_is_pickled_by_name(tmp_path):
+
+    assert pickle.loads(pickle.dumps(get_parser("basic"))) is get_parser("basic")
+
+
+class PluginParser(KeyValueParser):
+    """A parser that is registered at runtime, e.g. by a plugin."""
+
+    name = "plugin"
+
+
+def test_runtime_parser_in_worker_processes(tmp_path, monkeypatch):
+
+    monkeypatch.setattr("textualog.index.PARALLEL_MIN_BYTES", 1024)
+    monkeypatch.setitem(PARSERS, PluginParser.name, PluginParser())
+
+    filename = write_log(tmp_path, LINES * 500)
+    index = LineIndex(filename, workers=2, parser=get_parser("plugin"))
+    index.load()
+
+    expected = LineIndex(filename)
+    expected.load()
+    assert index._record_starts == expected._record_starts
+    assert index._created.tobytes() == expected._created.tobytes()
+
+    # A parser class that can't be imported in a worker process is used serially
+
+    class LocalParser(KeyValueParser):
+        name = "local"
+
+    index = LineIndex(filename, workers=2, parser=LocalParser())
+    index.load()
+    assert index._record_starts == expected._record_starts
+
+
+def test_sidecar_keeps_the_format(tmp_path, monkeypatch):
+
+    monkeypatch.setattr("textualog.loader.SIDECAR_MIN_BYTES", 0)
+
+    filename = write_log(tmp_path, BASIC_LINES)
+    index_dir = str(tmp_path / "index")
+
+    loader = KeyValueLoader(filename, index_dir=index_dir)
+    loader.load()
+    assert loader.save_index()
+
+    reopened = KeyValueLoader(filename, index_dir=index_dir)
+    assert reopened.load() == 0
+    assert isinstance(reopened.lines.parser, BasicFormatParser)
+    assert reopened.get_records(0, 1)[0].msg == "first"
+
+    # The sidecar is not used for another format
+
+    other = KeyValueLoader(filename, index_dir=index_dir, parser=get_parser("key-value"))
+    assert other.load() == len(BASIC_LINES)
+    assert other.record_count() == 0
+
+
+JSON_LINES = [
+    '{"asctime": "2022-04-08T10:52:20,371211", "levelname": "INFO", "name": "egse.system", "message": "first"}',
+    '{"time": 1649415141000, "level": 50, "logger": "egse.setup", "msg": "say \\"hi\\"", "user": "rik"}',
+    'Traceback (most recent call last):',
+    '{"timestamp": "2022-04-08T08:52:22.5Z", "severity": "warning", "event": "third", "extra": {"a": [1, 2]}}',
+]
+
+
+def test_json_lines(tmp_path):
+
+    loader = JsonLinesLoader(write_log(tmp_path, JSON_LINES))
+    loader.load()
+
+    assert isinstance(detect_parser("\n".join(JSON_LINES).encode()), JsonLinesParser)
+    assert loader.record_count() == 3
+    assert loader.namespace_counts() == {"egse.system": 1, "egse.setup": 1, "": 1}
+    assert [loader.lines.level_of(rid) for rid in range(3)] == [logging.INFO, logging.ERROR, logging.WARNING]
+    assert loader.lines.created(0) == to_timestamp("2022-04-08T10:52:20,371211")
+    assert loader.lines.created(1) == 1649415141.0
+    assert loader.lines.created(2) == 1649407942.5
+
+    first, second, third = loader.get_records(0, 10)
+    assert (first.msg, first.caller, first.level) == ("first", "egse.system", logging.INFO)
+    assert not first.has_extra and first.extra is None
+    assert second.msg == 'say "hi"'
+    assert second.has_extra
+    assert second.extra == '{\n  "user": "rik"\n}\nTraceback (most recent call last):'
+    assert third.has_extra and json.loads(third.extra) == {"extra": {"a": [1, 2]}}
+
+
+def test_json_lines_with_nested_fields(tmp_path):
+
+    lines = [
+        '{"user": {"name": "alice", "level": "debug"}, "name": "egse.dsi", "level": "error", "msg": "first"}',
+        '{"context": [{"logger": "nested"}], "msg": "second"}',
+    ]
+    loader = JsonLinesLoader(write_log(tmp_path, lines))
+    loader.load()
+
+    # Only the fields of the record itself are used, not those of the objects nested in it
+
+    assert loader.namespace_counts() == {"egse.dsi": 1, "": 1}
+    assert [loader.lines.level_of(rid) for rid in range(2)] == [logging.ERROR, None]
+
+    first, second = loader.get_records(0, 10)
+    assert (first.caller, first.level, first.msg) == ("egse.dsi", logging.ERROR, "first")
+    assert (second.caller, second.msg) == ("", "second")
+
+
+def test_json_lines_are_decoded_lazily(tmp_path, monkeypatch):
+
+    loader = JsonLinesLoader(write_log(tmp_path, JSON_LINES * 100))
+
+    loads = json.loads
+
+    def loads_field(value, **kwargs):
+        assert value[:1] not in (b"{", "{"), "a record was decoded"
+        return loads(value, **kwargs)
+
+    monkeypatch.setattr(json, "loads", loads_field)
+    loader.load()
+    records = loader.get_records(0, 10)
+    assert [record.get_text().plain[-5:] for record in records[:3]] == ["first", ' "hi"', "third"]
+
+    monkeypatch.setattr(json, "loads", loads)
+    assert records[1].extra.startswith('{\n  "user": "rik"\n}')
@@ -0,0 +1,130 @@
+import io
+import json
+
+import pytest
+
+from textualog.loader import KeyValueLoader
+from textualog.merged import open_loader
+from textualog.query import main
+from textualog.query import select
+from textualog.query import write_records
+from textualog.renderables.logrecord import to_timestamp
+
+from test_loader import EXAMPLE_LOG
+from test_loader import LINES
+from test_loader import write_log
+from test_merged import messages
+from test_merged import write_logs
+
+
+def test_select(tmp_path):
+
+    loader = KeyValueLoader(write_log(tmp_path, LINES))
+    loader.load()
+
+    assert messages(loader, select(loader)) == ["first", "second", "third"]
+    assert messages(loader, select(loader, level=20)) == ["second", "third"]
+    assert messages(loader, select(loader, namespace="egse.setup")) == ["third"]
+    assert messages(loader, select(loader, since=to_timestamp("2022-04-08T10:52:21,000001"))) == ["second", "third"]
+    assert messages(loader, select(loader, until=to_timestamp("2022-04-08T10:52:22,500000"))) == ["first", "second"]
+
+    # The first record matches too, and the text of a record includes its Traceback
+
+    assert messages(loader, select(loader, pattern="first")) == ["first"]
+    assert messages(loader, select(loader, pattern="stdin")) == ["second"]
+    assert messages(loader, select(loader, pattern="MAIN", ignore_case=True, level=20)) == ["second", "third"]
+    assert messages(loader, select(loader, pattern="MAIN", ignore_case=True, until=to_timestamp(
+        "2022-04-08T10:52:21,000001"))) == ["first"]
+
+
+def test_select_merged(tmp_path):
+
+    loader = open_loader(write_logs(tmp_path))
+    loader.load()
+
+    assert messages(loader, select(loader)) == ["a", "b", "c", "d", "e", "f"]
+    assert messages(loader, select(loader, level=40, pattern="Traceback")) == ["c"]
+    assert messages(loader, select(loader, since=to_timestamp("2022-04-08T10:00:02,000000"),
+                                   namespace="egse.system")) == ["c", "e", "f"]
+
+
+def test_select_records_out_of_order():
+
+    loader = KeyValueLoader(str(EXAMPLE_LOG))
+    loader.load()
+    assert not loader.is_chronological()
+
+    # The log file has records that were written out of order, these are selected as well
+
+    since = to_timestamp("2022-05-12T00:00:00,000000")
+    rids = list(select(loader, since=since))
+    assert len(rids) == 3
+    assert all(loader.get_record(rid).created >= since for rid in rids)
+    assert rids == [rid for rid in range(loader.record_count()) if loader.get_record(rid).created >= since]
+
+    until = to_timestamp("2022-05-02T11:20:00,000000")
+    rids = list(select(loader, until=until, pattern="egse"))
+    assert rids and all(loader.get_record(rid).created < until for rid in rids)
+
+
+def test_write_records(tmp_path, monkeypatch):
+
+    monkeypatch.setattr("textualog.query.QUERY_PAGE_SIZE", 2)
+
+    loader = KeyValueLoader(write_log(tmp_path, LINES * 3))
+    loader.load()
+
+    out = io.StringIO()
+    assert write_records(loader, select(loader), out) == 9
+    assert out.getvalue() == "\n".join(LINES * 3) + "\n"
+
+    out = io.StringIO()
+    assert write_records(loader, select(loader), out, limit=2) == 2
+    assert out.getvalue() == "\n".join(LINES[:4]) + "\n"
+
+
+def test_query_main(tmp_path, capsys):
+
+    filename = write_log(tmp_path, LINES)
+
+    main(["--log", filename, "--no-index-cache", "--level", "info", "--since", "10:52:21", "--output", "json"])
+    first, second = map(json.loads, capsys.readouterr().out.splitlines())
+    assert (first["level"], first["msg"], first["caller"]) == ("ERROR", "second", "egse.system:20")
+    assert first["extra"].startswith("Traceback")
+    assert first["created"] == to_timestamp("2022-04-08T10:52:21,000001")
+    assert second["ts"] == "2022-04-08T10:52:22,500000"
+
+    main(["--log", filename, "--no-index-cache", "--caller", "egse.setup", "--output", "key-value"])
+    assert capsys.readouterr().out == LINES[-1] + "\n"
+
+
+def test_query_invalid_arguments(tmp_path, capsys):
+
+    filename = write_log(tmp_path, LINES)
+
+    with pytest.raises(SystemExit):
+        main(["--log", filename, "--no-index-cache", "--grep", "(", "--regex"])
+    assert "invalid regular expression '('" in capsys.readouterr().err
+
+    # Without --regex the text is not a regular expression
+
+    main(["--log", filename, "--no-index-cache", "--grep", "(", "--output", "key-value"])
+    assert capsys.readouterr().out == "\n".join(LINES[1:4]) + "\n"
+
+
+def test_query_records_without_time(tmp_path, capsys):
+
+    # The logging.BASIC_FORMAT has no creation time, none is made up
+
+    filename = write_log(tmp_path, ["INFO:root:hello", "WARNING:egse.system:world"])
+
+    main(["--log", filename, "--no-index-cache", "--output", "key-value"])
+    assert capsys.readouterr().out.splitlines() == [
+        'level=INFO ts= process= process_id= caller=root msg="hello"',
+        'level=WARNING ts= process= process_id= caller=egse.system msg="world"',
+    ]
+
+    main(["--log", filename, "--no-index-cache", "--output", "json"])
+    first, second = map(json.loads, capsys.readouterr().out.splitlines())
+    assert (first["ts"], first["created"], first["msg"]) == (None, None, "hello")
+    assert second["created"] is None
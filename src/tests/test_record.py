@@ -1,7 +1,15 @@
+import datetime
 import logging
 import time
 
+import pytest
+
+from textualog.log import LOG_FORMAT_DATE
 from textualog.renderables.logrecord import LogRecord
+from textualog.renderables.logrecord import _minute_timestamp
+from textualog.renderables.logrecord import parse_datetime
+from textualog.renderables.logrecord import to_timestamp
+from textualog.renderables.logrecord import to_timestamps
 
 
 def test_simple_construction():
@@ -9,6 +17,85 @@ def test_simple_construction():
     msg = "A simple log message"
     record = LogRecord(msg)
 
-    assert record.created <= time.time()
+    assert record.created is None  # a record without a time doesn't get one
     assert record.msg == msg
     assert record.level == logging.INFO
+
+
+def test_records_are_compact(tmp_path):
+
+    from test_loader import LINES, write_log
+    from textualog.loader import KeyValueLoader
+
+    assert not hasattr(LogRecord("msg"), "__dict__")
+
+    # The strings that many records share are the same object in every record
+
+    loader = KeyValueLoader(write_log(tmp_path, LINES * 2))
+    loader.load()
+    first, second = loader.get_record(0), loader.get_record(3)
+
+    assert first is not second
+    assert first.level is second.level
+    assert first.caller == "egse.system:10" and first.caller is second.caller
+    assert first.process is second.process
+
+
+def test_to_timestamp(monkeypatch):
+
+    monkeypatch.setenv("TZ", "Europe/Brussels")
+    time.tzset()
+    _minute_timestamp.cache_clear()
+
+    try:
+        start = datetime.datetime(2022, 3, 27, 1, 58, 59, 999999)  # across the DST transition
+        timestamps = [
+            (start + datetime.timedelta(seconds=seconds, microseconds=seconds * 7919)).strftime(LOG_FORMAT_DATE)
+            for seconds in range(0, 4 * 3600, 37)
+        ]
+        expected = [datetime.datetime.strptime(ts, LOG_FORMAT_DATE).timestamp() for ts in timestamps]
+
+        assert [to_timestamp(ts) for ts in timestamps] == expected
+        assert list(to_timestamps(timestamps)) == expected
+        assert to_timestamp("2022-04-08T10:52:20,371") == to_timestamp("2022-04-08T10:52:20,371000")
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+        _minute_timestamp.cache_clear()
+
+
+def test_parse_datetime():
+
+    reference = datetime.datetime(2022, 4, 8, 23, 59)
+
+    assert parse_datetime("2022-05-02T11:20") == datetime.datetime(2022, 5, 2, 11, 20)
+    assert parse_datetime("2022-05-02 11:20:09,223713") == datetime.datetime(2022, 5, 2, 11, 20, 9, 223713)
+    assert parse_datetime("11:20", reference) == datetime.datetime(2022, 4, 8, 11, 20)
+    assert parse_datetime(" 11:20:09.500 ", reference) == datetime.datetime(2022, 4, 8, 11, 20, 9, 500000)
+
+    with pytest.raises(ValueError):
+        parse_datetime("yesterday")
+
+
+def test_records_render_cache(tmp_path):
+
+    from test_loader import LINES, write_log
+    from textualog.loader import KeyValueLoader
+    from textualog.widgets.records import Records
+
+    loader = KeyValueLoader(write_log(tmp_path, LINES))
+    loader.load()
+
+    records = Records(height=4)
+    records.attach(loader)
+
+    text = records._generate_renderable()
+    assert text.plain.splitlines()[1].endswith("egse.system:20       second")
+    assert records._lines.misses == 2
+
+    # Selecting a record only renders that line again
+
+    records.records[1].selected = True
+    records._generate_renderable()
+    assert records._lines.misses == 3
+    assert records._lines.hits == 1
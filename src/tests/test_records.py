@@ -0,0 +1,40 @@
+from test_loader import LINES
+from test_loader import write_log
+from textualog.loader import KeyValueLoader
+from textualog.widgets import records as records_module
+from textualog.widgets.records import Records
+
+
+def test_records_window(tmp_path, monkeypatch):
+
+    monkeypatch.setattr(records_module, "PREFETCH", 2)
+
+    filename = write_log(tmp_path, LINES * 10)  # 30 records of 5 lines each
+    loader = KeyValueLoader(filename)
+    loader.load()
+
+    records = Records(height=5)  # three records are visible
+    records.attach(loader)
+
+    assert [record.msg for record in records.records] == ["first", "second", "third"]
+
+    records.scroll(2)  # within the window
+    assert records.top_line == 4
+    records.scroll(10)  # beyond the window
+    assert records.top_line == 20  # record 12
+    assert len(records._window) <= 3 + 2 * 2
+
+    records.scroll_to_end()
+    assert [record.msg for record in records.records] == ["first", "second", "third"]
+    assert records.top_line == 45
+
+    records.scroll(5)
+    assert records.top_line == 49  # the last record stays visible
+
+    # Records appended to the log file are shown when the window is at the end of the file
+
+    with open(filename, 'a') as fd:
+        fd.write(LINES[0] + "\n")
+    loader.load()
+
+    assert [record.msg for record in records.records] == ["third", "first"]
@@ -0,0 +1,101 @@
+import logging
+
+from textualog.loader import KeyValueLoader
+from textualog.search import Search
+
+from test_loader import EXAMPLE_LOG
+from test_loader import LINES
+from test_loader import write_log
+
+
+def run(search: Search, max_bytes=None):
+    while not search.is_done():
+        search.run(max_bytes)
+    return list(search.matches)
+
+
+def test_search(tmp_path):
+
+    loader = KeyValueLoader(write_log(tmp_path, ["orphan first"] + LINES * 2))
+    loader.load()
+
+    assert run(loader.search("first")) == [0, 3]
+    assert run(loader.search("FIRST", ignore_case=True)) == [0, 3]
+    assert run(loader.search("File.*line [0-9]", regex=True)) == [1, 4]
+    assert run(loader.search("msg=\"(second|third)\"", regex=True), max_bytes=64) == [1, 2, 4, 5]
+    assert run(loader.search("no such text")) == []
+
+
+def test_next_match(tmp_path):
+
+    loader = KeyValueLoader(write_log(tmp_path, LINES * 3))
+    loader.load()
+
+    search = loader.search("msg=")
+    run(search)
+
+    assert loader.next_match(search, 0, +1) == 1
+    assert loader.next_match(search, 2, +1) == 4
+    assert loader.next_match(search, 5, -1) == 4
+    assert loader.next_match(search, 0, -1) is None
+    assert search.next(3, [logging.ERROR]) == 4
+    assert search.previous(4, [logging.ERROR]) == 1
+
+
+def test_search_appended_records(tmp_path):
+
+    filename = write_log(tmp_path, LINES[:2])
+    loader = KeyValueLoader(filename)
+    loader.load()
+
+    search = loader.search("File")
+    assert run(search) == []
+
+    with open(filename, 'a') as fd:
+        fd.write("\n".join(LINES[2:] + LINES[2:4]) + "\n")
+    loader.load()
+
+    assert run(search) == [1, 2]
+
+
+def test_search_completed_last_line(tmp_path):
+
+    # The last line is half written, in the middle of the text that matches
+
+    cut = LINES[1].index("second") + 3
+    filename = write_log(tmp_path, LINES[:1] + [LINES[1][:cut]], end="")
+    loader = KeyValueLoader(filename)
+    loader.load()
+
+    search = loader.search("second")
+    assert run(search) == []
+
+    with open(filename, 'a') as fd:
+        fd.write(LINES[1][cut:] + "\n")
+    loader.load()
+
+    assert run(search) == [1]
+    assert run(loader.search("second")) == [1]
+
+
+def test_search_compressed_log(tmp_path):
+
+    import gzip
+
+    filename = tmp_path / "general.log.gz"
+    filename.write_bytes(gzip.compress(EXAMPLE_LOG.read_bytes()))
+
+    expected = KeyValueLoader(str(EXAMPLE_LOG))
+    expected.load()
+    loader = KeyValueLoader(str(filename))
+    loader.load()
+
+    for pattern, regex in [("Traceback", False), (r"^\s+File", True)]:
+        search = loader.search(pattern, regex=regex)
+        search.run(max_bytes=None)
+        assert search.is_done()
+
+        expected_search = expected.search(pattern, regex=regex)
+        expected_search.run(max_bytes=None)
+        assert len(search.matches) > 0
+        assert search.matches == expected_search.matches
@@ -0,0 +1,63 @@
+import asyncio
+import time
+
+import pytest
+
+from textualog.watch import FileWatcher
+
+
+async def append_later(filename, text, delay):
+    await asyncio.sleep(delay)
+    with open(filename, 'a') as fd:
+        fd.write(text)
+
+
+@pytest.mark.parametrize("use_inotify", [True, False])
+def test_file_watcher(tmp_path, use_inotify):
+
+    filename = tmp_path / "general.log"
+    filename.write_text("first\n")
+    other = tmp_path / "other.log"
+
+    async def main():
+        watcher = FileWatcher([str(filename)], use_inotify=use_inotify)
+        try:
+            # Changes to other files in the directory are ignored
+
+            writer = asyncio.ensure_future(append_later(other, "other\n", 0.01))
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(watcher.wait(), 0.2)
+            await writer
+
+            writer = asyncio.ensure_future(append_later(filename, "second\n", 0.01))
+            start = time.perf_counter()
+            await asyncio.wait_for(watcher.wait(), 5.0)
+            await writer
+            return time.perf_counter() - start
+        finally:
+            watcher.close()
+
+    assert asyncio.run(main()) < 0.5
+
+
+@pytest.mark.parametrize("use_inotify", [True, False])
+def test_file_watcher_rotation(tmp_path, use_inotify):
+
+    filename = tmp_path / "general.log"
+    filename.write_text("first\n")
+
+    async def main():
+        watcher = FileWatcher([str(filename)], use_inotify=use_inotify)
+        try:
+            # The log file is renamed, and the new log file is created a moment later
+
+            filename.rename(tmp_path / "general.log.1")
+            await asyncio.wait_for(watcher.wait(), 5.0)
+            assert not filename.exists()
+
+            filename.write_text("second\n")
+            await asyncio.wait_for(watcher.wait(), 5.0)
+        finally:
+            watcher.close()
+
+    asyncio.run(main())
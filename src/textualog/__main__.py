@@ -1,8 +1,13 @@
 import argparse
+import asyncio
 import logging
+import os
+import re
 import sys
-import threading
 from pathlib import Path
+from typing import Callable
+from typing import List
+from typing import Optional
 
 from textual import events
 from textual.app import App
@@ -12,10 +17,19 @@ from textual.widgets import Header
 from textual.widgets import ScrollView
 
 from . import __version__
-from .loader import KeyValueLoader
+from .loader import default_index_dir
 from .log import setup_logging
+from .merged import expand_filenames
+from .merged import open_loader
+from .parsers import PARSERS
+from .parsers import get_parser
+from .renderables.logrecord import from_timestamp
+from .renderables.logrecord import parse_datetime
 from .renderables.namespace_tree import EntryClick
-from .system import do_every
+from .search import Search
+from .watch import FileWatcher
+from .widgets.activity import Activity
+from .widgets.activity import BucketClick
 from .widgets.details import Details
 from .widgets.footer import Footer
 from .widgets.help import Help
@@ -28,6 +42,11 @@ logging.basicConfig(level=logging.ERROR)
 
 MODULE_LOGGER = logging.getLogger("Textual")
 
+FIRST_PAINT_BYTES = 64 * 1024
+"""The number of bytes that are indexed before the first screen is rendered."""
+INDEX_CHUNK_BYTES = 4 * 1024 * 1024
+"""The number of bytes that are indexed in one go by the worker thread, per worker process."""
+
 
 class TextualLog(App):
 
@@ -35,30 +54,32 @@ class TextualLog(App):
     show_namespaces = Reactive(False)
     show_details = Reactive(False)
 
-    # The namespace_tree is just for demonstration purposes. The namespace should be a
-    # tree like structure with proper navigation and the possibility to add and remove nodes.
-
-    namespace_tree = {
-        "egse": {
-            "system": "system",
-            "decorators": {"x": 1, "y": 2},
-        }
-    }
-
-    def __init__(self, filename: str = None, **kwargs):
+    def __init__(self, filenames: List[str] = None, index_dir: str = None, log_format: str = None, **kwargs):
         super().__init__(**kwargs)
-        self.filename = filename
-        self.cursor = 0
+        self.filenames = filenames
+        """The log files, the records of several log files are merged into one timeline."""
+        self.index_dir = index_dir
+        """The directory where the index of the log file is saved, None to not save the index."""
+        self.log_format = log_format
+        """The name of the format of the log files, None to detect the format of each log file."""
         self.loader = None
         self.details_widget = None
         self.follow = False
+        self._follow_task = None
+        self._index_task = None
+        self.search: Optional[Search] = None
+        self._search_task = None
+        self._prompt: Optional[str] = None
+        """The label of the prompt that is shown in the footer while the user types a value."""
+        self._prompt_input = ""
+        self._prompt_action: Optional[Callable[[str], None]] = None
 
     async def on_mount(self, event: events.Mount) -> None:
         """
         Call after terminal goes in to application mode.
         """
 
-        self.namespaces = Namespaces("Name space", self.namespace_tree)
+        self.namespaces = Namespaces("Name space")
         self.namespaces.layout_offset_x = -40
 
         self.help_widget = Help()
@@ -83,58 +104,113 @@ class TextualLog(App):
 
         grid.add_row(fraction=1, name="top")
         grid.add_row(fraction=1, name="middle")
+        grid.add_row(size=7, name="activity")
         grid.add_row(size=7, name="bottom")
 
         grid.add_areas(
             area1="left-start|right-end,top-start|middle-end",
             area2="left,bottom",
             area3="right,bottom",
+            area4="left-start|right-end,activity",
         )
 
         self.levels = Levels()
         self.records = Records()
         self.record_info = RecordInfo()
+        self.activity = Activity()
 
         grid.place(
             area1=self.records,
             area2=self.levels,
             area3=self.record_info,
+            area4=self.activity,
         )
 
-        if self.filename:
-            self.loader = KeyValueLoader(self.filename)
-            self.loader.load()
-            self.loader.process(0, 500, None)
-            self.footer.log_size = self.loader.size()
+        if self.filenames:
+            self.loader = open_loader(
+                self.filenames, workers=os.cpu_count() or 1, index_dir=self.index_dir,
+                parser=get_parser(self.log_format) if self.log_format else None,
+            )
+            self.loader.load(max_bytes=FIRST_PAINT_BYTES)
+            self.records.attach(self.loader, self.levels)
+            self.show_log_size()
 
-            # The height of the self.records view is not yet known, so we take a large enough number
+            self._index_task = asyncio.create_task(self.index_log_file())
 
-            self.records.update(self.loader.get_records(0, 500, None))
+    async def index_log_file(self):
+        """
+        Indexes the remainder of the log file in chunks in a worker thread. The view can be
+        navigated on the part of the file that is already indexed. When the log file is indexed,
+        the index is saved so the file opens instantly the next time.
+        """
+        loop = asyncio.get_running_loop()
 
-        # self.set_interval(2.0, self.collect_data)
+        while not self.loader.is_indexed():
+            await loop.run_in_executor(None, self.loader.load, INDEX_CHUNK_BYTES * self.loader.workers)
+            self.show_log_size()
 
-        self._reload_thread = threading.Thread(
-            target=do_every, args=(2.0, self.collect_data))
-        self._reload_thread.daemon = True
-        self._reload_thread.start()
+            # Fill the view when the first chunk didn't contain enough records
 
-    # @timer(level=logging.DEBUG)
-    def collect_data(self):
-        if not self.follow or self.loader is None:
-            return
+            if len(self.records.records) < self.records.page_size:
+                self.records.refresh(layout=True)
 
-        self.loader.load()
+        await loop.run_in_executor(None, self.loader.save_index)
 
-        # The height of the text area of the Records panel
+    def show_log_size(self):
+        """Shows the number of lines, the indexing progress, the level and namespace counts and the activity."""
+        self.footer.log_size = self.loader.size()
+        self.footer.indexed_bytes, self.footer.file_bytes = self.loader.progress()
+        self.levels.counts = self.loader.level_counts()
+        self.activity.set(self.loader.histogram())
+        asyncio.create_task(self.namespaces.update_counts(self.loader.namespace_counts()))
 
-        height = self.records.size.height - 2
-        size = self.loader.size()
+    def toggle_follow(self):
+        """Switches follow mode on or off, new records are shown as soon as they are written."""
+        self.follow = not self.follow
+        self.header.style = "white on dark_red" if self.follow else "white on dark_green"
 
-        self.cursor = max(0, size - height)
-        self.records.replace(self.loader.get_records(self.cursor, height, self.levels))
-        self.records.refresh(layout=True)
-        self.cursor = self.loader.offset  # the cursor/offset might have changed
-        self.footer.log_size = size
+        if self.follow:
+            self._follow_task = asyncio.create_task(self.follow_log_file())
+        elif self._follow_task is not None:
+            self._follow_task.cancel()
+            self._follow_task = None
+
+    async def follow_log_file(self):
+        """
+        Loads the new records whenever the log files change and shows the end of the log file.
+
+        The task runs on the event loop of the app, the loader is only loaded in a worker thread,
+        which is serialised with the navigation by the lock of the loader. The widgets are only
+        updated from the event loop, so key handling never races with following.
+        """
+        loop = asyncio.get_running_loop()
+        watcher = FileWatcher(self.filenames)
+        try:
+            while True:
+                await loop.run_in_executor(None, self.collect_data, self.search)
+                self.show_search_status()
+                self.records.scroll_to_end()
+                self.records.refresh(layout=True)
+                self.show_log_size()
+                await watcher.wait()
+        finally:
+            watcher.close()
+
+    # @timer(level=logging.DEBUG)
+    def collect_data(self, search: Optional[Search]):
+        """
+        Loads the new records and searches them, this is executed in a worker thread. A log file
+        that is rotated by renaming it and creating a new one is missing for a moment, the new
+        file is loaded when the watcher notices that it was created.
+        """
+        try:
+            self.loader.load()
+        except FileNotFoundError as exc:
+            MODULE_LOGGER.info(f"Waiting for the log file to reappear: {exc}")
+            return
+
+        if search is not None:
+            search.run(max_bytes=None)
 
     async def on_load(self) -> None:
         """
@@ -144,71 +220,168 @@ class TextualLog(App):
         await self.bind("q", "quit", "Quit")
         await self.bind("?", "toggle_help", "Help")
 
+    def start_prompt(self, label: str, action: Callable[[str], None]):
+        """Asks the user for a value in the footer, the action is called with the value on Enter."""
+        self._prompt = label
+        self._prompt_input = ""
+        self._prompt_action = action
+        self.footer.prompt = f"{label}: "
+
+    def handle_prompt_key(self, key: str):
+        if key == Keys.Escape:
+            self._prompt = None
+        elif key in (Keys.Enter, Keys.ControlM):
+            self._prompt = None
+            self._prompt_action(self._prompt_input)
+        elif key in (Keys.Backspace, Keys.ControlH):
+            self._prompt_input = self._prompt_input[:-1]
+        elif len(key) == 1 and key.isprintable():
+            self._prompt_input += key
+
+        self.footer.prompt = None if self._prompt is None else f"{self._prompt}: {self._prompt_input}"
+
+    def goto_time(self, text: str):
+        """Positions the view at the first record that was created at or after the given time."""
+        created = [record.created for record in self.records.records if record.created is not None]
+        reference = from_timestamp(created[0]) if created else None
+        try:
+            timestamp = parse_datetime(text, reference).timestamp()
+        except ValueError:
+            self.app.sub_title = f"Invalid time: {text}"
+            return
+
+        self.show_records_at(self.loader.find_time(timestamp))
+
+    def start_search(self, text: str):
+        """
+        Starts a search for the text in a worker thread, the view jumps to the first match after
+        the current position as soon as it is found. The text is used as a regular expression
+        when it is valid, otherwise as a literal string.
+        """
+        if not text:
+            self.search = None
+            self.footer.search_status = ""
+            return
+
+        try:
+            re.compile(text)
+            regex = True
+        except re.error:
+            regex = False
+
+        self.search = self.loader.search(text, regex=regex)
+        self._search_task = asyncio.create_task(self.run_search(self.search))
+
+    async def run_search(self, search: Search):
+        loop = asyncio.get_running_loop()
+        start = self.cursor
+        found = False
+
+        while self.search is search and not search.is_done():
+            await loop.run_in_executor(None, search.run)
+            self.show_search_status()
+
+            if not found and len(search):
+                line = self.loader.next_match(search, start - 1, +1, self.levels, self.records.namespace)
+                if line is not None:
+                    found = True
+                    self.show_records_at(line)
+                    self.records.refresh(layout=True, repaint=True)
+
+    def show_search_status(self):
+        if self.search is not None:
+            searching = "" if self.search.is_done() else "searching, "
+            self.footer.search_status = f"/{self.search.pattern}: {searching}{len(self.search)} matches, "
+
+    def goto_match(self, direction: int):
+        """Positions the view at the next (direction > 0) or previous match of the search."""
+        if self.search is None:
+            return
+
+        line = self.loader.next_match(self.search, self.cursor, direction, self.levels, self.records.namespace)
+        if line is None:
+            self.app.sub_title = f"No {'next' if direction > 0 else 'previous'} match for {self.search.pattern}"
+            return
+
+        self.show_records_at(line)
+
+    @property
+    def cursor(self) -> int:
+        """The line number of the first record in the Records panel."""
+        return self.records.top_line
+
+    def show_records_at(self, line: int):
+        """Shows the records starting from the record at the given line number."""
+        self.records.show(line)
+        self.footer.log_offset = self.cursor
+
     async def on_key(self, event) -> None:
 
         if self.loader is None:
             return
 
-        # The height of the text area of the Records panel
+        if self._prompt is not None:
+            event.prevent_default()  # don't let the key bindings act on the typed characters
+            self.handle_prompt_key(event.key)
+            self.records.refresh(layout=True, repaint=True)
+            return
+
+        # The number of records in the Records panel
 
-        height = self.records.size.height - 2
-        size = self.loader.size()
+        height = self.records.page_size
 
         self.app.sub_title = f"Key pressed: {event.key}"
 
         if event.key == "d":
             self.levels.debug_level = not self.levels.debug_level
-            self.records.replace(self.loader.get_records(self.cursor, height, self.levels))
+            self.records.show(self.cursor)
         elif event.key == "i":
             self.levels.info_level = not self.levels.info_level
-            self.records.replace(self.loader.get_records(self.cursor, height, self.levels))
+            self.records.show(self.cursor)
         elif event.key == "w":
             self.levels.warning_level = not self.levels.warning_level
-            self.records.replace(self.loader.get_records(self.cursor, height, self.levels))
+            self.records.show(self.cursor)
         elif event.key == "e":
             self.levels.error_level = not self.levels.error_level
-            self.records.replace(self.loader.get_records(self.cursor, height, self.levels))
+            self.records.show(self.cursor)
         elif event.key == "c":
             self.levels.critical_level = not self.levels.critical_level
-            self.records.replace(self.loader.get_records(self.cursor, height, self.levels))
-        elif event.key in "nN":
+            self.records.show(self.cursor)
+        elif event.key == "t":
             self.show_namespaces = not self.show_namespaces
+        elif event.key == "/":
+            self.start_prompt("Search", self.start_search)
+        elif event.key == "n":
+            self.goto_match(+1)
+        elif event.key == "N":
+            self.goto_match(-1)
         elif event.key == "r":
-            self.loader.load()
-            self.footer.log_size = self.loader.size()
+            if self.loader.is_indexed():  # while indexing, the index task loads the new lines
+                await asyncio.get_running_loop().run_in_executor(None, self.collect_data, self.search)
+                self.show_search_status()
+                self.show_log_size()
         elif event.key == "f":
-            self.follow = not self.follow
-            self.header.style = "white on dark_red" if self.follow else "white on dark_green"
-            # self.collect_data()
+            self.toggle_follow()
+        elif event.key == "g":
+            self.start_prompt("Go to time", self.goto_time)
         elif event.key == Keys.Escape:
             self.show_help = False
             self.show_namespaces = False
             self.show_details = False
         elif event.key == Keys.Down:
-            self.cursor = min(size, self.cursor + 1)
-            self.records.replace(self.loader.get_records(self.cursor, height, self.levels, +1))
-            self.footer.log_offset = self.cursor = self.loader.offset
+            self.records.scroll(1)
         elif event.key == Keys.Up:
-            self.cursor = max(0, self.cursor - 1)
-            self.records.replace(self.loader.get_records(self.cursor, height, self.levels, -1))
-            self.footer.log_offset = self.cursor = self.loader.offset
+            self.records.scroll(-1)
         elif event.key == Keys.PageDown:
-            self.cursor = min(size, self.cursor+(height-1))
-            self.records.replace(self.loader.get_records(self.cursor, height, self.levels))
-            self.footer.log_offset = self.cursor = self.loader.offset
+            self.records.scroll(height - 1)
         elif event.key == Keys.PageUp:
-            self.cursor = max(0, self.cursor-(height-1))
-            self.records.replace(self.loader.get_records(self.cursor, height, self.levels))
-            self.footer.log_offset = self.cursor = self.loader.offset
+            self.records.scroll(-(height - 1))
         elif event.key == Keys.End:
-            self.cursor = max(0, size - height)
-            self.footer.log_offset = self.cursor
-            self.records.replace(self.loader.get_records(self.cursor, height, self.levels))
+            self.records.scroll_to_end()
         elif event.key == Keys.Home:
-            self.cursor = 0
-            self.footer.log_offset = self.cursor
-            self.records.replace(self.loader.get_records(self.cursor, height, self.levels))
+            self.records.show(0)
 
+        self.footer.log_offset = self.cursor
         self.records.refresh(layout=True, repaint=True)
 
     async def watch_show_namespaces(self, show_namespaces: bool) -> None:
@@ -229,13 +402,28 @@ class TextualLog(App):
         self.show_help = not self.show_help
 
     async def handle_entry_click(self, message: EntryClick) -> None:
-        """A message sent by the namespace tree when an entry is clicked."""
+        """
+        A message sent by the namespace tree when an entry is clicked, the Records panel only
+        shows the records from that namespace and its sub-namespaces, the root shows all records.
+        """
 
-        self.app.sub_title = f"{message.key}"
+        self.app.sub_title = message.key or ""
+        self.records.namespace = message.key
+        self.show_records_at(self.cursor)
+        self.records.refresh(layout=True)
+
+    async def handle_bucket_click(self, message: BucketClick) -> None:
+        """A message sent by the Activity panel when a column is clicked, shows the records from that time."""
+
+        self.show_records_at(self.loader.find_time(message.timestamp))
         self.records.refresh(layout=True)
 
 
 def main():
+    if sys.argv[1:2] == ["query"]:
+        from .query import main as query_main
+        return query_main(sys.argv[2:])
+
     from rich.traceback import install
     install(show_locals=False)
 
@@ -256,8 +444,19 @@ def main():
         "--log",
         "-l",
         type=str,
+        nargs="+",
         default=None,
-        help="the full path to the log file that you want to follow",
+        help="the full path to the log file that you want to follow,\n"
+             "rotated log files compressed with gzip, bzip2, xz or zstd can be opened too,\n"
+             "the records of several log files or a glob pattern are merged into one timeline",
+    )
+
+    parser.add_argument(
+        "--format",
+        "-f",
+        choices=list(PARSERS),
+        default=None,
+        help="the format of the log files, by default the format is detected from the start of each log file",
     )
 
     parser.add_argument(
@@ -268,17 +467,30 @@ def main():
         help="send debugging information to the debug log files",
     )
 
+    parser.add_argument(
+        "--no-index-cache",
+        action="store_true",
+        default=False,
+        help="don't save the index of the log file, which makes reopening a large log file fast",
+    )
+
     args = parser.parse_args()
 
-    if args.log and not Path(args.log).exists():
-        raise FileNotFoundError(f"No such file {args.log}")
+    filenames = expand_filenames(args.log) if args.log else None
+
+    for filename in filenames or []:
+        if not Path(filename).exists():
+            raise FileNotFoundError(f"No such file {filename}")
 
     log_filename = "textual.log" if args.debug else None
 
     if args.debug:
         setup_logging("textualog.log")
 
-    TextualLog.run(title="Textual Log Viewer", log=log_filename, filename=args.log)
+    index_dir = None if args.no_index_cache else default_index_dir()
+
+    TextualLog.run(title="Textual Log Viewer", log=log_filename, filenames=filenames, index_dir=index_dir,
+                   log_format=args.format)
 
 
 def _get_version_text():
@@ -0,0 +1,57 @@
+from collections import OrderedDict
+from typing import Any
+from typing import Hashable
+
+
+class LRUCache:
+    """
+    A bounded mapping that discards the least recently used item when it is full.
+
+    The number of cache hits and misses are counted to evaluate the capacity of the cache.
+    """
+
+    def __init__(self, capacity: int):
+        if capacity < 1:
+            raise ValueError(f"The capacity of the cache shall be at least 1, got {capacity}.")
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._items: OrderedDict = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Returns the item for the given key and marks it as most recently used."""
+        try:
+            value = self._items[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._items.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value: Any):
+        """Adds or replaces an item, discarding the least recently used item when full."""
+        self._items[key] = value
+        self._items.move_to_end(key)
+        if len(self._items) > self.capacity:
+            self._items.popitem(last=False)
+
+    def discard(self, key: Hashable):
+        """Removes the item for the given key if it is in the cache."""
+        self._items.pop(key, None)
+
+    def clear(self):
+        """Removes all items from the cache, the hit and miss counters are kept."""
+        self._items.clear()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._items
+
+    def __str__(self):
+        return (
+            f"{self.__class__.__name__}(size={len(self)}, capacity={self.capacity}, "
+            f"hits={self.hits}, misses={self.misses})"
+        )
@@ -0,0 +1,280 @@
+"""
+Random access to the content of compressed log files.
+
+Rotated log files are often compressed with gzip, bzip2, xz or zstd. The content of such a file
+is decompressed while it is read, it is never inflated to a temporary file. Decompressing a
+compressed stream can only start at the beginning of the stream, so while the file is read for
+the first time, seek points are kept: the state of the decompressor every few MB for gzip (zlib
+allows to copy its state), and the start of every stream for all formats, e.g. the members of a
+gzip file that was written by pigz or the frames of a zstd file. A page anywhere in the file is
+then decompressed from the seek point before it, not from the start of the file.
+
+The decompressed content is kept in blocks of `BLOCK_SIZE` bytes, only the most recently used
+blocks are cached.
+"""
+import bz2
+import logging
+import lzma
+import mmap
+import threading
+import zlib
+from bisect import bisect_right
+from typing import Callable
+from typing import Iterator
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Tuple
+from typing import Union
+
+from .cache import LRUCache
+
+BLOCK_SIZE = 1024 * 1024
+"""The number of decompressed bytes in a block."""
+BLOCK_CACHE_SIZE = 32
+"""The number of decompressed blocks that are cached."""
+INPUT_SIZE = 64 * 1024
+"""The number of compressed bytes that are passed to the decompressor in one go."""
+CHECKPOINT_INTERVAL = 4 * 1024 * 1024
+"""The number of decompressed bytes between two copies of the decompressor state."""
+MAGIC = {
+    b"\x1f\x8b": "gzip",
+    b"BZh": "bz2",
+    b"\xfd7zXZ\x00": "xz",
+    b"\x28\xb5\x2f\xfd": "zstd",
+}
+"""The first bytes of a compressed stream for each of the supported formats."""
+MAGIC_SIZE = max(map(len, MAGIC))
+"""The number of bytes at the start of a file that are needed to recognise the format."""
+
+MODULE_LOGGER = logging.getLogger("Textual.compressed")
+
+
+def compression(head: bytes) -> Optional[str]:
+    """Returns the compression format of a file given its first bytes, None when it's not compressed."""
+    for magic, name in MAGIC.items():
+        if head.startswith(magic):
+            return name
+    return None
+
+
+def _zstd_decompressor() -> Callable:
+    try:
+        from compression import zstd  # Python 3.14 and later
+        return zstd.ZstdDecompressor
+    except ImportError:
+        pass
+    try:
+        import zstandard
+    except ImportError:
+        raise ModuleNotFoundError(
+            "Reading zstd compressed log files requires the zstandard package: pip install zstandard"
+        ) from None
+    return lambda: zstandard.ZstdDecompressor().decompressobj()
+
+
+def _new_decompressor(name: str) -> Callable:
+    """Returns a function that creates a decompressor for one stream of the given format."""
+    if name == "gzip":
+        return lambda: zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+    if name == "bz2":
+        return bz2.BZ2Decompressor
+    if name == "xz":
+        return lambda: lzma.LZMADecompressor(format=lzma.FORMAT_XZ)
+    if name == "zstd":
+        return _zstd_decompressor()
+    raise ValueError(f"Unknown compression format: {name}")
+
+
+class Checkpoint(NamedTuple):
+    """A position in the compressed file where decompression can start."""
+
+    offset: int
+    """The offset in the decompressed content."""
+    raw_offset: int
+    """The offset in the compressed file of the next input for the decompressor."""
+    state: object
+    """A copy of the decompressor state, None at the start of a stream."""
+
+
+class CompressedData:
+    """
+    A read-only view on the decompressed content of a compressed file.
+
+    The view supports `len()`, slicing and `find()` like the memory map of a plain log file. The
+    content is decompressed incrementally by `advance()`, the length is the number of bytes that
+    were decompressed so far, until the end of the file is reached.
+
+    One thread advances the content while other threads read it, a short lock protects the
+    block cache and the last block.
+    """
+
+    def __init__(self, raw: Union[mmap.mmap, bytes], name: str):
+        self.raw = raw
+        """The compressed content, memory mapped when possible."""
+        self.name = name
+        """The name of the compression format."""
+        self._new_decompressor = _new_decompressor(name)
+        self._checkpoints: List[Checkpoint] = [Checkpoint(0, 0, None)]
+        self._checkpoint_offsets = [0]
+        self._blocks = LRUCache(BLOCK_CACHE_SIZE)
+        """The most recently used decompressed blocks, keyed by block number."""
+        self._frontier: Iterator = self._decompress(0, self._new_decompressor())
+        """Decompresses the content that has not been read yet."""
+        self._tail = bytearray()
+        """The decompressed bytes of the last, incomplete block."""
+        self._size = 0
+        """The number of bytes that were decompressed."""
+        self._raw_offset = 0
+        """The number of compressed bytes that were decompressed."""
+        self.line_end = 0
+        """The offset after the last newline character in the content that was decompressed."""
+        self.eof = False
+        """True when the complete file was decompressed."""
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def estimated_size(self) -> int:
+        """Returns the size of the decompressed content, estimated from the part that was decompressed."""
+        if self.eof or not self._raw_offset:
+            return self._size
+        return max(self._size, self._size * len(self.raw) // self._raw_offset)
+
+    def advance(self, size: Optional[int] = None):
+        """Decompresses until at least `size` bytes are decompressed, or the complete file when None."""
+        while not self.eof and (size is None or self._size < size):
+            with self._lock:
+                self._advance()
+
+    def _advance(self):
+        """Decompresses the next input of the frontier."""
+        try:
+            data, raw_offset, decompressor = next(self._frontier)
+        except StopIteration:
+            self.eof = True
+            return
+
+        if decompressor is not None and self._size - self._checkpoint_offsets[-1] >= CHECKPOINT_INTERVAL:
+            self._add_checkpoint(self._size + len(data), raw_offset, decompressor.copy())
+        elif decompressor is None and data == b"":
+            self._add_checkpoint(self._size, raw_offset, None)  # the start of the next stream
+
+        newline = data.rfind(b'\n')
+        if newline != -1:
+            self.line_end = self._size + newline + 1
+        self._raw_offset = raw_offset
+        self._add_output(data)
+
+    def _add_checkpoint(self, offset: int, raw_offset: int, state: object):
+        if offset > self._checkpoint_offsets[-1] or self._checkpoints[-1].state is not None:
+            self._checkpoints.append(Checkpoint(offset, raw_offset, state))
+            self._checkpoint_offsets.append(offset)
+
+    def _add_output(self, data: bytes):
+        """Adds decompressed output of the frontier to the last block, complete blocks are cached."""
+        pos = 0
+        while pos < len(data):
+            needed = BLOCK_SIZE - len(self._tail)
+            self._tail += data[pos:pos + needed]
+            pos += needed
+            if len(self._tail) == BLOCK_SIZE:
+                self._blocks.put((self._size + min(pos, len(data))) // BLOCK_SIZE - 1, bytes(self._tail))
+                self._tail = bytearray()
+        self._size += len(data)
+
+    def _decompress(self, raw_offset: int, decompressor) -> Iterator[Tuple[bytes, int, object]]:
+        """
+        Decompresses the file starting at `raw_offset` with the given decompressor state.
+
+        Yields:
+            The decompressed output, the offset of the next compressed input and the decompressor
+            when its state can be copied. At the start of a stream, an empty output is yielded
+            without decompressor.
+        """
+        raw = self.raw
+        copyable = hasattr(decompressor, "copy")
+        while raw_offset < len(raw):
+            data = raw[raw_offset:raw_offset + INPUT_SIZE]
+            raw_offset += len(data)
+            output = decompressor.decompress(data)
+
+            if not getattr(decompressor, "eof", False):
+                yield output, raw_offset, decompressor if copyable else None
+                continue
+
+            # The end of a stream, a file can be a concatenation of streams
+
+            raw_offset -= len(decompressor.unused_data)
+            yield output, raw_offset, None
+            if compression(raw[raw_offset:raw_offset + MAGIC_SIZE]) != self.name:
+                if raw_offset < len(raw):
+                    MODULE_LOGGER.warning(f"Ignoring {len(raw) - raw_offset} trailing bytes after the last stream.")
+                return
+            decompressor = self._new_decompressor()
+            yield b"", raw_offset, None
+
+    def _block(self, number: int) -> bytes:
+        """Returns a complete block, it is decompressed from the seek point before it when not cached."""
+        block = self._blocks.get(number)
+        if block is not None:
+            return block
+
+        start = number * BLOCK_SIZE
+        checkpoint = self._checkpoints[bisect_right(self._checkpoint_offsets, start) - 1]
+        decompressor = self._new_decompressor() if checkpoint.state is None else checkpoint.state.copy()
+
+        # The next block is decompressed too, the next access is likely sequential
+
+        stop = min(start + 2 * BLOCK_SIZE, self._size // BLOCK_SIZE * BLOCK_SIZE)
+        offset = checkpoint.offset
+        buffer = bytearray()
+        for data, _, _ in self._decompress(checkpoint.raw_offset, decompressor):
+            if offset + len(data) > start:
+                buffer += data[max(0, start - offset):stop - offset]
+            offset += len(data)
+            if offset >= stop:
+                break
+
+        for idx in range(len(buffer) // BLOCK_SIZE - 1, -1, -1):
+            self._blocks.put(number + idx, bytes(buffer[idx * BLOCK_SIZE:(idx + 1) * BLOCK_SIZE]))
+        return bytes(buffer[:BLOCK_SIZE])
+
+    def _slice(self, number: int, start: int, stop: int) -> bytes:
+        """Returns the bytes start:stop of a block, the last block is still being decompressed."""
+        with self._lock:
+            if number == self._size // BLOCK_SIZE:
+                return bytes(self._tail[start:stop])
+            return self._block(number)[start:stop]
+
+    def __getitem__(self, item: slice) -> bytes:
+        if not isinstance(item, slice) or item.step not in (None, 1):
+            raise TypeError("only slices without step are supported")
+        start, stop, _ = item.indices(self._size)
+        if start >= stop:
+            return b""
+        first, last = start // BLOCK_SIZE, (stop - 1) // BLOCK_SIZE
+        if first == last:
+            return self._slice(first, start - first * BLOCK_SIZE, stop - first * BLOCK_SIZE)
+        parts = [self._slice(first, start - first * BLOCK_SIZE, BLOCK_SIZE)]
+        parts.extend(self._slice(number, 0, BLOCK_SIZE) for number in range(first + 1, last))
+        parts.append(self._slice(last, 0, stop - last * BLOCK_SIZE))
+        return b"".join(parts)
+
+    def find(self, sub: bytes, start: int = 0, end: Optional[int] = None) -> int:
+        """Returns the lowest offset where sub is found in the decompressed content, -1 when not found."""
+        end = self._size if end is None else min(end, self._size)
+        pos = start
+        while pos < end:
+            stop = min((pos // BLOCK_SIZE + 1) * BLOCK_SIZE + len(sub) - 1, end)
+            found = self[pos:stop].find(sub)
+            if found != -1:
+                return pos + found
+            pos = stop - len(sub) + 1 if stop < end else end
+        return -1
+
+    def close(self):
+        if isinstance(self.raw, mmap.mmap):
+            self.raw.close()
+        self._blocks.clear()
@@ -0,0 +1,194 @@
+"""
+The activity of a log file over time: the number of records per logging level in time buckets.
+
+The buckets have a fixed width in seconds and are aligned to the epoch, bucket `idx` of a
+histogram covers `[(first + idx) * width, (first + idx + 1) * width)`. The number of buckets is at
+most `HISTOGRAM_SIZE`, when the records span more time the width is doubled and every two buckets
+are merged, so the histograms of several log files always line up.
+
+The histogram is computed from the index, not from the records. The creation times are sorted,
+so the records of a bucket are found with a binary search for the bucket boundaries and the
+number of records per level in that range with a binary search in the per-level record ids. The
+cost of an update is proportional to the number of buckets that received new records, whatever
+the number of records, and when the log file is followed only the new records are counted.
+Records without a creation time are not counted.
+"""
+import math
+from array import array
+from operator import add
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from .index import IndexSnapshot
+from .parsers import LEVEL_CODES
+
+HISTOGRAM_SIZE = 1024
+"""The maximum number of time buckets in a histogram."""
+MIN_BUCKET_WIDTH = 1.0
+"""The width in seconds of the buckets of a log file that spans less than `HISTOGRAM_SIZE` seconds."""
+
+
+class TimeHistogram:
+    """
+    The number of records per logging level in fixed width time buckets, see the module doc.
+
+    The histogram is updated from snapshots of the index of a log file with `update()`, which
+    counts the records that were added since the previous update.
+    """
+
+    def __init__(self):
+        self.width = MIN_BUCKET_WIDTH
+        """The width of a bucket in seconds."""
+        self.first = 0
+        """The index of the first bucket counted from the epoch, i.e. its start time divided by the width."""
+        self.counts: Dict[int, array] = _new_counts()
+        """The number of records in each bucket for each logging level, array('Q')."""
+        self._counted = 0
+        """The number of records that are counted."""
+        self._last: Optional[Tuple[float, int]] = None
+        """The creation time and level of the last counted record, which can still change."""
+        self._resets = 0
+
+    def __len__(self) -> int:
+        """Returns the number of buckets."""
+        return len(self.counts[min(self.counts)])
+
+    def reset(self):
+        """Forgets all counted records, e.g. when the log file was rotated."""
+        self.width = MIN_BUCKET_WIDTH
+        self.first = 0
+        self.counts = _new_counts()
+        self._counted = 0
+        self._last = None
+
+    def start(self, bucket: int) -> float:
+        """Returns the start time of the bucket as a POSIX timestamp."""
+        return (self.first + bucket) * self.width
+
+    def update(self, snapshot: IndexSnapshot):
+        """Counts the records that were added to the index since the previous update."""
+        if snapshot.resets != self._resets or snapshot.record_count() < self._counted - 1:
+            self.reset()
+            self._resets = snapshot.resets
+
+        # The last record is counted again, its line might not have been completely written
+
+        if self._last is not None:
+            created, level = self._last
+            self.counts[level][self._bucket(created)] -= 1
+            self._counted -= 1
+            self._last = None
+
+        start, stop = self._counted, snapshot.record_count()
+        if stop > start and math.isnan(snapshot.created(stop - 1)):
+            stop -= 1  # e.g. the time of the last record is not written yet, it is counted later
+        first = max(start, snapshot.find_time_after(-math.inf))  # the records before have no creation time
+        if first >= stop:
+            self._counted = max(start, stop)
+            return
+
+        begin, end = snapshot.timeline_time(first), snapshot.timeline_time(stop - 1)
+        self._counted = stop
+
+        if not len(self):
+            self.first = math.floor(begin / self.width)
+        while math.floor(end / self.width) - self.first >= HISTOGRAM_SIZE:
+            self._coarsen()
+        last = max(self._bucket(end), self._bucket(begin))
+        self._extend(last + 1)
+
+        rid = first
+        for bucket in range(self._bucket(begin), last + 1):
+            bound = stop if bucket == last else min(max(snapshot.find_time(self.start(bucket + 1)), rid), stop)
+            if bound > rid:
+                for level, size in snapshot.level_counts(rid, bound).items():
+                    self.counts[level][bucket] += size
+            rid = bound
+
+        # The records without a creation time were counted at the time of the record before them
+
+        for rid in snapshot.untimed(first, stop):
+            level = snapshot.level_of(rid)
+            if level is not None:
+                self.counts[level][self._bucket(snapshot.timeline_time(rid))] -= 1
+
+        level = snapshot.level_of(stop - 1)
+        if level is not None and not math.isnan(snapshot.created(stop - 1)):
+            self._last = (end, level)
+
+    def columns(self, num: int) -> Tuple[float, float, Dict[int, List[int]]]:
+        """
+        Returns the histogram in at most `num` columns, every column sums the same number of
+        consecutive buckets.
+
+        Returns:
+            The start time and the width in seconds of the columns, and the number of records in
+            each column for each logging level.
+        """
+        group = max(1, math.ceil(len(self) / max(num, 1)))
+        counts = {
+            level: [sum(buckets[idx:idx + group]) for idx in range(0, len(buckets), group)]
+            for level, buckets in self.counts.items()
+        }
+        return self.start(0), self.width * group, counts
+
+    def copy(self) -> "TimeHistogram":
+        histogram = TimeHistogram()
+        histogram.width, histogram.first = self.width, self.first
+        histogram.counts = {level: array('Q', buckets) for level, buckets in self.counts.items()}
+        return histogram
+
+    @classmethod
+    def combine(cls, histograms: Iterable["TimeHistogram"]) -> "TimeHistogram":
+        """Returns the histogram of the records of several log files, e.g. of a merged timeline."""
+        histograms = [histogram.copy() for histogram in histograms if len(histogram)]
+        combined = cls()
+        if not histograms:
+            return combined
+
+        width = max(histogram.width for histogram in histograms)
+        for histogram in histograms:
+            while histogram.width < width:
+                histogram._coarsen()
+
+        combined.width = width
+        combined.first = min(histogram.first for histogram in histograms)
+        combined._extend(max(histogram.first + len(histogram) for histogram in histograms) - combined.first)
+        for histogram in histograms:
+            offset = histogram.first - combined.first
+            for level, buckets in histogram.counts.items():
+                combined_buckets = combined.counts[level]
+                combined_buckets[offset:offset + len(buckets)] = array(
+                    'Q', map(add, combined_buckets[offset:offset + len(buckets)], buckets)
+                )
+        while len(combined) > HISTOGRAM_SIZE:
+            combined._coarsen()
+        return combined
+
+    def _bucket(self, created: float) -> int:
+        """Returns the bucket of the creation time, a time before the first bucket is in the first bucket."""
+        return max(math.floor(created / self.width) - self.first, 0)
+
+    def _extend(self, size: int):
+        """Adds empty buckets up to the given number of buckets."""
+        for buckets in self.counts.values():
+            if len(buckets) < size:
+                buckets.extend(array('Q', [0]) * (size - len(buckets)))
+
+    def _coarsen(self):
+        """Doubles the width of the buckets, every two buckets are merged."""
+        pad = self.first % 2
+        for level, buckets in self.counts.items():
+            padded = array('Q', [0]) * pad + buckets
+            if len(padded) % 2:
+                padded.append(0)
+            self.counts[level] = array('Q', map(add, padded[0::2], padded[1::2]))
+        self.first //= 2
+        self.width *= 2
+
+
+def _new_counts() -> Dict[int, array]:
+    return {level: array('Q') for level in LEVEL_CODES.values()}
@@ -0,0 +1,999 @@
+"""
+Compact indexes over the lines and records of a log file.
+
+The log file is memory mapped and only the byte offset of the start of each line is kept in
+memory. Lines are decoded when they are requested, so memory usage stays roughly flat no matter
+how big the log file is.
+
+A record is a line that starts like a record in the format of the log file, e.g. `level=` for
+the key-value format, together with the lines that follow it up to the next record, e.g. a
+Traceback or a multiline message. The format is detected from the start of the file, see
+`parsers.detect_parser()`. The index keeps the line number of the
+first line of each record, which maps lines to records and records to their lines. For each
+logging level, the sorted ids of the records with that level are kept as well, which allows to
+page through a level filtered view without looking at the records that are filtered out. In the
+same way, the record ids are kept for each namespace, e.g. the dotted module name in the
+`caller=` field, so the records of a namespace subtree are found without looking at the other
+records. The creation time of each record, e.g. from the `ts=` field, is kept in the index too.
+
+The index can be saved to a binary sidecar file and restored when the same log file is opened
+again, only the lines that were appended since are then indexed.
+
+A compressed log file, e.g. a rotated `general.log.1.gz`, is decompressed while it is indexed,
+the offsets are then offsets in the decompressed content, see `compressed.CompressedData`.
+"""
+import hashlib
+import logging
+import math
+import mmap
+import multiprocessing
+import os
+import pickle
+import struct
+import sys
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from bisect import bisect_left
+from bisect import bisect_right
+from heapq import merge
+from itertools import accumulate
+from itertools import compress
+from itertools import count
+from itertools import islice
+from itertools import repeat
+from operator import add
+from operator import eq
+from operator import le
+from operator import methodcaller
+from typing import Collection
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Tuple
+from typing import Union
+
+from .compressed import BLOCK_SIZE
+from .compressed import CompressedData
+from .compressed import MAGIC_SIZE
+from .compressed import compression
+from .parsers import LEVEL_CODES
+from .parsers import PARSERS
+from .parsers import SAMPLE_SIZE
+from .parsers import LogParser
+from .parsers import detect_parser
+
+CHUNK_SIZE = 8 * 1024 * 1024
+"""The number of bytes that are scanned for newlines in one go."""
+HEAD_SIZE = 256
+"""The number of bytes at the start of the file that are used to recognise the file."""
+PARALLEL_MIN_BYTES = 4 * 1024 * 1024
+"""The minimum number of bytes per worker process to index a part of the file in parallel."""
+
+SIDECAR_MAGIC = b"TXLOGIDX"
+"""The first bytes of a sidecar index file."""
+SIDECAR_VERSION = 4
+"""The version of the sidecar format, a sidecar with another version is not used."""
+SIDECAR_HEADER = struct.Struct(f"<8sHBBQQqQ16s16s16sQQ{len(LEVEL_CODES)}QQQQ")
+"""
+The header of a sidecar: magic, version, byte order, partial flag, number of indexed bytes, size
+and modification time (ns) of the log file, inode, digest of the head and of the tail of the
+indexed bytes, name of the log format, number of lines, number of records, the number of records
+per level, the number of records without a creation time, the number of namespaces and the size
+of their names. The header is followed by the line offsets, the record starts, the record ids per
+level, the creation times, the ids of the records without a creation time, the newline separated
+namespace names, the number of records per namespace and the record ids per namespace, in the
+native byte order.
+"""
+DIGEST_SIZE = 4096
+"""The number of bytes at the start and at the end of the indexed bytes that are hashed."""
+
+_BYTE_ORDER = ord(sys.byteorder[0])
+
+MODULE_LOGGER = logging.getLogger("Textual.index")
+
+
+class LineIndex:
+    """
+    A read-only sequence of the lines in a log file.
+
+    The index keeps the byte offset of the start of every line in an `array('Q')`, followed by
+    one extra offset that marks the end of the last line. Line `idx` is therefore the range
+    `offsets[idx]:offsets[idx+1]` in the memory mapped file.
+
+    The line numbers where a record starts are kept in a second `array('Q')`, so record `rid`
+    spans the lines `record_starts[rid]:record_starts[rid+1]`. Per logging level, an `array('Q')`
+    holds the ids of the records with that level, and per namespace another `array('Q')` holds the
+    ids of the records from that namespace. The creation time of the records is kept in an
+    `array('d')`. A record whose timestamp could not be parsed gets the time of the record before
+    it, so the times stay sorted, and its id is kept in another `array('Q')`.
+
+    The index is written by one thread at a time, e.g. the indexing or the follow thread. After
+    every change it publishes an `IndexSnapshot`, readers use a snapshot without locking.
+    """
+
+    def __init__(self, filename: str, workers: int = 1, parser: Optional[LogParser] = None):
+        self.filename = filename
+        self.workers = workers
+        """The number of processes that are used to index large parts of the file in parallel."""
+        self._requested_parser = parser
+        self._parser = parser
+        """The parser for the format of the log file, detected when the file is first indexed."""
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._data: Union[mmap.mmap, bytes, CompressedData] = b""
+        """The content of the log file, memory mapped when possible, or its decompressed content."""
+        self._offsets = array('Q', [0])
+        """The byte offsets of the start of each line plus the end of the last line."""
+        self._record_starts = array('Q')
+        """The line numbers of the first line of each record."""
+        self._level_records: Dict[int, array] = _new_level_records()
+        """The sorted record ids for each logging level."""
+        self._created = array('d')
+        """
+        The creation time of each record. A record without a known creation time has the time of
+        the last record before it that has one, or -inf, so the times stay sorted.
+        """
+        self._untimed = array('Q')
+        """The sorted ids of the records without a known creation time."""
+        self._namespace_records: Dict[str, array] = {}
+        """The sorted record ids for each namespace, in the order the namespaces appear."""
+        self._partial = False
+        """True when the last line in the index doesn't end with a newline."""
+        self._inode = None
+        """The inode of the indexed file, used to detect log rotation."""
+        self._head = b""
+        """The first bytes of the indexed file, used to detect truncation."""
+        self.resets = 0
+        """The number of times the index was reset because the file was truncated or rotated."""
+        self._generation = 0
+        self._snapshot: Optional[IndexSnapshot] = None
+        self._publish()
+
+    def load(self, max_bytes: Optional[int] = None) -> int:
+        """
+        Indexes the lines that were appended to the log file since the previous call.
+
+        Only the new bytes at the end of the file are scanned. When the file was truncated or
+        rotated, i.e. it has a different inode or it became smaller, the index is reset and the
+        file is indexed from the start.
+
+        Args:
+            max_bytes: scan at most this number of bytes, rounded up to the end of a line, the
+                next call continues where this call stopped [default=scan to the end].
+        Returns:
+            The number of lines that were added to the index, a last line that was completed
+            is counted as well.
+        """
+        with open(self.filename, 'rb') as fd:
+            stat = os.fstat(fd.fileno())
+            if self._is_replaced(fd, stat):
+                MODULE_LOGGER.info(f"Log file {self.filename} was truncated or rotated, resetting the index.")
+                self.reset()
+            if stat.st_size != len(_raw(self._data)) or self._inode is None:
+                self._inode = stat.st_ino
+                self._remap(fd)
+
+        if self.is_complete():
+            self._publish()
+            return 0
+
+        # A last line without newline might not have been completely written, scan it again.
+        # Published snapshots share the arrays, so the arrays are copied before they are changed.
+
+        if self._partial:
+            self._offsets = array('Q', self._offsets)
+            self._offsets.pop()
+            if self._record_starts and self._record_starts[-1] == len(self._offsets) - 1:
+                self._record_starts = array('Q', self._record_starts)
+                self._record_starts.pop()
+                self._created = array('d', self._created)
+                self._created.pop()
+                rid = len(self._record_starts)
+                if self._untimed and self._untimed[-1] == rid:
+                    self._untimed = self._untimed[:-1]
+                self._level_records = {
+                    level: records[:-1] if records and records[-1] == rid else records
+                    for level, records in self._level_records.items()
+                }
+                self._namespace_records = {
+                    name: records[:-1] if records and records[-1] == rid else records
+                    for name, records in self._namespace_records.items()
+                }
+
+        old_size = len(self._offsets) - 1
+
+        start = self._offsets[-1]
+        if self.compressed:
+            end = self._decompress(start, max_bytes)
+        else:
+            end = len(self._data) if max_bytes is None else min(len(self._data), start + max_bytes)
+        if self._parser is None and end > start:
+            self._parser = detect_parser(self._data[:min(end, SAMPLE_SIZE)])
+        self._scan(start, end)
+        self._partial = self._offsets[-1] == len(self._data) > 0 and self._data[-1:] != b'\n'
+
+        if self.is_complete():
+            self.shutdown()
+
+        if not self._head:
+            self._head = _raw(self._data)[:HEAD_SIZE]
+
+        self._publish()
+
+        return len(self._offsets) - 1 - old_size
+
+    def _decompress(self, start: int, max_bytes: Optional[int]) -> int:
+        """
+        Decompresses at least `max_bytes` after byte position start, or the complete file when
+        None, and returns the position after the last complete line that was decompressed.
+        """
+        data = self._data
+        data.advance(None if max_bytes is None else start + max_bytes)
+        while data.line_end <= start and not data.eof:
+            data.advance(len(data) + BLOCK_SIZE)  # a line that is longer than max_bytes
+        return len(data) if data.eof else data.line_end
+
+    @property
+    def parser(self) -> Optional[LogParser]:
+        """The parser for the format of the log file, None until the format is known."""
+        return self._parser
+
+    @property
+    def compressed(self) -> bool:
+        """True when the log file is compressed."""
+        return isinstance(self._data, CompressedData)
+
+    def is_complete(self) -> bool:
+        """Returns True when all the bytes of the mapped file have been indexed."""
+        return self._offsets[-1] == len(self._data) and (not self.compressed or self._data.eof)
+
+    def progress(self) -> Tuple[int, int]:
+        """
+        Returns the number of bytes that have been indexed and the size of the mapped file. The
+        size of a compressed file is estimated until it is completely decompressed.
+        """
+        snapshot = self._snapshot
+        data = snapshot.data
+        return snapshot.indexed, data.estimated_size() if isinstance(data, CompressedData) else len(data)
+
+    def reset(self):
+        """Forgets all indexed lines, the next call to `load()` will index the complete file."""
+        self.resets += 1
+        # The content is not closed, published snapshots can still use it until they are released
+        self._data = b""
+        self._offsets = array('Q', [0])
+        self._record_starts = array('Q')
+        self._level_records = _new_level_records()
+        self._created = array('d')
+        self._untimed = array('Q')
+        self._namespace_records = {}
+        self._parser = self._requested_parser  # a rotated log file can have another format
+        self._partial = False
+        self._inode = None
+        self._head = b""
+        self._publish()
+
+    def close(self):
+        if isinstance(self._data, (mmap.mmap, CompressedData)):
+            self._data.close()
+        self._data = b""
+
+    def save(self, path: str):
+        """
+        Saves the index to a sidecar file. The sidecar is written to a temporary file first and
+        then renamed, so a sidecar is never partially written.
+        """
+        indexed = self._offsets[-1]
+        names = "\n".join(self._namespace_records).encode()
+        with open(self.filename, 'rb') as fd:
+            stat = os.fstat(fd.fileno())
+        header = SIDECAR_HEADER.pack(
+            SIDECAR_MAGIC, SIDECAR_VERSION, _BYTE_ORDER, self._partial, indexed,
+            stat.st_size, stat.st_mtime_ns, stat.st_ino,
+            *_digests(self._data, indexed),
+            self._parser.name.encode() if self._parser else b"",
+            len(self._offsets), len(self._record_starts),
+            *map(len, self._level_records.values()), len(self._untimed),
+            len(self._namespace_records), len(names),
+        )
+
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as fd:
+                fd.write(header)
+                columns = (self._offsets, self._record_starts, *self._level_records.values(), self._created,
+                           self._untimed)
+                for column in columns:
+                    column.tofile(fd)
+                fd.write(names)
+                array('Q', map(len, self._namespace_records.values())).tofile(fd)
+                for column in self._namespace_records.values():
+                    column.tofile(fd)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def restore(self, path: str) -> bool:
+        """
+        Restores the index from a sidecar file that was written by `save()`. The index shall be
+        empty, i.e. before the first call to `load()`.
+
+        The sidecar is only used when it has the current version and the indexed bytes of the
+        log file are unchanged: the log file is not smaller, the hashes of the head and the tail
+        of the indexed bytes match and, when the log file has the same size, it was not modified.
+        The next call to `load()` indexes the lines that were appended since the sidecar was saved.
+
+        Returns:
+            True when the index was restored from the sidecar.
+        """
+        try:
+            with open(path, 'rb') as fd:
+                sidecar = _map_file(fd)
+        except OSError:
+            return False
+
+        try:
+            return self._restore(sidecar)
+        except (struct.error, ValueError) as exc:
+            MODULE_LOGGER.warning(f"Ignoring the invalid sidecar index {path}: {exc}")
+            return False
+        finally:
+            if isinstance(sidecar, mmap.mmap):
+                sidecar.close()
+
+    def _restore(self, sidecar: Union[mmap.mmap, bytes]) -> bool:
+        (magic, version, byte_order, partial, indexed, size, mtime_ns, _, head_digest, tail_digest, parser_name,
+         nr_offsets, nr_records, *level_counts, nr_untimed, nr_namespaces,
+         names_size) = SIDECAR_HEADER.unpack_from(sidecar)
+
+        if magic != SIDECAR_MAGIC or version != SIDECAR_VERSION or byte_order != _BYTE_ORDER:
+            return False
+
+        parser = PARSERS.get(parser_name.rstrip(b'\0').decode(errors='replace'))
+        if parser is None or self._requested_parser not in (None, parser):
+            return False
+
+        with open(self.filename, 'rb') as fd:
+            stat = os.fstat(fd.fileno())
+            if stat.st_size < indexed or (stat.st_size == size and stat.st_mtime_ns != mtime_ns):
+                return False
+            data = _map_file(fd)
+        try:
+            if compression(data[:MAGIC_SIZE]):
+                return False  # the seek points of a compressed file are not saved
+            if _digests(data, indexed) != (head_digest, tail_digest):
+                return False
+            head = data[:min(HEAD_SIZE, indexed)]
+        finally:
+            if isinstance(data, mmap.mmap):
+                data.close()
+
+        pos = SIDECAR_HEADER.size
+
+        def read(typecode: str, length: int) -> array:
+            nonlocal pos
+            column = array(typecode)
+            column.frombytes(sidecar[pos:pos + length * column.itemsize])
+            if len(column) != length:
+                raise ValueError("the sidecar is truncated")
+            pos += length * column.itemsize
+            return column
+
+        columns = [read(typecode, length) for typecode, length in [
+            ('Q', nr_offsets), ('Q', nr_records), *zip(repeat('Q'), level_counts), ('d', nr_records), ('Q', nr_untimed)
+        ]]
+
+        names = sidecar[pos:pos + names_size].decode().split("\n") if nr_namespaces else []
+        pos += names_size
+        if len(names) != nr_namespaces:
+            raise ValueError("the namespace names are invalid")
+        namespace_counts = read('Q', nr_namespaces)
+        namespace_records = {name: read('Q', length) for name, length in zip(names, namespace_counts)}
+
+        self._offsets, self._record_starts, *level_records, self._created, self._untimed = columns
+        self._level_records = dict(zip(self._level_records, level_records))
+        self._namespace_records = namespace_records
+        self._parser = parser
+        self._partial = bool(partial)
+        self._inode = stat.st_ino
+        self._head = head
+        self._publish()
+
+        return True
+
+    def _is_replaced(self, fd, stat: os.stat_result) -> bool:
+        """Returns True when the file is not the same file as the one that was indexed."""
+        if self._inode is None:
+            return False
+        raw = _raw(self._data)
+        if stat.st_ino != self._inode or stat.st_size < len(raw):
+            return True
+        if self.compressed and stat.st_size != len(raw):
+            return True  # a compressed file is not appended to, it is replaced
+        head = fd.read(len(self._head))
+        fd.seek(0)
+        return head != self._head
+
+    def _remap(self, fd):
+        if isinstance(self._data, (mmap.mmap, CompressedData)) or not self._data:
+            # The previous map is not closed, published snapshots can still use it
+            data = _map_file(fd)
+            name = compression(data[:MAGIC_SIZE])
+            self._data = CompressedData(data, name) if name else data
+        else:
+            fd.seek(len(self._data))
+            self._data += fd.read()
+
+    def _scan(self, start: int, end: int):
+        """
+        Indexes all lines between the byte positions start and end. The last line is scanned up
+        to its newline, also when that is beyond end.
+        """
+        if (self.workers > 1 and end - start >= self.workers * PARALLEL_MIN_BYTES and not self.compressed
+                and _is_picklable(self._parser)):
+            self._scan_parallel(start, end)
+            return
+
+        pos = start
+        while pos < end:
+            self._append(index_chunk(self._data, pos, min(pos + CHUNK_SIZE, end), self._parser))
+            pos = self._offsets[-1]
+
+    def _scan_parallel(self, start: int, end: int):
+        """
+        Indexes the lines between the byte positions start and end in a pool of worker processes.
+
+        The range is split in one part per worker, each part starts at the beginning of a line.
+        The parts are indexed independently and appended in order. Extra lines at the start of a
+        part, e.g. the rest of a Traceback, belong to the last record of the previous part, which
+        follows naturally from the record starts.
+        """
+        step = (end - start) // self.workers
+        bounds = [start]
+        for idx in range(1, self.workers):
+            newline = self._data.find(b'\n', start + idx * step, end)
+            if newline != -1 and newline + 1 > bounds[-1]:
+                bounds.append(newline + 1)
+        bounds.append(end)
+
+        if self._pool is None:
+            # Worker processes are spawned, forking a process that runs threads is not safe
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+        filenames = repeat(self.filename, len(bounds) - 1)
+        parsers = repeat(self._parser, len(bounds) - 1)
+        sizes = repeat(len(self._data), len(bounds) - 1)
+        for chunk in self._pool.map(_index_file_range, filenames, bounds[:-1], bounds[1:], parsers, sizes):
+            self._append(chunk)
+
+        pos = self._offsets[-1]
+        if pos < end:
+            self._scan(pos, end)  # the file was truncated while the workers mapped it
+
+    def _append(self, chunk: "ChunkIndex"):
+        """Appends an indexed chunk that starts at the end of the current index and publishes it."""
+        first_line = len(self._offsets) - 1
+        rid = first_rid = len(self._record_starts)
+        self._offsets.extend(chunk.offsets)
+        self._record_starts.extend(map(add, chunk.record_lines, repeat(first_line)))
+        for level, records in self._level_records.items():
+            records.extend(compress(count(rid), map(eq, repeat(level), chunk.levels)))
+        namespace_records = self._namespace_records
+        for rid, name in zip(count(rid), chunk.namespaces):
+            records = namespace_records.get(name)
+            if records is None:
+                # A new mapping, published snapshots keep the mapping they were published with
+                namespace_records = self._namespace_records = {**namespace_records, name: array('Q')}
+                records = namespace_records[name]
+            records.append(rid)
+        created = chunk.created
+        if math.isnan(sum(created)):
+            created, untimed = _carry_times(created, self._created[-1] if self._created else -math.inf, first_rid)
+            self._untimed.extend(untimed)
+        self._created.extend(created)
+        self._publish()
+
+    def shutdown(self):
+        """Stops the worker processes that are used for indexing in parallel."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def snapshot(self) -> "IndexSnapshot":
+        """Returns the most recently published snapshot of the index."""
+        return self._snapshot
+
+    def _publish(self):
+        """Publishes a new snapshot of the index, readers that hold an older snapshot are not affected."""
+        self._generation += 1
+        self._snapshot = IndexSnapshot(
+            self._generation, self.resets, self._data, self._offsets, self._record_starts,
+            self._level_records, self._created, self._untimed, self._namespace_records, self._parser,
+        )
+
+    # The read-only interface of the index reads the current snapshot, use `snapshot()` to read
+    # the index consistently over several calls.
+
+    def __len__(self) -> int:
+        return len(self._snapshot)
+
+    def __getitem__(self, idx: int) -> str:
+        return self._snapshot[idx]
+
+    @property
+    def data(self) -> Union[mmap.mmap, bytes, CompressedData]:
+        """The content of the log file, the decompressed content for a compressed log file."""
+        return self._snapshot.data
+
+    def byte_offset(self, line: int) -> int:
+        return self._snapshot.byte_offset(line)
+
+    def line_at(self, byte_offset: int) -> int:
+        return self._snapshot.line_at(byte_offset)
+
+    def text(self, start: int, stop: int) -> str:
+        return self._snapshot.text(start, stop)
+
+    def record_count(self) -> int:
+        return self._snapshot.record_count()
+
+    def record_of_line(self, line: int) -> int:
+        return self._snapshot.record_of_line(line)
+
+    def record_lines(self, rid: int) -> Tuple[int, int]:
+        return self._snapshot.record_lines(rid)
+
+    def created(self, rid: int) -> float:
+        return self._snapshot.created(rid)
+
+    def timeline_time(self, rid: int) -> float:
+        return self._snapshot.timeline_time(rid)
+
+    def untimed(self, start: int = 0, stop: Optional[int] = None) -> List[int]:
+        return self._snapshot.untimed(start, stop)
+
+    def find_time(self, timestamp: float) -> int:
+        return self._snapshot.find_time(timestamp)
+
+    def find_time_after(self, timestamp: float) -> int:
+        return self._snapshot.find_time_after(timestamp)
+
+    def is_chronological(self) -> bool:
+        return self._snapshot.is_chronological()
+
+    def level_of(self, rid: int) -> Optional[int]:
+        return self._snapshot.level_of(rid)
+
+    def level_counts(self, start: int = 0, stop: Optional[int] = None) -> Dict[int, int]:
+        return self._snapshot.level_counts(start, stop)
+
+    def namespace_counts(self) -> Dict[str, int]:
+        return self._snapshot.namespace_counts()
+
+    def next_records(self, rid: int, num: int, levels: Optional[Collection[int]] = None,
+                     namespaces: Optional[Collection[str]] = None) -> List[int]:
+        return self._snapshot.next_records(rid, num, levels, namespaces)
+
+    def previous_records(self, rid: int, num: int, levels: Optional[Collection[int]] = None,
+                         namespaces: Optional[Collection[str]] = None) -> List[int]:
+        return self._snapshot.previous_records(rid, num, levels, namespaces)
+
+    def iter_lines(self, start: int = 0) -> Iterator[str]:
+        return self._snapshot.iter_lines(start)
+
+
+class IndexSnapshot:
+    """
+    A consistent, read-only view on the index of a log file at one point in time.
+
+    The index only grows by appending to its arrays, so a snapshot shares the arrays with the
+    index and keeps their lengths at the time it was published. A reader that holds a snapshot
+    sees the same lines and records, whatever the indexing thread appends in the meantime, and
+    doesn't need a lock. When the index must change existing entries, i.e. when the incomplete
+    last line is scanned again or the log file was truncated or rotated, the index first copies
+    or replaces these arrays, so a published snapshot never changes (copy-on-write).
+    """
+
+    def __init__(self, generation: int, resets: int, data: Union[mmap.mmap, bytes, CompressedData],
+                 offsets: array, record_starts: array, level_records: Dict[int, array], created: array,
+                 untimed: array, namespace_records: Dict[str, array], parser: Optional[LogParser]):
+        self.generation = generation
+        """Increases every time the index publishes a snapshot."""
+        self.resets = resets
+        """The number of times the index was reset when this snapshot was published."""
+        self.data = data
+        """The content of the log file, the decompressed content for a compressed log file."""
+        self._offsets = offsets
+        self._record_starts = record_starts
+        self._level_records = level_records
+        self._created = created
+        self._untimed = untimed
+        self._nr_untimed = len(untimed)
+        self._chronological: Optional[bool] = None
+        self._nr_lines = len(offsets) - 1
+        self._nr_records = len(record_starts)
+        self._level_sizes = {level: len(records) for level, records in level_records.items()}
+        self.parser = parser
+        """The parser for the format of the log file, records are parsed with it."""
+        self._namespace_records = namespace_records
+        self._namespace_sizes = {name: len(records) for name, records in namespace_records.items()}
+
+    def __len__(self) -> int:
+        return self._nr_lines
+
+    def __getitem__(self, idx: int) -> str:
+        size = self._nr_lines
+        if idx < 0:
+            idx += size
+        if not 0 <= idx < size:
+            raise IndexError(f"line index out of range: {idx}")
+        return self._decode(self.data[self._offsets[idx]:self._offsets[idx + 1]])
+
+    @property
+    def indexed(self) -> int:
+        """The number of bytes that were indexed."""
+        return self._offsets[self._nr_lines]
+
+    def byte_offset(self, line: int) -> int:
+        """Returns the byte offset of the start of the line, or of the end of the last line."""
+        return self._offsets[line]
+
+    def line_at(self, byte_offset: int) -> int:
+        """Returns the line number of the line that contains the byte offset."""
+        return bisect_right(self._offsets, byte_offset, 0, self._nr_lines + 1) - 1
+
+    def text(self, start: int, stop: int) -> str:
+        """Returns the lines `start` up to but not including `stop` as one string."""
+        text = self._decode(self.data[self._offsets[start]:self._offsets[stop]])
+        return text.replace('\r\n', '\n') if '\r' in text else text
+
+    def record_count(self) -> int:
+        """Returns the number of records in the log file."""
+        return self._nr_records
+
+    def record_of_line(self, line: int) -> int:
+        """
+        Returns the index of the record that contains the given line number, or -1 when the line
+        comes before the first record.
+        """
+        return bisect_right(self._record_starts, line, 0, self._nr_records) - 1
+
+    def record_lines(self, rid: int) -> Tuple[int, int]:
+        """Returns the line number of the first line of the record and of the line after it."""
+        record_starts = self._record_starts
+        stop = record_starts[rid + 1] if rid + 1 < self._nr_records else self._nr_lines
+        return record_starts[rid], stop
+
+    def created(self, rid: int) -> float:
+        """Returns the creation time of the record as a POSIX timestamp, NaN when it is not known."""
+        if self._nr_untimed and _contains(self._untimed, rid, self._nr_untimed):
+            return math.nan
+        return self._created[rid]
+
+    def timeline_time(self, rid: int) -> float:
+        """
+        Returns the time of the record on the timeline of the log file: its creation time, or for
+        a record without one, the creation time of the last record before it that has one, or
+        -inf. The timeline times are in the order of the records.
+        """
+        return self._created[rid]
+
+    def untimed(self, start: int = 0, stop: Optional[int] = None) -> List[int]:
+        """
+        Returns the ids of the records without a creation time, of all records or of the records
+        with ids from `start` up to but not including `stop`.
+        """
+        untimed, size = self._untimed, self._nr_untimed
+        stop = self._nr_records if stop is None else stop
+        return untimed[bisect_left(untimed, start, 0, size):bisect_left(untimed, stop, 0, size)].tolist()
+
+    def find_time(self, timestamp: float) -> int:
+        """
+        Returns the id of the first record that was created at or after the given time, or the
+        number of records when all records were created before. Records are expected to be in
+        chronological order, which is how they are written by a logging handler. A record without
+        a creation time is found at the time of the record before it, see `timeline_time()`.
+        """
+        return bisect_left(self._created, timestamp, 0, self._nr_records)
+
+    def find_time_after(self, timestamp: float) -> int:
+        """
+        Returns the id of the first record that was created after the given time, or the number
+        of records when all records were created at or before that time.
+        """
+        return bisect_right(self._created, timestamp, 0, self._nr_records)
+
+    def is_chronological(self) -> bool:
+        """
+        Returns True when the records are in the order of their creation time, which is what
+        `find_time()` expects. Records can be out of order, e.g. when several processes write
+        to the same log file or when the clock was set back.
+        """
+        if self._chronological is None:
+            created = self._created[:self._nr_records]
+            self._chronological = all(map(le, created, islice(created, 1, None)))
+        return self._chronological
+
+    def level_of(self, rid: int) -> Optional[int]:
+        """Returns the logging level of the record, None when the level is not known."""
+        for level, records in self._level_records.items():
+            size = self._level_sizes[level]
+            idx = bisect_left(records, rid, 0, size)
+            if idx < size and records[idx] == rid:
+                return level
+        return None
+
+    def level_counts(self, start: int = 0, stop: Optional[int] = None) -> Dict[int, int]:
+        """
+        Returns the number of records for each logging level, of all records or of the records
+        with ids from `start` up to but not including `stop`.
+        """
+        if start <= 0 and stop is None:
+            return dict(self._level_sizes)
+        stop = self._nr_records if stop is None else stop
+        return {
+            level: bisect_left(records, stop, 0, self._level_sizes[level])
+            - bisect_left(records, start, 0, self._level_sizes[level])
+            for level, records in self._level_records.items()
+        }
+
+    def namespace_counts(self) -> Dict[str, int]:
+        """Returns the number of records for each namespace, without the records of its sub-namespaces."""
+        return {name: size for name, size in self._namespace_sizes.items() if size}
+
+    def subtree(self, namespace: str) -> List[str]:
+        """Returns the namespace and its sub-namespaces that have records, e.g. `egse.dsi` and `egse.dsi.esl`."""
+        prefix = f"{namespace}."
+        return [
+            name for name, size in self._namespace_sizes.items()
+            if size and (name == namespace or name.startswith(prefix) or not namespace)
+        ]
+
+    def in_namespaces(self, rid: int, namespaces: Collection[str]) -> bool:
+        """Returns True when the record comes from one of the namespaces."""
+        for name in namespaces:
+            records, size = self._namespace_records.get(name), self._namespace_sizes.get(name, 0)
+            if not size:
+                continue
+            idx = bisect_left(records, rid, 0, size)
+            if idx < size and records[idx] == rid:
+                return True
+        return False
+
+    def next_records(self, rid: int, num: int, levels: Optional[Collection[int]] = None,
+                     namespaces: Optional[Collection[str]] = None) -> List[int]:
+        """
+        Returns the ids of the first `num` records with id `rid` or higher.
+
+        When levels are given, only records with one of these logging levels are returned, when
+        namespaces are given, only records from one of these namespaces. The ids are found from
+        the per level or per namespace arrays, records that are filtered out are never visited.
+        When both are given, the records from the namespaces are checked for their level.
+        """
+        if namespaces is not None:
+            def following(name: str):
+                records, size = self._namespace_records[name], self._namespace_sizes.get(name, 0)
+                return map(records.__getitem__, range(bisect_left(records, rid, 0, size), size))
+
+            rids = merge(*map(following, namespaces))
+            if levels is not None:
+                rids = (rid for rid in rids if self.level_of(rid) in levels)
+            return list(islice(rids, num))
+
+        if levels is None:
+            return list(range(rid, min(rid + num, self._nr_records)))
+
+        def following(level: int):
+            size = self._level_sizes[level]
+            idx = bisect_left(self._level_records[level], rid, 0, size)
+            return self._level_records[level][idx:min(idx + num, size)]
+
+        return list(islice(merge(*map(following, levels)), num))
+
+    def previous_records(self, rid: int, num: int, levels: Optional[Collection[int]] = None,
+                         namespaces: Optional[Collection[str]] = None) -> List[int]:
+        """
+        Returns the ids of the last `num` records before record `rid`, in increasing order.
+
+        When levels are given, only records with one of these logging levels are returned, when
+        namespaces are given, only records from one of these namespaces.
+        """
+        if num <= 0:
+            return []
+
+        if namespaces is not None:
+            def preceding(name: str):
+                records, size = self._namespace_records[name], self._namespace_sizes.get(name, 0)
+                return map(records.__getitem__, range(bisect_left(records, rid, 0, size) - 1, -1, -1))
+
+            rids = merge(*map(preceding, namespaces), reverse=True)
+            if levels is not None:
+                rids = (rid for rid in rids if self.level_of(rid) in levels)
+            return list(islice(rids, num))[::-1]
+
+        if levels is None:
+            return list(range(max(0, rid - num), min(rid, self._nr_records)))
+
+        def preceding(level: int):
+            idx = bisect_left(self._level_records[level], rid, 0, self._level_sizes[level])
+            return self._level_records[level][max(0, idx - num):idx]
+
+        return list(merge(*map(preceding, levels)))[-num:]
+
+    def iter_lines(self, start: int = 0) -> Iterator[str]:
+        """Yields the lines of the log file starting at line number `start`."""
+        data = self.data
+        offsets = self._offsets
+        for idx in range(max(start, 0), self._nr_lines):
+            yield self._decode(data[offsets[idx]:offsets[idx + 1]])
+
+    @staticmethod
+    def _decode(line: bytes) -> str:
+        return line.rstrip(b'\r\n').decode(errors='replace')
+
+
+class ChunkIndex(NamedTuple):
+    """The index of a chunk of lines, relative to the start of the chunk."""
+
+    offsets: array
+    """The byte offsets of the end of each line in the file, array('Q')."""
+    record_lines: array
+    """The line numbers of the first line of each record, counted from the chunk start, array('Q')."""
+    levels: array
+    """The logging level of each record, 0 when unknown, array('B')."""
+    created: array
+    """The creation time of each record, array('d')."""
+    namespaces: List[str]
+    """The namespace of each record, e.g. the module name in the `caller=` field."""
+
+
+def index_chunk(data: Union[mmap.mmap, bytes], start: int, end: int, parser: LogParser,
+                size: Optional[int] = None) -> ChunkIndex:
+    """
+    Indexes the lines in data between the byte positions start and end. The start position shall
+    be at the beginning of a line, the last line is scanned up to its newline, also when that is
+    beyond end, or up to the end of the data. Records are recognised and their level, creation
+    time and namespace are found by the parser for the format of the log file.
+
+    The data ends at `size` when given, e.g. the file was mapped again after it had grown, so a
+    last line never reaches beyond the data that the caller knows about.
+    """
+    size = len(data) if size is None else size
+    offsets = array('Q')
+    record_lines = array('Q')
+    heads = []
+    is_record_start = methodcaller('startswith', parser.record_prefix)
+
+    pos = start
+    while pos < end:
+        stop = min(pos + CHUNK_SIZE, end)
+        parts = data[pos:stop].split(b'\n')
+        if len(parts) == 1:
+            # No newline in this chunk, the line continues after the chunk or the file
+            # doesn't end with a newline character.
+            newline = data.find(b'\n', stop, size)
+            line_end = size if newline == -1 else newline + 1
+            head = data[pos:min(line_end, pos + parser.head_size)]
+            if is_record_start(head):
+                record_lines.append(len(offsets))
+                heads.append(head)
+            pos = line_end
+            offsets.append(pos)
+            continue
+        del parts[-1]  # this part is not terminated by a newline, it is scanned again
+        flags = list(map(is_record_start, parts))
+        record_lines.extend(compress(count(len(offsets)), flags))
+        heads.extend(compress(parts, flags))
+        ends = accumulate(map((1).__add__, map(len, parts)), initial=pos)
+        next(ends)  # the start position is already known
+        offsets.extend(ends)
+        pos = offsets[-1]
+
+    levels, created, namespaces = parser.index_records(heads)
+
+    return ChunkIndex(offsets, record_lines, levels, created, namespaces)
+
+
+def _index_file_range(filename: str, start: int, end: int, parser: LogParser, size: int) -> ChunkIndex:
+    """
+    Indexes a range of a log file, this function is executed in a worker process. The file is
+    mapped again and can have grown since, it is only indexed up to `size`, the size of the file
+    that the index mapped.
+    """
+    with open(filename, 'rb') as fd:
+        data = _map_file(fd)
+    try:
+        size = min(size, len(data))
+        return index_chunk(data, start, min(end, size), parser, size)
+    finally:
+        if isinstance(data, mmap.mmap):
+            data.close()
+
+
+def namespace_totals(counts: Dict[str, int]) -> Dict[str, int]:
+    """
+    Returns the number of records for each node in the namespace tree, the records of a node
+    include the records of its sub-namespaces. The root of the tree is the empty string.
+    """
+    totals = {"": 0}
+    for name, size in counts.items():
+        totals[""] += size
+        parts = name.split(".") if name else []
+        for idx in range(1, len(parts) + 1):
+            node = ".".join(parts[:idx])
+            totals[node] = totals.get(node, 0) + size
+    return totals
+
+
+def namespace_children(totals: Dict[str, int]) -> Dict[str, List[str]]:
+    """
+    Returns the sorted names of the direct sub-namespaces for each namespace that has any, given
+    the nodes of the namespace tree from `namespace_totals()`.
+    """
+    children: Dict[str, List[str]] = {}
+    for name in sorted(totals):
+        if name:
+            children.setdefault(name.rpartition(".")[0], []).append(name)
+    return children
+
+
+def _digests(data: Union[mmap.mmap, bytes], end: int) -> Tuple[bytes, bytes]:
+    """Returns the hashes of the first and the last bytes of data up to the byte position end."""
+    head = hashlib.blake2b(data[:min(DIGEST_SIZE, end)], digest_size=16).digest()
+    tail = hashlib.blake2b(data[max(0, end - DIGEST_SIZE):end], digest_size=16).digest()
+    return head, tail
+
+
+def _raw(data: Union[mmap.mmap, bytes, CompressedData]) -> Union[mmap.mmap, bytes]:
+    """Returns the content of the file as it is on disk, i.e. compressed for a compressed file."""
+    return data.raw if isinstance(data, CompressedData) else data
+
+
+def _is_picklable(parser: LogParser) -> bool:
+    """
+    Returns True when the parser can be sent to a worker process, i.e. its class can be imported
+    there. A parser class that is defined in a function is not, the file is indexed serially then.
+    """
+    try:
+        pickle.dumps(parser)
+    except (pickle.PicklingError, AttributeError, TypeError):
+        MODULE_LOGGER.info(f"The {parser.name} parser can not be sent to the worker processes, indexing serially.")
+        return False
+    return True
+
+
+def _carry_times(created: array, last: float, first_rid: int) -> Tuple[array, List[int]]:
+    """
+    Returns the creation times where a NaN is replaced by the time before it, the first by `last`,
+    and the ids of the records with a NaN time, the first record has id `first_rid`.
+    """
+    carried = array('d', created)
+    untimed = []
+    for rid, created in enumerate(carried):
+        if created != created:  # NaN
+            carried[rid] = last
+            untimed.append(first_rid + rid)
+        else:
+            last = created
+    return carried, untimed
+
+
+def _contains(records: array, rid: int, size: int) -> bool:
+    """Returns True when the record id is in the first `size` ids of the sorted record ids."""
+    idx = bisect_left(records, rid, 0, size)
+    return idx < size and records[idx] == rid
+
+
+def _new_level_records() -> Dict[int, array]:
+    return {level: array('Q') for level in LEVEL_CODES.values()}
+
+
+def _map_file(fd) -> Union[mmap.mmap, bytes]:
+    """Returns a read-only memory map of the file, or its content when it can not be mapped."""
+    try:
+        return mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+    except (ValueError, OSError):
+        # Empty files and some special files can not be memory mapped
+        return fd.read()
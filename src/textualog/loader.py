@@ -1,154 +1,363 @@
+import hashlib
 import logging
-from itertools import islice
+import math
+import os
+import threading
+from pathlib import Path
+from typing import Dict
 from typing import List
 from typing import Optional
+from typing import Tuple
 
 from rich.text import Text
 
+from .cache import LRUCache
+from .histogram import TimeHistogram
+from .index import IndexSnapshot
+from .index import LineIndex
+from .parsers import JsonLinesParser
+from .parsers import LogParser
+from .parsers import get_parser
 from .renderables.logrecord import LevelName
 from .renderables.logrecord import LogRecord
+from .search import Search
 from .widgets.levels import Levels
 
 DEFAULT_NUM_LINES = 100
-MAX_NUM_LINES = 100_000
+DEFAULT_CACHE_SIZE = 4096
+SIDECAR_MIN_BYTES = 1024 * 1024
+"""Log files smaller than this are indexed quickly enough, no sidecar index is saved for them."""
 
 MODULE_LOGGER = logging.getLogger("Textual.loader")
 
 
-# KeyValueLoader is a class that loads log files that have a key-value format.
-# The following key-value pairs are expected in this order:
-#
-# level=<LEVEL>
-# ts=<DATE TIME> in the format %Y-%m-%dT%H:%M:%S,%f e.g. 2022-04-08T10:52:20,371211
-# process=<process name>
-# process_id=<process ID>
-# caller=<module>:<lineno>
-# msg="<message>"
-
 class KeyValueLoader:
-    def __init__(self, filename: str):
+    """
+    Loads a log file in the key-value format, see `parsers.KeyValueParser`, or in any other
+    registered format. The format is detected from the start of the log file unless a parser is
+    given, all formats share the indexing, the record cache and follow mode.
+
+    Indexing, e.g. from a worker thread or when following the log file, is serialised by a lock.
+    Reading never takes that lock: every call that navigates the log file or creates records
+    uses one snapshot of the index, see `index.IndexSnapshot`, so it sees a consistent state of
+    the index while new lines are appended, and indexing never blocks rendering.
+    """
+
+    def __init__(self, filename: str, cache_size: int = DEFAULT_CACHE_SIZE, workers: int = 1,
+                 index_dir: Optional[str] = None, parser: Optional[LogParser] = None):
         self.filename = filename
-        self._lines: List[str] = ...
-        """The original lines read from the log file."""
-        self._size = 0
-        """The number of lines in the log file."""
-        self._records = []
-        """Processed lines"""
-        self._offset = 0
-        """The line number of the first record, i.e. which line in the log file."""
-
-    def load(self):
-        """Loads the complete log file in a list of strings."""
-        with open(self.filename, 'r') as fd:
-            self._lines = fd.read().split('\n')
-
-        self._size = len(self._lines)
+        self.workers = workers
+        """The number of processes used to index large log files in parallel."""
+        self._lines = LineIndex(filename, workers=workers, parser=parser)
+        """The lines of the log file, decoded only when they are accessed."""
+        self._sidecar = sidecar_path(filename, index_dir) if index_dir else None
+        """The file where the index is saved, so it can be restored when the log file is reopened."""
+        self._saved = None
+        """The number of resets and indexed bytes when the index was last saved or restored."""
+        self.cache = LRUCache(cache_size)
+        """
+        The most recently processed records, keyed by the number of resets, the record index and
+        the byte offset of the end of the record. Lines that are appended to the last record, the
+        completion of its last line or a reset of the index change the key, so the indexing thread
+        never has to invalidate the cache.
+        """
+        self._processed: Tuple[Optional[Tuple], int, List[LogRecord]] = (None, 0, [])
+        """The arguments and the generation of the index for the last call to process(), the
+        line number of the first record and the processed records."""
+        self._lock = threading.RLock()
+        """Serialises indexing, e.g. in a worker thread and for following the log file."""
+        self._histogram = TimeHistogram()
+        """The number of records per level over time, updated with the records that were indexed since."""
+
+    def load(self, max_bytes: Optional[int] = None) -> int:
+        """
+        Memory maps the log file and indexes the line offsets.
+
+        The first call indexes the complete file, subsequent calls only index the lines that
+        were appended since, unless the log file was truncated or rotated. When `max_bytes` is
+        given, at most that many bytes are indexed and the next call continues from there, so a
+        large file can be indexed in chunks, e.g. from a worker thread.
+
+        Returns:
+            The number of new lines.
+        """
+        with self._lock:
+            if self._sidecar and self._saved is None:
+                self._restore_index()
+
+            return self._lines.load(max_bytes)
+
+    def _restore_index(self):
+        self._saved = (self._lines.resets, 0)
+        if os.path.exists(self._sidecar) and self._lines.restore(self._sidecar):
+            MODULE_LOGGER.info(f"Restored the index of {self.filename} from {self._sidecar}.")
+            self._saved = (self._lines.resets, self._lines.progress()[0])
+
+    def save_index(self) -> bool:
+        """
+        Saves the index to the sidecar file when the log file is completely indexed and the index
+        has changed since it was saved or restored. Nothing is saved for small or compressed log
+        files or when the loader has no index directory.
+
+        Returns:
+            True when the index was saved.
+        """
+        with self._lock:
+            indexed, size = self._lines.progress()
+            state = (self._lines.resets, indexed)
+            if not self._sidecar or size < SIDECAR_MIN_BYTES or not self.is_indexed() or state == self._saved:
+                return False
+            if self._lines.compressed:
+                return False
+            try:
+                os.makedirs(os.path.dirname(self._sidecar), exist_ok=True)
+                self._lines.save(self._sidecar)
+            except OSError as exc:
+                MODULE_LOGGER.warning(f"Could not save the index of {self.filename} to {self._sidecar}: {exc}")
+                return False
+            self._saved = state
+            return True
+
+    def is_indexed(self) -> bool:
+        """Returns True when the log file has been indexed completely."""
+        return self._lines.is_complete()
+
+    def progress(self) -> Tuple[int, int]:
+        """Returns the number of bytes that have been indexed and the size of the log file."""
+        return self._lines.progress()
 
     # This should really be __len__
     def size(self) -> int:
         """Returns the total number of lines in the log file."""
-        return self._size
+        return len(self._lines.snapshot())
 
     @property
     def offset(self):
-        return self._offset
+        return self._processed[1]
+
+    def record_count(self) -> int:
+        """Returns the total number of records in the log file."""
+        return self._lines.snapshot().record_count()
+
+    def level_counts(self) -> Dict[int, int]:
+        """Returns the number of records for each logging level."""
+        return self._lines.snapshot().level_counts()
+
+    def namespace_counts(self) -> Dict[str, int]:
+        """
+        Returns the number of records for each namespace, i.e. the module in the caller field,
+        without the records of its sub-namespaces, see `index.namespace_totals()`.
+        """
+        return self._lines.snapshot().namespace_counts()
+
+    def histogram(self) -> TimeHistogram:
+        """
+        Returns the number of records per level in time buckets, the records that were indexed
+        since the previous call are added to the histogram. The histogram is updated in place.
+        """
+        self._histogram.update(self._lines.snapshot())
+        return self._histogram
 
     def process(self,
                 start: int = 0, num_lines: int = DEFAULT_NUM_LINES, levels: Levels = None,
-                direction: int = 0):
-        """Process a number of lines and creates a list of Records for those lines."""
-
-        # * could keep track of those line that have been processed -> no need to process again
-        # * sub_messages are e.g. Traceback or multiline messages
-
-        MODULE_LOGGER.info(f"Before backtracking: {start=}, {num_lines=}")
+                direction: int = 0, namespace: Optional[str] = None):
+        """
+        Process a number of records and creates a list of LogRecords for those records.
+
+        The `start` argument is a line number in the log file. When it falls in the middle of a
+        record, i.e. in a Traceback or a multiline message, the record index is used to go back
+        to the start of that record when direction is -1, otherwise we go forward to the next
+        record. When the record is filtered out by the levels or doesn't come from the namespace
+        subtree, the previous (direction -1) or next matching record is used.
+        """
+
+        enabled = _enabled_levels(levels)
+        snapshot = self._lines.snapshot()
+        namespaces = _subtree(snapshot, namespace)
+
+        rid = self._record_at(snapshot, start, direction)
+        if direction < 0:
+            previous = snapshot.previous_records(rid + 1, 1, enabled, namespaces)
+            rid = previous[0] if previous else rid
+
+        MODULE_LOGGER.info(f"Process records: {start=}, {rid=}, {num_lines=}")
+
+        rids = snapshot.next_records(rid, num_lines, enabled, namespaces)
+
+        offset = self._line_of_record(snapshot, rids[0] if rids else rid)
+        records = [self._get_record(snapshot, rid) for rid in rids]
+
+        # The result is replaced at once, so the offset and the records always belong together
+        self._processed = ((start, num_lines, direction, enabled, namespace, snapshot.generation), offset, records)
+
+    def seek(self, start: int, count: int, levels: Levels = None, namespace: Optional[str] = None) -> int:
+        """
+        Returns the line number of the record that is `count` records away from the record at
+        line `start`. Only records that pass the levels and come from the namespace subtree are
+        counted and a negative count moves back in the log file. Line numbers past the last line
+        are treated as the end of the file.
+        """
+        enabled = _enabled_levels(levels)
+        snapshot = self._lines.snapshot()
+        namespaces = _subtree(snapshot, namespace)
+
+        rid = self._record_at(snapshot, start, -1) if start < len(snapshot) else snapshot.record_count()
+
+        if count >= 0:
+            rids = snapshot.next_records(rid, count + 1, enabled, namespaces)
+            rid = rids[-1] if rids else rid
+        else:
+            rids = snapshot.previous_records(rid, -count, enabled, namespaces)
+            rid = rids[0] if rids else rid
+
+        return self._line_of_record(snapshot, rid)
+
+    def record_ids(self, start: int, before: int, after: int, levels: Levels = None,
+                   namespace: Optional[str] = None) -> Tuple[List[int], int]:
+        """
+        Returns the ids of at most `before` records that come before the record at line `start`
+        and of at most `after` records from that record onwards, only records that pass the
+        levels and come from the namespace subtree are included. The record at line `start` is
+        the record that starts at or after that line, like in `process()`.
+
+        Returns:
+            The record ids and the position of the record at line `start` in that list.
+        """
+        enabled = _enabled_levels(levels)
+        snapshot = self._lines.snapshot()
+        namespaces = _subtree(snapshot, namespace)
+
+        rid = self._record_at(snapshot, start, 0)
+        preceding = snapshot.previous_records(rid, before, enabled, namespaces)
+        return preceding + snapshot.next_records(rid, after, enabled, namespaces), len(preceding)
+
+    def get_record(self, rid: int) -> LogRecord:
+        """Returns the LogRecord for the record with the given id."""
+        return self._get_record(self._lines.snapshot(), rid)
+
+    def record_text(self, rid: int) -> str:
+        """Returns the lines of the record as they are in the log file, without the last newline."""
+        snapshot = self._lines.snapshot()
+        text = snapshot.text(*snapshot.record_lines(rid))
+        return text[:-1] if text.endswith('\n') else text
+
+    def line_of_record(self, rid: int) -> int:
+        """Returns the line number of the first line of the record, the number of lines past the last record."""
+        return self._line_of_record(self._lines.snapshot(), rid)
 
-        # if start falls in the middle of a sub_message,
-        #  * we go back until the actual log message if direction is -1
-        #  * go forward until the actual log message if direction is +1
+    @property
+    def lines(self) -> LineIndex:
+        """The index of the lines and records of the log file."""
+        return self._lines
 
+    @property
+    def resets(self) -> int:
+        """The number of times the index was reset because the log file was truncated or rotated."""
+        return self._lines.snapshot().resets
+
+    def timeline_time(self, rid: int) -> float:
+        """Returns the creation time of the record, see `IndexSnapshot.timeline_time()`."""
+        return self._lines.snapshot().timeline_time(rid)
+
+    def is_chronological(self) -> bool:
+        """Returns True when the records of the log file are in the order of their creation time."""
+        return self._lines.snapshot().is_chronological()
+
+    def find_time(self, timestamp: float) -> int:
+        """
+        Returns the line number of the first record that was created at or after the given time.
+
+        The creation times are kept in the index, so this is a binary search that doesn't need
+        to parse any lines.
+        """
+        snapshot = self._lines.snapshot()
+        return self._line_of_record(snapshot, snapshot.find_time(timestamp))
+
+    def search(self, pattern: str, regex: bool = False, ignore_case: bool = False) -> Search:
+        """
+        Returns a new search for the pattern in the records of this log file. The search is
+        performed in chunks by calling `run()` on the returned Search, e.g. from a worker thread.
+        """
+        return Search(self._lines, pattern, regex=regex, ignore_case=ignore_case)
+
+    def next_match(self, search: Search, start: int, direction: int, levels: Levels = None,
+                   namespace: Optional[str] = None) -> Optional[int]:
+        """
+        Returns the line number of the next (direction > 0) or previous matching record, that
+        passes the levels and comes from the namespace subtree, starting from the record at line
+        `start`, or None if there is none.
+        """
+        enabled = _enabled_levels(levels)
+        snapshot = self._lines.snapshot()
+        namespaces = _subtree(snapshot, namespace)
+
+        rid = self._record_at(snapshot, start, -1)
         if direction > 0:
-            while start < self._size and not self._lines[start].startswith("level="):
-                start += 1
-        elif direction < 0:
-            while start > 0 and not self._lines[start].startswith("level="):
-                start -= 1
+            # From a line before the first record, e.g. -1, the first record is the next record
+            rid = search.next(rid if snapshot.record_of_line(start) >= 0 else -1, enabled, namespaces)
         else:
-            ...
-
-        MODULE_LOGGER.info(f"After backtracking:  {start=}, {num_lines=}")
-
-        self._offset = start
-
-        sub_message: List[str] = []
-        in_sub_message = False
-        records = []
-        record: Optional[LogRecord] = None
-        match_count = 0
-        for count, line in enumerate(islice(self._lines, start, None)):
-            if count > MAX_NUM_LINES:
-                break
-            if not line.startswith("level="):
-                in_sub_message = True
-                sub_message.append(line)
-                continue
-            if in_sub_message:
-                if record is not None:
-                    record.extra = '\n'.join(sub_message)
-                sub_message = []
-                in_sub_message = False
-
-            level, ts, process, process_id, caller, msg = line.split(maxsplit=5)
-            level = LevelName[level[6:]].value
-
-            if levels is None or levels.is_on(level):
-
-                record = LogRecord(
-                    level=level,
-                    ts=ts[3:],
-                    process=process[8:],
-                    process_id=process_id[11:],
-                    caller=caller[7:],
-                    msg=msg[4:].strip('"')  # also removes the double quotes around the message
-                )
-
-                records.append(record)
-                match_count += 1
-
-            if match_count >= num_lines:
-                break
-
-        if sub_message and record is not None:
-            record.extra = '\n'.join(sub_message)
-
-        self._records = records
+            rid = search.previous(max(rid, 0), enabled, namespaces)
+
+        return None if rid is None else self._line_of_record(snapshot, rid)
+
+    @staticmethod
+    def _record_at(snapshot: IndexSnapshot, start: int, direction: int) -> int:
+        """
+        Returns the record that contains line `start` for a negative direction, otherwise the
+        record that starts at or after line `start`.
+        """
+        rid = snapshot.record_of_line(start)
+        if rid < 0 or (direction >= 0 and snapshot.record_lines(rid)[0] < start):
+            rid += 1
+        return rid
+
+    @staticmethod
+    def _line_of_record(snapshot: IndexSnapshot, rid: int) -> int:
+        return snapshot.record_lines(rid)[0] if rid < snapshot.record_count() else len(snapshot)
+
+    def _get_record(self, snapshot: IndexSnapshot, rid: int) -> LogRecord:
+        """Returns the record from the cache, the record is parsed when it's not in the cache."""
+        first, stop = snapshot.record_lines(rid)
+        key = (snapshot.resets, rid, snapshot.byte_offset(stop))
+        record = self.cache.get(key)
+        if record is None:
+            record = self._parse_record(snapshot, rid, first, stop)
+            self.cache.put(key, record)
+        return record
+
+    @staticmethod
+    def _parse_record(snapshot: IndexSnapshot, rid: int, first: int, stop: int) -> LogRecord:
+        created = snapshot.created(rid)
+        return snapshot.parser.parse_record(
+            snapshot[first],
+            None if math.isnan(created) else created,
+            snapshot.text(first + 1, stop) if stop > first + 1 else None,
+        )
 
     def __str__(self):
-        return "\n".join(self._records)
-
-    def reprocess(self, start: int, num_lines: int, levels: Levels):
-        # start and stop are line numbers of the log file
-
-        # item is the correct mapping of the requested lines in the self._records list.
-        #
-        # if not 0 < start - offset < len(self._records) -> reprocess the lines
-        # if not 0 < start + num_lines - offset < len(self._records) -> reprocess the lines
+        return "\n".join(map(str, self._processed[2]))
 
-        nr_records = len(self._records)
+    def reprocess(self, start: int, num_lines: int, levels: Levels, direction: int = 0,
+                  namespace: Optional[str] = None):
+        """
+        Process the records only when they differ from the records of the previous call to
+        `process()`, i.e. when the arguments are different or the index has changed.
+        """
+        key = (start, num_lines, direction, _enabled_levels(levels), namespace, self._lines.snapshot().generation)
 
-        if not 0 <= start - self._offset < nr_records or \
-                not 0 < start + num_lines - self._offset <= nr_records:
-            self.process(start, num_lines, levels)
+        if key != self._processed[0]:
+            self.process(start, num_lines, levels, direction, namespace)
 
     def get_records(self,
                     start: int = 0,
                     num_lines: int = DEFAULT_NUM_LINES,
                     levels: Levels = None,
-                    direction: int = 0) -> List[LogRecord]:
+                    direction: int = 0,
+                    namespace: Optional[str] = None) -> List[LogRecord]:
 
-        self.process(start, num_lines, levels, direction)
+        self.reprocess(start, num_lines, levels, direction, namespace)
 
-        return self._records
+        return self._processed[2]
 
     def get_text(self, start: int = 0, num_lines: int = DEFAULT_NUM_LINES, levels: Levels = None) -> Text:
 
@@ -158,11 +367,52 @@ class KeyValueLoader:
         text = Text()
         [
             text.append(record.__rich__()).append('\n')
-            for record in self._records
+            for record in self._processed[2]
         ]
         return text
 
 
+class JsonLinesLoader(KeyValueLoader):
+    """
+    Loads a log file with one JSON object per record, see `parsers.JsonLinesParser`. Only the
+    level, time and logger fields are extracted while indexing, a record is decoded completely
+    when its extra fields are shown.
+    """
+
+    def __init__(self, filename: str, **kwargs):
+        super().__init__(filename, parser=get_parser(JsonLinesParser.name), **kwargs)
+
+
+def default_index_dir() -> str:
+    """Returns the directory where the sidecar index files are saved, in the user cache directory."""
+    cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return str(Path(cache_home) / "textualog" / "index")
+
+
+def sidecar_path(filename: str, index_dir: str) -> str:
+    """
+    Returns the path of the sidecar index file for the log file. The name of the sidecar contains
+    the name of the log file and a hash of its absolute path, so log files with the same name in
+    different directories have their own sidecar.
+    """
+    path = os.path.realpath(filename)
+    digest = hashlib.blake2b(path.encode(errors='surrogateescape'), digest_size=8).hexdigest()
+    return os.path.join(index_dir, f"{os.path.basename(path)}.{digest}.idx")
+
+
+def _enabled_levels(levels: Optional[Levels]) -> Optional[List[int]]:
+    """Returns the logging levels that are switched on, or None when there is no filtering."""
+    if levels is None:
+        return None
+    enabled = [level.value for level in LevelName if levels.is_on(level.value)]
+    return None if len(enabled) == len(LevelName) else enabled
+
+
+def _subtree(snapshot: IndexSnapshot, namespace: Optional[str]) -> Optional[List[str]]:
+    """Returns the namespaces in the subtree of the namespace, or None when there is no filtering."""
+    return None if namespace is None else snapshot.subtree(namespace)
+
+
 if __name__ == "__main__":
 
     fn = '/Users/rik/Desktop/general.log'
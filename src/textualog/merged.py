@@ -0,0 +1,351 @@
+"""
+A merged timeline over several log files, e.g. rotated log files and the log files of different
+processes.
+
+Every log file has its own loader and index. The records of all files are presented as one
+stream that is ordered by creation time, records that were created at the same time are ordered
+by the position of their file in the list of files. A record without a creation time is placed
+at the time of the record before it in its file, so a log file without any creation time, e.g.
+in the `logging.BASIC_FORMAT`, keeps its order and comes before the later files. The merged
+stream is never materialised: the position of a record in the timeline is the number of records
+of all files that come before it, which is found with a binary search over the creation times in
+the index of each file. A window of records is merged lazily with a heap merge of the record ids
+that each index returns for that window, so only the visible records are visited.
+
+Every record is one line in the merged timeline, i.e. the line number is the position of the
+record in the timeline. Records in the merged timeline are identified by an id that combines
+the position of the file and the id of the record in that file.
+"""
+import glob
+import logging
+import os
+import threading
+from heapq import merge
+from itertools import islice
+from typing import Collection
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import Union
+
+from .histogram import TimeHistogram
+from .index import IndexSnapshot
+from .loader import DEFAULT_CACHE_SIZE
+from .loader import KeyValueLoader
+from .loader import _enabled_levels
+from .loader import _subtree
+from .parsers import LogParser
+from .renderables.logrecord import LogRecord
+from .search import SEARCH_CHUNK_SIZE
+from .search import Search
+from .widgets.levels import Levels
+
+MODULE_LOGGER = logging.getLogger("Textual.merged")
+
+
+class MergedSearch:
+    """A search for a pattern in the records of all the log files of a merged timeline."""
+
+    def __init__(self, searches: List[Search], pattern: str):
+        self.pattern = pattern
+        self.searches = searches
+        """The search in each of the log files."""
+
+    def is_done(self) -> bool:
+        """Returns True when all the indexed records of all log files have been searched."""
+        return all(search.is_done() for search in self.searches)
+
+    def run(self, max_bytes: Optional[int] = SEARCH_CHUNK_SIZE) -> int:
+        """
+        Searches the next chunk, at most `max_bytes`, of each log file.
+
+        Returns:
+            The number of new matching records.
+        """
+        return sum(search.run(max_bytes) for search in self.searches if not search.is_done())
+
+    def __len__(self) -> int:
+        """Returns the number of matching records that were found so far."""
+        return sum(map(len, self.searches))
+
+
+class MergedLoader:
+    """
+    Loads several log files and presents their records as one timeline, ordered by creation time.
+
+    The merged loader has the same interface as the `KeyValueLoader` that is used by the Records
+    panel and the app, where a line number is the position of a record in the timeline. Following
+    a merged loader loads the new records of all log files.
+    """
+
+    def __init__(self, filenames: List[str], cache_size: int = DEFAULT_CACHE_SIZE, workers: int = 1,
+                 index_dir: Optional[str] = None, parser: Optional[LogParser] = None):
+        self.filenames = list(filenames)
+        self.workers = workers
+        """The number of processes used to index large log files in parallel."""
+        self.loaders = [
+            KeyValueLoader(filename, cache_size=cache_size, workers=workers, index_dir=index_dir, parser=parser)
+            for filename in self.filenames
+        ]
+        self._sources = [os.path.basename(filename) for filename in self.filenames]
+        """The name of the log file that is shown as the source of its records."""
+        self._lock = threading.RLock()
+        """Serialises indexing, navigation reads a snapshot of each index without locking."""
+
+    def load(self, max_bytes: Optional[int] = None) -> int:
+        """
+        Indexes the log files, each log file that is not completely indexed is indexed up to
+        `max_bytes` further, see `KeyValueLoader.load()`.
+
+        Returns:
+            The number of new records.
+        """
+        with self._lock:
+            nr_records = self.record_count()
+            for loader in self.loaders:
+                if max_bytes is None or not loader.is_indexed():
+                    loader.load(max_bytes)
+            return self.record_count() - nr_records
+
+    def save_index(self) -> bool:
+        """Saves the index of each log file, returns True when at least one index was saved."""
+        with self._lock:
+            return any([loader.save_index() for loader in self.loaders])
+
+    def is_indexed(self) -> bool:
+        """Returns True when all the log files have been indexed completely."""
+        return all(loader.is_indexed() for loader in self.loaders)
+
+    def progress(self) -> Tuple[int, int]:
+        """Returns the number of bytes that have been indexed and the size of all the log files."""
+        indexed, size = zip(*(loader.progress() for loader in self.loaders))
+        return sum(indexed), sum(size)
+
+    def size(self) -> int:
+        """Returns the number of lines in the merged timeline, which is the number of records."""
+        return self.record_count()
+
+    def record_count(self) -> int:
+        """Returns the total number of records in all the log files."""
+        return sum(loader.record_count() for loader in self.loaders)
+
+    def level_counts(self) -> Dict[int, int]:
+        """Returns the number of records for each logging level in all the log files."""
+        counts = {}
+        for loader in self.loaders:
+            for level, count in loader.level_counts().items():
+                counts[level] = counts.get(level, 0) + count
+        return counts
+
+    def namespace_counts(self) -> Dict[str, int]:
+        """Returns the number of records for each namespace in all the log files."""
+        counts = {}
+        for loader in self.loaders:
+            for name, count in loader.namespace_counts().items():
+                counts[name] = counts.get(name, 0) + count
+        return counts
+
+    def histogram(self) -> TimeHistogram:
+        """Returns the number of records per level in time buckets, of all the log files together."""
+        return TimeHistogram.combine(loader.histogram() for loader in self.loaders)
+
+    @property
+    def resets(self) -> int:
+        """The number of times the index of one of the log files was reset."""
+        return sum(loader.resets for loader in self.loaders)
+
+    def record_ids(self, start: int, before: int, after: int, levels: Levels = None,
+                   namespace: Optional[str] = None) -> Tuple[List[int], int]:
+        """
+        Returns the ids of at most `before` records that come before the record at line `start`
+        in the timeline and of at most `after` records from that record onwards, only records
+        that pass the levels and come from the namespace subtree are included.
+
+        Returns:
+            The record ids and the position of the record at line `start` in that list.
+        """
+        enabled = _enabled_levels(levels)
+        snapshots = self._snapshots()
+
+        cursors = self._cursors(snapshots, start)
+        preceding = self._preceding(snapshots, cursors, before, enabled, namespace)
+        following = self._following(snapshots, cursors, after, enabled, namespace)
+        return [self._id(fid, rid) for _, fid, rid in preceding + following], len(preceding)
+
+    def get_record(self, rid: int) -> LogRecord:
+        """Returns the LogRecord for the record with the given id, tagged with its log file."""
+        rid, fid = divmod(rid, len(self.loaders))
+        record = self.loaders[fid].get_record(rid)
+        record.source = self._sources[fid]
+        return record
+
+    def record_text(self, rid: int) -> str:
+        """Returns the lines of the record as they are in its log file, without the last newline."""
+        rid, fid = divmod(rid, len(self.loaders))
+        return self.loaders[fid].record_text(rid)
+
+    def line_of_record(self, rid: int) -> int:
+        """Returns the position of the record in the timeline, the number of records past the last record."""
+        rid, fid = divmod(rid, len(self.loaders))
+        snapshots = self._snapshots()
+        if rid >= snapshots[fid].record_count():
+            return sum(snapshot.record_count() for snapshot in snapshots)
+        return self._rank(snapshots, fid, rid)
+
+    def seek(self, start: int, count: int, levels: Levels = None, namespace: Optional[str] = None) -> int:
+        """
+        Returns the line number of the record that is `count` records away from the record at
+        line `start`. Only records that pass the levels and come from the namespace subtree are
+        counted and a negative count moves back in the timeline.
+        """
+        enabled = _enabled_levels(levels)
+        snapshots = self._snapshots()
+
+        start = min(start, sum(snapshot.record_count() for snapshot in snapshots))
+        cursors = self._cursors(snapshots, start)
+        if count >= 0:
+            records = self._following(snapshots, cursors, count + 1, enabled, namespace)
+            _, fid, rid = records[-1] if records else (None, None, None)
+        else:
+            records = self._preceding(snapshots, cursors, -count, enabled, namespace)
+            _, fid, rid = records[0] if records else (None, None, None)
+
+        return start if fid is None else self._rank(snapshots, fid, rid)
+
+    def timeline_time(self, rid: int) -> float:
+        """Returns the creation time of the record, see `IndexSnapshot.timeline_time()`."""
+        rid, fid = divmod(rid, len(self.loaders))
+        return self.loaders[fid].timeline_time(rid)
+
+    def is_chronological(self) -> bool:
+        """Returns True when the records of each log file are in the order of their creation time."""
+        return all(loader.is_chronological() for loader in self.loaders)
+
+    def find_time(self, timestamp: float) -> int:
+        """Returns the line number of the first record that was created at or after the given time."""
+        return sum(snapshot.find_time(timestamp) for snapshot in self._snapshots())
+
+    def search(self, pattern: str, regex: bool = False, ignore_case: bool = False) -> MergedSearch:
+        """Returns a new search for the pattern in the records of all the log files."""
+        searches = [loader.search(pattern, regex=regex, ignore_case=ignore_case) for loader in self.loaders]
+        return MergedSearch(searches, pattern)
+
+    def next_match(self, search: MergedSearch, start: int, direction: int, levels: Levels = None,
+                   namespace: Optional[str] = None) -> Optional[int]:
+        """
+        Returns the line number of the next (direction > 0) or previous matching record, that
+        passes the levels and comes from the namespace subtree, starting from the record at line
+        `start`, or None if there is none.
+        """
+        enabled = _enabled_levels(levels)
+        snapshots = self._snapshots()
+        subtrees = [_subtree(snapshot, namespace) for snapshot in snapshots]
+
+        if direction > 0:
+            cursors = self._cursors(snapshots, start + 1)
+            found = [
+                file_search.next(cursor - 1, enabled, namespaces)
+                for cursor, file_search, namespaces in zip(cursors, search.searches, subtrees)
+            ]
+        else:
+            cursors = self._cursors(snapshots, max(start, 0))
+            found = [
+                file_search.previous(cursor, enabled, namespaces)
+                for cursor, file_search, namespaces in zip(cursors, search.searches, subtrees)
+            ]
+
+        # Matches in records that were appended after the snapshot was taken are not considered
+        matches = [
+            (snapshots[fid].timeline_time(rid), fid, rid) for fid, rid in enumerate(found)
+            if rid is not None and rid < snapshots[fid].record_count()
+        ]
+        if not matches:
+            return None
+
+        _, fid, rid = min(matches) if direction > 0 else max(matches)
+        return self._rank(snapshots, fid, rid)
+
+    def _snapshots(self) -> List[IndexSnapshot]:
+        """Returns a snapshot of the index of each log file, a navigation uses the same snapshots throughout."""
+        return [loader.lines.snapshot() for loader in self.loaders]
+
+    def _id(self, fid: int, rid: int) -> int:
+        """Returns the id in the merged timeline of record `rid` of log file `fid`."""
+        return rid * len(self.loaders) + fid
+
+    @staticmethod
+    def _rank(snapshots: List[IndexSnapshot], fid: int, rid: int) -> int:
+        """
+        Returns the position in the timeline of record `rid` of log file `fid`, i.e. the number of
+        records in all log files that come before it.
+        """
+        timestamp = snapshots[fid].timeline_time(rid)
+        rank = rid
+        for other, snapshot in enumerate(snapshots):
+            if other < fid:
+                rank += snapshot.find_time_after(timestamp)
+            elif other > fid:
+                rank += snapshot.find_time(timestamp)
+        return rank
+
+    def _cursors(self, snapshots: List[IndexSnapshot], line: int) -> List[int]:
+        """
+        Returns for each log file the number of its records that come before line `line` in the
+        timeline, i.e. the id of the first record of each log file at or after that line.
+        """
+        cursors = []
+        for fid, snapshot in enumerate(snapshots):
+            low, high = 0, snapshot.record_count()
+            while low < high:
+                middle = (low + high) // 2
+                if self._rank(snapshots, fid, middle) < line:
+                    low = middle + 1
+                else:
+                    high = middle
+            cursors.append(low)
+        return cursors
+
+    @staticmethod
+    def _following(snapshots: List[IndexSnapshot], cursors: List[int], num: int,
+                   levels: Optional[Collection[int]], namespace: Optional[str]) -> List[Tuple[float, int, int]]:
+        """Returns the first `num` records from the cursors onwards as (time, fid, rid), in timeline order."""
+        def records(fid: int, snapshot: IndexSnapshot):
+            rids = snapshot.next_records(cursors[fid], num, levels, _subtree(snapshot, namespace))
+            return [(snapshot.timeline_time(rid), fid, rid) for rid in rids]
+
+        return list(islice(merge(*(records(fid, snapshot) for fid, snapshot in enumerate(snapshots))), num))
+
+    @staticmethod
+    def _preceding(snapshots: List[IndexSnapshot], cursors: List[int], num: int,
+                   levels: Optional[Collection[int]], namespace: Optional[str]) -> List[Tuple[float, int, int]]:
+        """Returns the last `num` records before the cursors as (time, fid, rid), in timeline order."""
+        if num <= 0:
+            return []
+
+        def records(fid: int, snapshot: IndexSnapshot):
+            rids = snapshot.previous_records(cursors[fid], num, levels, _subtree(snapshot, namespace))
+            return [(snapshot.timeline_time(rid), fid, rid) for rid in rids]
+
+        return list(merge(*(records(fid, snapshot) for fid, snapshot in enumerate(snapshots))))[-num:]
+
+
+def expand_filenames(patterns: List[str]) -> List[str]:
+    """
+    Returns the log files for the given paths and glob patterns, e.g. `general.log*`. The files
+    that match a pattern are sorted, a path that doesn't match any file is kept as it is.
+    """
+    filenames = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else []
+        for filename in matches or [pattern]:
+            if filename not in filenames:
+                filenames.append(filename)
+    return filenames
+
+
+def open_loader(filenames: List[str], **kwargs) -> Union[KeyValueLoader, MergedLoader]:
+    """Returns a loader for a single log file, or a merged loader for several log files."""
+    if len(filenames) == 1:
+        return KeyValueLoader(filenames[0], **kwargs)
+    return MergedLoader(filenames, **kwargs)
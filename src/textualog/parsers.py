@@ -0,0 +1,516 @@
+"""
+The log formats that can be loaded, each format has a parser.
+
+A parser has two paths. The fast path is used by the index for every record in the log file:
+`record_prefix` recognises the first line of a record, so the lines of a chunk are classified
+with one `startswith()` per line, and `index_records()` returns the level, the creation time and
+the namespace of all the records in a chunk at once. The slow path, `parse_record()`, creates a
+`LogRecord` and is only used for the records that are displayed. A line that doesn't match the
+format is never an error, its record is shown with the line as the message.
+
+Parsers are registered by name with `register_parser()`. The format of a log file is detected
+from a sample at the start of the file with `detect_parser()`, the parser that recognises the
+most record lines in the sample is used.
+"""
+import datetime
+import json
+import logging
+import math
+import re
+from array import array
+from functools import lru_cache
+from itertools import repeat
+from operator import itemgetter
+from operator import methodcaller
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import Union
+
+from .renderables.logrecord import LevelName
+from .renderables.logrecord import LogRecord
+from .renderables.logrecord import to_timestamp
+from .renderables.logrecord import to_timestamps
+
+SAMPLE_SIZE = 8 * 1024
+"""The number of bytes at the start of a log file that are used to detect its format."""
+LEVEL_CODES = {
+    b"DEB": logging.DEBUG,
+    b"INF": logging.INFO,
+    b"WAR": logging.WARNING,
+    b"ERR": logging.ERROR,
+    b"CRI": logging.CRITICAL,
+}
+"""Maps the first three characters of the level name to the logging level."""
+
+MODULE_LOGGER = logging.getLogger("Textual.parsers")
+
+
+class LogParser:
+    """The interface of a parser for a log format, see the module documentation."""
+
+    name: str = ""
+    """The name of the format, e.g. for the `--format` option."""
+    record_prefix: Union[bytes, Tuple[bytes, ...]] = b""
+    """The first line of every record starts with (one of) these bytes."""
+    head_size: int = 256
+    """The number of bytes at the start of the first line of a record that `index_records()` needs."""
+
+    def is_record_start(self, line: bytes) -> bool:
+        """Returns True when the line is the first line of a record."""
+        return line.startswith(self.record_prefix)
+
+    def index_records(self, heads: List[bytes]) -> Tuple[array, array, List[str]]:
+        """
+        Returns the logging level (0 when unknown), the creation time (NaN when unknown) and the
+        namespace of the records, given the first bytes of the first line of each record.
+
+        Returns:
+            The levels as array('B'), the creation times as array('d') and the namespaces.
+        """
+        raise NotImplementedError
+
+    def parse_record(self, line: str, created: Optional[float], extra: Optional[str]) -> LogRecord:
+        """
+        Returns the LogRecord for the first line of a record, the creation time from the index
+        and the following lines of the record.
+        """
+        raise NotImplementedError
+
+    def __reduce__(self):
+        # Parsers are stateless, they are sent to the worker processes as their class, so a parser
+        # that was registered at runtime, e.g. by a plugin, is also known in a worker process
+        return _registered_parser, (type(self),)
+
+
+PARSERS: Dict[str, LogParser] = {}
+"""The registered parsers by name, in the order of registration."""
+
+
+def register_parser(cls):
+    """Registers a parser class, can be used as a class decorator."""
+    PARSERS[cls.name] = cls()
+    return cls
+
+
+def get_parser(name: str) -> LogParser:
+    """Returns the registered parser for the format with the given name."""
+    try:
+        return PARSERS[name]
+    except KeyError:
+        raise ValueError(f"Unknown log format {name!r}, expected one of {', '.join(PARSERS)}.") from None
+
+
+def _registered_parser(cls) -> LogParser:
+    """Returns the registered instance of the parser class, the class is registered when it's not yet."""
+    parser = PARSERS.get(cls.name)
+    if type(parser) is not cls:
+        register_parser(cls)
+        parser = PARSERS[cls.name]
+    return parser
+
+
+def detect_parser(sample: bytes) -> LogParser:
+    """
+    Returns the parser that recognises the most record lines in the sample, the first registered
+    parser, i.e. the key-value format, when none of them recognises a line.
+    """
+    lines = sample.split(b'\n')
+    if len(lines) > 1:
+        del lines[-1]  # the last line is probably cut off
+    scores = {name: sum(map(parser.is_record_start, lines)) for name, parser in PARSERS.items()}
+    name = max(scores, key=scores.get)
+    parser = PARSERS[name] if scores[name] else next(iter(PARSERS.values()))
+    MODULE_LOGGER.info(f"Detected the {parser.name} log format, {scores=}")
+    return parser
+
+
+def _unknown_record(line: str, created: Optional[float], extra: Optional[str]) -> LogRecord:
+    """Returns the record for a line that doesn't match the format, the line is the message."""
+    return LogRecord(msg=line, level=logging.INFO, created=created, caller="", extra=extra)
+
+
+@register_parser
+class KeyValueParser(LogParser):
+    """
+    The key-value format of `log.LOG_FORMAT_KEY_VALUE`, the key-value pairs are expected in this
+    order:
+
+        level=<LEVEL>
+        ts=<DATE TIME> in the format %Y-%m-%dT%H:%M:%S,%f e.g. 2022-04-08T10:52:20,371211
+        process=<process name>
+        process_id=<process ID>
+        caller=<module>:<lineno>
+        msg="<message>"
+    """
+
+    name = "key-value"
+    record_prefix = b"level="
+
+    _KEYS = ("level=", "ts=", "process=", "process_id=", "caller=", "msg=")
+    _CALLER_PREFIX = b"caller="
+
+    def index_records(self, heads: List[bytes]) -> Tuple[array, array, List[str]]:
+        levels = array('B', map(LEVEL_CODES.get, map(_level_key, heads), repeat(0)))
+        return levels, self._timestamps(heads), self._namespaces(heads)
+
+    def parse_record(self, line: str, created: Optional[float], extra: Optional[str]) -> LogRecord:
+        fields = line.split(maxsplit=5)
+        if len(fields) < 6 or not all(map(str.startswith, fields, self._KEYS)):
+            return _unknown_record(line, created, extra)
+        if fields[0][6:] not in LevelName.__members__:
+            return _unknown_record(line, created, extra)
+
+        level, ts, process, process_id, caller, msg = fields
+
+        return LogRecord(
+            level=LevelName[level[6:]].value,
+            created=created,
+            ts=ts[3:] if created is not None else None,  # a timestamp that could not be parsed
+            process=process[8:],
+            process_id=process_id[11:],
+            caller=caller[7:],
+            msg=msg[4:].strip('"'),  # also removes the double quotes around the message
+            extra=extra,
+        )
+
+    @staticmethod
+    def _timestamps(heads: List[bytes]) -> array:
+        """Returns the creation time of the records, given the first line of each record."""
+        try:
+            return to_timestamps(list(map(_decode_ascii, map(_ts_value, map(_ts_field, map(_split_fields, heads))))))
+        except (IndexError, ValueError):
+            return array('d', map(KeyValueParser._timestamp, heads))
+
+    @staticmethod
+    def _timestamp(head: bytes) -> float:
+        try:
+            return to_timestamp(_ts_value(_ts_field(_split_fields(head))).decode('ascii'))
+        except (IndexError, ValueError):
+            return float('nan')
+
+    def _namespaces(self, heads: List[bytes]) -> List[str]:
+        """
+        Returns the namespace of the records, i.e. the caller without the line number, e.g.
+        `egse.system` for `caller=egse.system:10`, or an empty string when the record has no
+        caller field.
+        """
+        prefix = self._CALLER_PREFIX
+        names: Dict[bytes, str] = {}
+        result = []
+        for head in heads:
+            fields = head.split(b' ', 5)
+            caller = fields[4] if len(fields) > 4 else b""
+            caller = caller[len(prefix):].rpartition(b':')[0] if caller.startswith(prefix) else b""
+            name = names.get(caller)
+            if name is None:
+                name = names[caller] = caller.decode(errors='replace')
+            result.append(name)
+        return result
+
+
+@register_parser
+class BasicFormatParser(LogParser):
+    """
+    The `logging.BASIC_FORMAT` format, `<LEVEL>:<logger name>:<message>`. The format has no
+    timestamp, the creation time of the records is unknown.
+    """
+
+    name = "basic"
+    record_prefix = tuple(f"{level.name}:".encode() for level in LevelName)
+
+    def index_records(self, heads: List[bytes]) -> Tuple[array, array, List[str]]:
+        fields = list(map(methodcaller('split', b':', 2), heads))
+        levels = array('B', map(LEVEL_CODES.get, map(_first_three, map(itemgetter(0), fields)), repeat(0)))
+        names = [field[1].decode(errors='replace') if len(field) > 2 else "" for field in fields]
+        return levels, array('d', repeat(math.nan, len(heads))), names
+
+    def parse_record(self, line: str, created: Optional[float], extra: Optional[str]) -> LogRecord:
+        fields = line.split(":", 2)
+        if len(fields) < 3 or fields[0] not in LevelName.__members__:
+            return _unknown_record(line, created, extra)
+
+        level, name, msg = fields
+        return LogRecord(msg=msg, level=LevelName[level].value, created=created, caller=name, extra=extra)
+
+
+@register_parser
+class SyslogParser(LogParser):
+    """
+    The traditional syslog file format, `<Mmm dd hh:mm:ss> <host> <tag>[<pid>]: <message>`, e.g.
+    `/var/log/syslog`. The format has no year and no severity, the records are taken to be from
+    the current year and have level INFO. The tag, i.e. the program name, is the namespace.
+    """
+
+    name = "syslog"
+    record_prefix = tuple(
+        f"{month} ".encode() for month in ("Jan", "Feb", "Mar", "Apr", "May", "Jun",
+                                           "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+    )
+
+    def index_records(self, heads: List[bytes]) -> Tuple[array, array, List[str]]:
+        levels = array('B', repeat(logging.INFO, len(heads)))
+        created = array('d', map(self._timestamp, heads))
+        names = [self._split(head.decode(errors='replace'))[2] for head in heads]
+        return levels, created, names
+
+    def parse_record(self, line: str, created: Optional[float], extra: Optional[str]) -> LogRecord:
+        ts, host, tag, pid, msg = self._split(line)
+        if not tag:
+            return _unknown_record(line, created, extra)
+        return LogRecord(
+            msg=msg, level=logging.INFO, created=created, ts=ts if created else None,
+            process=host, process_id=pid, caller=tag, extra=extra,
+        )
+
+    @staticmethod
+    def _split(line: str) -> Tuple[str, str, str, str, str]:
+        """Returns the timestamp, host, tag, process id and message, an empty tag when the line doesn't match."""
+        header, sep, msg = line[16:].partition(": ")
+        host, _, tag = header.partition(" ")
+        tag, _, pid = tag.partition("[")
+        if not sep or not host or " " in tag:
+            return line[:15], "", "", "", line
+        return line[:15], host, tag, pid.rstrip("]"), msg
+
+    @staticmethod
+    def _timestamp(head: bytes) -> float:
+        try:
+            return _syslog_minute(head[:12].decode('ascii')) + int(head[13:15])
+        except ValueError:
+            return float('nan')
+
+
+@register_parser
+class JsonLinesParser(LogParser):
+    """
+    JSON lines, one JSON object per record, e.g. from python-json-logger, structlog or pino.
+
+    The level, time and logger fields are found with a regular expression on the raw bytes of
+    the line while indexing. The fields have one of a few common names, e.g. `level` or
+    `levelname`, `timestamp`, `time` or `asctime` and `logger` or `name`. A time is either a
+    number of seconds or milliseconds since the epoch or an ISO 8601 date and time, a numeric
+    level is a pino/bunyan level, e.g. 30 for info. The line is decoded completely only when an
+    object or an array comes before a field, see `_JsonField`, or when the extra fields of the
+    record are shown, see `JsonLogRecord`.
+    """
+
+    name = "json"
+    record_prefix = b"{"
+    head_size = 1024 * 1024
+
+    def index_records(self, heads: List[bytes]) -> Tuple[array, array, List[str]]:
+        levels = array('B', map(_json_level, map(_LEVEL_FIELD.search, heads)))
+        created = array('d', map(_json_time, map(_TIME_FIELD.search, heads)))
+        names: Dict[bytes, str] = {}
+        result = []
+        for value in map(_LOGGER_FIELD.search, heads):
+            value = value or b'""'
+            name = names.get(value)
+            if name is None:
+                name = names[value] = _json_string(value)
+            result.append(name)
+        return levels, created, result
+
+    def parse_record(self, line: str, created: Optional[float], extra: Optional[str]) -> LogRecord:
+        if not line.startswith("{"):
+            return _unknown_record(line, created, extra)
+
+        raw = line.encode()
+
+        def field(json_field: _JsonField) -> str:
+            value = json_field.search(raw)
+            return _json_string(value) if value else ""
+
+        return JsonLogRecord(
+            line,
+            msg=field(_MESSAGE_FIELD),
+            level=_json_level(_LEVEL_FIELD.search(raw)) or logging.INFO,
+            created=created,
+            process=field(_PROCESS_FIELD),
+            process_id=field(_PROCESS_ID_FIELD),
+            caller=field(_LOGGER_FIELD),
+            extra=extra,
+        )
+
+
+class JsonLogRecord(LogRecord):
+    """
+    A record from a JSON-lines log file. The extra information of the record are the fields that
+    are not shown in the Records panel, pretty printed, followed by the lines after the record.
+    The line is only decoded when the extra information is requested, e.g. by the Record Info
+    and Record Details panels.
+    """
+
+    __slots__ = ("line", "_fields")
+
+    def __init__(self, line: str, **kwargs):
+        self.line = line
+        """The JSON object of the record."""
+        self._fields: Optional[str] = None
+        super().__init__(**kwargs)
+
+    @property
+    def has_extra(self) -> bool:
+        """True when the record has other fields or lines after it, without decoding the line."""
+        if LogRecord.extra.__get__(self):
+            return True
+        return any(key not in _SHOWN_KEYS for key in _JSON_KEY.findall(self.line))
+
+    @property
+    def extra(self) -> Optional[str]:
+        if self._fields is None:
+            self._fields = _json_extra(self.line)
+        return "\n".join(filter(None, (self._fields, LogRecord.extra.__get__(self)))) or None
+
+    @extra.setter
+    def extra(self, value: Optional[str]):
+        LogRecord.extra.__set__(self, value)
+
+
+class _JsonField:
+    """
+    Finds the raw value of the first field of a JSON object with one of the names, only the fields
+    of the object itself, not of the objects nested in it.
+
+    The field is found with a regular expression on the raw bytes. When an object or an array
+    starts before the field, the field might be nested and the line is decoded to find the field
+    of the object itself, which is rare for a log record.
+    """
+
+    __slots__ = ("names", "pattern")
+
+    def __init__(self, *names: str):
+        self.names = names
+        self.pattern = re.compile(
+            rf'"(?:{"|".join(map(re.escape, names))})"\s*:\s*("[^"\\]*(?:\\.[^"\\]*)*"|[^,}}\s]+)'.encode()
+        )
+
+    def search(self, raw: bytes) -> Optional[bytes]:
+        """Returns the raw value of the field, None when the object has no such field."""
+        match = self.pattern.search(raw)
+        if match is None:
+            return None
+        start = match.start()
+        if raw.count(b"{", 0, start) == 1 and raw.count(b"[", 0, start) == 0:
+            return match.group(1)
+        try:
+            fields = json.loads(raw)
+        except ValueError:
+            return match.group(1)  # e.g. the head of a very long line
+        if not isinstance(fields, dict):
+            return None
+        name = next((key for key in fields if key in self.names), None)
+        return None if name is None else json.dumps(fields[name]).encode()
+
+
+_LEVEL_FIELD = _JsonField("level", "levelname", "severity")
+_TIME_FIELD = _JsonField("timestamp", "@timestamp", "time", "ts", "asctime", "created")
+_LOGGER_FIELD = _JsonField("logger", "name", "logger_name")
+_MESSAGE_FIELD = _JsonField("message", "msg", "event")
+_PROCESS_FIELD = _JsonField("processName", "process_name", "hostname")
+_PROCESS_ID_FIELD = _JsonField("process", "pid")
+_SHOWN_KEYS = {
+    "level", "levelname", "severity", "timestamp", "@timestamp", "time", "ts", "asctime", "created",
+    "logger", "name", "logger_name", "message", "msg", "event", "processName", "process_name", "hostname",
+    "process", "pid",
+}
+"""The fields that are shown for every record, the other fields are the extra information."""
+_JSON_KEY = re.compile(r'[{,]\s*"([^"\\]*(?:\\.[^"\\]*)*)"\s*:')
+_JSON_LEVEL_CODES = {**LEVEL_CODES, b"TRA": logging.DEBUG, b"FAT": logging.CRITICAL}
+_NUMERIC_LEVELS = ((20, logging.DEBUG), (30, logging.INFO), (40, logging.WARNING), (50, logging.ERROR))
+"""The highest pino/bunyan level for each logging level, higher levels are critical."""
+
+
+def _json_string(value: bytes) -> str:
+    """Returns the text of a raw JSON value, a string is only decoded as JSON when it has escapes."""
+    if value[:1] != b'"':
+        return value.decode(errors='replace')
+    if b'\\' not in value:
+        return value[1:-1].decode(errors='replace')
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value[1:-1].decode(errors='replace')
+
+
+def _json_level(value: Optional[bytes]) -> int:
+    """Returns the logging level of the raw value of a level field, 0 when unknown."""
+    if value is None:
+        return 0
+    if value[:1] == b'"':
+        return _JSON_LEVEL_CODES.get(value[1:4].upper(), 0)
+    try:
+        number = float(value)
+    except ValueError:
+        return 0
+    return next((level for limit, level in _NUMERIC_LEVELS if number <= limit), logging.CRITICAL)
+
+
+def _json_time(value: Optional[bytes]) -> float:
+    """Returns the POSIX timestamp of the raw value of a time field, NaN when unknown."""
+    if value is None:
+        return math.nan
+    if value[:1] != b'"':
+        try:
+            number = float(value)
+        except ValueError:
+            return math.nan
+        return number / 1000 if number > 1e11 else number  # milliseconds since the epoch
+    try:
+        return _iso_timestamp(value[1:-1].decode('ascii'))
+    except ValueError:
+        return math.nan
+
+
+def _iso_timestamp(text: str) -> float:
+    """
+    Returns the POSIX timestamp for an ISO 8601 date and time, e.g. `2022-04-08T10:52:20.371Z`,
+    a time without offset is a local time. Like `to_timestamp()`, the date, hour, minute and
+    offset are converted only once per minute.
+    """
+    if len(text) < 19 or text[16] != ":":
+        raise ValueError(f"Not an ISO 8601 date and time: {text!r}")
+    rest = text[19:]
+    fraction = 0.0
+    if rest[:1] in (".", ","):
+        digits = rest[1:]
+        offset = digits.lstrip("0123456789")
+        fraction = float(f"0.{digits[:len(digits) - len(offset)]}")
+        rest = offset
+    return _iso_minute(text[:16], rest) + int(text[17:19]) + fraction
+
+
+@lru_cache(maxsize=1024)
+def _iso_minute(minute: str, offset: str) -> float:
+    """Returns the POSIX timestamp for an ISO 8601 date and time without the seconds and its offset."""
+    offset = "+00:00" if offset == "Z" else offset
+    return datetime.datetime.fromisoformat(f"{minute[:10]}T{minute[11:]}:00{offset}").timestamp()
+
+
+def _json_extra(line: str) -> str:
+    """Returns the fields of the JSON object that are not shown for every record, pretty printed."""
+    try:
+        fields = json.loads(line)
+    except ValueError:
+        return ""
+    if not isinstance(fields, dict):
+        return ""
+    other = {key: value for key, value in fields.items() if key not in _SHOWN_KEYS}
+    return json.dumps(other, indent=2, ensure_ascii=False, default=str) if other else ""
+
+
+@lru_cache(maxsize=1024)
+def _syslog_minute(minute: str) -> float:
+    """Returns the POSIX timestamp for a syslog time without the seconds, e.g. `Apr  8 10:52`."""
+    year = datetime.date.today().year
+    return datetime.datetime.strptime(f"{year} {minute}", "%Y %b %d %H:%M").timestamp()
+
+
+_level_key = itemgetter(slice(len(KeyValueParser.record_prefix), len(KeyValueParser.record_prefix) + 3))
+_first_three = itemgetter(slice(0, 3))
+_split_fields = methodcaller('split', b' ', 2)
+_ts_field = itemgetter(1)
+_ts_value = itemgetter(slice(len("ts="), None))
+_decode_ascii = methodcaller('decode', 'ascii')
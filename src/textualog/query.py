@@ -0,0 +1,339 @@
+"""
+Queries on log files without the terminal UI, e.g. for scripts:
+
+    textualog query --log general.log --level ERROR --since 10:52 --caller egse.system --grep timeout
+
+A query uses the same loaders and indexes as the viewer. The index is restored from the sidecar
+when the log file was indexed before, the time range is found with a binary search over the
+creation times, the levels and the namespace are filtered with the per level and per namespace
+record ids, so only the records that are written are parsed. The matching records are written
+to stdout in pages, with one write per page.
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import re
+import sys
+from itertools import islice
+from pathlib import Path
+from typing import Callable
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import TextIO
+from typing import Union
+
+from .loader import KeyValueLoader
+from .loader import default_index_dir
+from .log import LOG_FORMAT_DATE
+from .merged import MergedLoader
+from .merged import expand_filenames
+from .merged import open_loader
+from .parsers import PARSERS
+from .parsers import get_parser
+from .renderables.logrecord import LevelName
+from .renderables.logrecord import from_timestamp
+from .renderables.logrecord import parse_datetime
+
+QUERY_PAGE_SIZE = 1000
+"""The number of records that are selected from the index and written in one go."""
+
+MODULE_LOGGER = logging.getLogger("Textual.query")
+
+Loader = Union[KeyValueLoader, MergedLoader]
+
+
+class LevelThreshold:
+    """Passes the records with at least the given logging level, like a logging handler."""
+
+    def __init__(self, level: int):
+        self.level = level
+
+    def is_on(self, level: int) -> bool:
+        return level >= self.level
+
+
+def select(loader: Loader, level: int = None, since: float = None, until: float = None,
+           namespace: str = None, pattern: str = None, regex: bool = False,
+           ignore_case: bool = False) -> Iterator[int]:
+    """
+    Returns the ids of the records that were created in the time range [since, until), have at
+    least the given level, come from the namespace or one of its sub-namespaces and contain the
+    pattern, in the order of the log file, or of the timeline for several log files.
+    """
+    levels = None if level is None else LevelThreshold(level)
+    rids = _select(loader, levels, since, until, namespace, pattern, regex, ignore_case)
+    if since is None and until is None:
+        return rids
+
+    # The time range is only found with a binary search when the records are in chronological
+    # order, every record is checked, e.g. a record that was written out of order at the end
+
+    since = -math.inf if since is None else since
+    until = math.inf if until is None else until
+    return (rid for rid in rids if since <= loader.timeline_time(rid) < until)
+
+
+def _select(loader: Loader, levels: Optional[LevelThreshold], since: Optional[float], until: Optional[float],
+            namespace: Optional[str], pattern: Optional[str], regex: bool, ignore_case: bool) -> Iterator[int]:
+    """
+    Yields the ids of the records that pass the filters, the time range is only applied when the
+    records are in chronological order, with a binary search.
+    """
+    chronological = loader.is_chronological()
+    line = 0 if since is None or not chronological else loader.find_time(since)
+    end = None if until is None or not chronological else loader.find_time(until)
+
+    if pattern is not None:
+        search = loader.search(pattern, regex=regex, ignore_case=ignore_case)
+        while not search.is_done():
+            search.run(None)
+        line = loader.next_match(search, line - 1, +1, levels, namespace)
+        while line is not None and (end is None or line < end):
+            yield loader.record_ids(line, 0, 1, levels, namespace)[0][0]
+            line = loader.next_match(search, line, +1, levels, namespace)
+        return
+
+    while True:
+        rids, _ = loader.record_ids(line, 0, QUERY_PAGE_SIZE, levels, namespace)
+        if not rids:
+            return
+        for rid in rids:
+            if end is not None and loader.line_of_record(rid) >= end:
+                return
+            yield rid
+        line = loader.line_of_record(rids[-1]) + 1
+
+
+def format_raw(loader: Loader, rid: int) -> str:
+    """Returns the lines of the record as they are in the log file."""
+    return f"{loader.record_text(rid)}\n"
+
+
+def format_key_value(loader: Loader, rid: int) -> str:
+    """Returns the record in the key-value format of `log.LOG_FORMAT_KEY_VALUE`."""
+    record = loader.get_record(rid)
+    text = (
+        f"level={logging.getLevelName(record.level)} "
+        f"ts={_format_ts(record.created) or ''} "
+        f"process={record.process or ''} "
+        f"process_id={record.process_id or ''} "
+        f"caller={record.caller or ''} "
+        f"msg=\"{record.msg}\"\n"
+    )
+    return f"{text}{record.extra}\n" if record.extra else text
+
+
+def format_json(loader: Loader, rid: int) -> str:
+    """Returns the record as a JSON object on one line."""
+    record = loader.get_record(rid)
+    fields = {
+        "level": logging.getLevelName(record.level),
+        "ts": _format_ts(record.created),
+        "created": record.created,
+        "process": record.process,
+        "process_id": record.process_id,
+        "caller": record.caller,
+        "msg": record.msg,
+        "extra": record.extra,
+    }
+    if record.source:
+        fields["source"] = record.source
+    return f"{json.dumps(fields, ensure_ascii=False)}\n"
+
+
+def _format_ts(created: Optional[float]) -> Optional[str]:
+    """Returns the creation time in the format of `log.LOG_FORMAT_DATE`, None when the record has no time."""
+    return None if created is None else from_timestamp(created).strftime(LOG_FORMAT_DATE)
+
+
+OUTPUT_FORMATS = {
+    "raw": format_raw,
+    "key-value": format_key_value,
+    "json": format_json,
+}
+"""The output formats, the function returns the text for a record, including its newline."""
+
+
+def write_records(loader: Loader, rids: Iterator[int], out: TextIO,
+                  formatter: Callable[[Loader, int], str] = format_raw, limit: int = None) -> int:
+    """
+    Writes the records to the output stream in pages of `QUERY_PAGE_SIZE` records.
+
+    Returns:
+        The number of records that were written.
+    """
+    count = 0
+    rids = islice(rids, limit)
+    while True:
+        page = [formatter(loader, rid) for rid in islice(rids, QUERY_PAGE_SIZE)]
+        if not page:
+            return count
+        out.write("".join(page))
+        count += len(page)
+
+
+def _parse_time(text: str, loader: Loader) -> float:
+    """Returns the timestamp for the time, a time of the day is on the date of the first record."""
+    loaders = loader.loaders if isinstance(loader, MergedLoader) else [loader]
+    created = [each.lines.created(0) for each in loaders if each.record_count()]
+    created = [ts for ts in created if not math.isnan(ts)]
+    reference = from_timestamp(min(created)) if created else None
+    return parse_datetime(text, reference).timestamp()
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(
+        prog="textualog query",
+        description="Write the records of log files that match the filters to stdout",
+        formatter_class=argparse.RawTextHelpFormatter,
+    )
+
+    parser.add_argument(
+        "--log",
+        "-l",
+        type=str,
+        nargs="+",
+        required=True,
+        help="the full path to the log file, rotated log files compressed with gzip, bzip2, xz or zstd too,\n"
+             "the records of several log files or a glob pattern are merged into one timeline",
+    )
+
+    parser.add_argument(
+        "--format",
+        "-f",
+        choices=list(PARSERS),
+        default=None,
+        help="the format of the log files, by default the format is detected from the start of each log file",
+    )
+
+    parser.add_argument(
+        "--level",
+        type=str.upper,
+        choices=[level.name for level in LevelName],
+        default=None,
+        help="only the records with at least this level",
+    )
+
+    parser.add_argument(
+        "--since",
+        type=str,
+        default=None,
+        help="only the records created at or after this time, e.g. 2022-04-08T10:52 or 10:52:20,\n"
+             "a time of the day is on the date of the first record",
+    )
+
+    parser.add_argument(
+        "--until",
+        type=str,
+        default=None,
+        help="only the records created before this time",
+    )
+
+    parser.add_argument(
+        "--caller",
+        type=str,
+        default=None,
+        help="only the records from this namespace and its sub-namespaces, e.g. egse.system",
+    )
+
+    parser.add_argument(
+        "--grep",
+        type=str,
+        default=None,
+        help="only the records that contain this text",
+    )
+
+    parser.add_argument(
+        "--regex",
+        "-E",
+        action="store_true",
+        default=False,
+        help="the --grep text is a regular expression",
+    )
+
+    parser.add_argument(
+        "--ignore-case",
+        "-i",
+        action="store_true",
+        default=False,
+        help="ignore case for --grep",
+    )
+
+    parser.add_argument(
+        "--output",
+        "-o",
+        choices=list(OUTPUT_FORMATS),
+        default="raw",
+        help="write the records as they are in the log file (raw), as key-value lines or as JSON lines",
+    )
+
+    parser.add_argument(
+        "--limit",
+        "-n",
+        type=int,
+        default=None,
+        help="write at most this number of records",
+    )
+
+    parser.add_argument(
+        "--no-index-cache",
+        action="store_true",
+        default=False,
+        help="don't use or save the index of the log file, which makes querying a large log file again fast",
+    )
+
+    args = parser.parse_args(argv)
+
+    if args.regex and args.grep is not None:
+        try:
+            re.compile(args.grep)
+        except re.error as exc:
+            parser.error(f"invalid regular expression {args.grep!r}: {exc}")
+
+    filenames = expand_filenames(args.log)
+
+    for filename in filenames:
+        if not Path(filename).exists():
+            raise FileNotFoundError(f"No such file {filename}")
+
+    loader = open_loader(
+        filenames,
+        workers=os.cpu_count() or 1,
+        index_dir=None if args.no_index_cache else default_index_dir(),
+        parser=get_parser(args.format) if args.format else None,
+    )
+    loader.load()
+    loader.save_index()
+
+    try:
+        since = None if args.since is None else _parse_time(args.since, loader)
+        until = None if args.until is None else _parse_time(args.until, loader)
+    except ValueError as exc:
+        parser.error(f"invalid time: {exc}")
+
+    rids = select(
+        loader,
+        level=None if args.level is None else LevelName[args.level].value,
+        since=since,
+        until=until,
+        namespace=args.caller,
+        pattern=args.grep,
+        regex=args.regex,
+        ignore_case=args.ignore_case,
+    )
+
+    try:
+        count = write_records(loader, rids, sys.stdout, OUTPUT_FORMATS[args.output], args.limit)
+        sys.stdout.flush()
+    except BrokenPipeError:
+        # The reader stopped early, e.g. `| head`, Python would complain when it flushes stdout at exit
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    else:
+        MODULE_LOGGER.info(f"Query wrote {count} records")
+
+
+if __name__ == "__main__":
+    main()
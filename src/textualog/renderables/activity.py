@@ -0,0 +1,40 @@
+from typing import List
+
+from rich.text import Text
+
+from ..histogram import TimeHistogram
+from .logrecord import LevelColor
+from .logrecord import LevelName
+
+BARS = " ▁▂▃▄▅▆▇█"
+"""The characters of a sparkline, from no records to the highest number of records."""
+LABEL_WIDTH = 9
+"""The width of the level names in front of the sparklines."""
+
+
+def sparkline(counts: List[int]) -> str:
+    """
+    Returns a bar for each count, scaled to the highest count. A count that is not zero always
+    has a visible bar, so a single error in a busy log file is not lost.
+    """
+    highest = max(counts, default=0)
+    if not highest:
+        return BARS[0] * len(counts)
+    scale = (len(BARS) - 2) / highest
+    return "".join(BARS[1 + int(count * scale)] if count else BARS[0] for count in counts)
+
+
+def activity_chart(histogram: TimeHistogram, width: int) -> Text:
+    """
+    Returns a sparkline of the number of records over time for each logging level, the time span
+    of the log file is divided over the columns of the given width after the level names.
+    """
+    _, _, counts = histogram.columns(width - LABEL_WIDTH)
+
+    chart = Text(no_wrap=True, overflow="crop")
+    for level in LevelName:
+        chart.append(f"{level.name:<{LABEL_WIDTH}}", style="grey62")
+        chart.append(sparkline(counts.get(level.value, [])), style=LevelColor[level.name].value)
+        if level is not LevelName.CRITICAL:
+            chart.append("\n")
+    return chart
@@ -1,12 +1,26 @@
 import datetime
 import logging
-import time
+import re
+import sys
+from array import array
 from enum import Enum
+from functools import lru_cache
+from itertools import repeat
+from operator import add
+from operator import itemgetter
+from operator import truediv
+from typing import Optional
+from typing import Sequence
 from typing import Union
 
 import rich
 from rich.text import Text
 
+from ..log import LOG_FORMAT_DATE
+
+TIMESTAMP_WIDTH = 23
+"""The width of the timestamp column, e.g. `2022-04-08T10:52:20.371`."""
+
 
 class LevelColor(Enum):
     DEBUG = "white"
@@ -33,59 +47,96 @@ class LevelName(Enum):
 
 
 class LogRecord:
+    """
+    A logging record as it is displayed in the viewer.
+
+    The attributes are stored in slots and the process name, process ID and caller, which are
+    shared by many records, are interned. This keeps the memory footprint small when many
+    records are kept in the cache of the loader.
+    """
+
+    __slots__ = (
+        "msg", "level", "ts", "created", "process", "caller", "process_id", "selected", "extra", "source",
+    )
+
     def __init__(
             self,
             msg: str,
             level: int = logging.INFO,
-            created: float = None,
+            created: Optional[float] = None,
             ts: str = None,
             process: str = None,
             caller: str = None,
             process_id: int = None,
             selected: bool = False,
             extra: str = None,
-            **kwargs,
+            source: str = None,
     ):
         self.msg = msg
         self.level = level
         self.ts = ts
-        self.created = created or to_timestamp(self.ts) if self.ts else time.time()
-        self.process = process
-        self.caller = caller
-        self.process_id = process_id
+        self.created = created if created is not None else to_timestamp(self.ts) if self.ts else None
+        """The creation time as a POSIX timestamp, None when the record has no time."""
+        self.process = _intern(process)
+        self.caller = _intern(caller)
+        self.process_id = _intern(process_id)
         self.selected = selected
         self.extra = extra
+        self.source = _intern(source)
+        """The name of the log file, only set when several log files are merged."""
+
+    @property
+    def has_extra(self) -> bool:
+        """True when the record has extra information, e.g. a Traceback."""
+        return bool(self.extra)
 
     def __str__(self) -> str:
         text = (
             f"level={self.level} "
-            f"ts={format_datetime(datetime.datetime.fromtimestamp(self.created))} "
+            f"ts={'' if self.created is None else format_datetime(from_timestamp(self.created))} "
             f"msg=\"{self.msg}\""
         )
         return text
 
     def get_text(self) -> Text:
-        level = LevelName(self.level).name
-        color = LevelColorSelected[level].value if self.selected else LevelColor[level].value
+        name, color, selected_color = _LEVEL_STYLES[self.level]
         return Text(
-            f"{format_datetime(from_timestamp(self.created))} "
-            f"{LevelName(self.level).name:>8s}"
-            f"{'*' if self.extra else ' '}"
+            f"{_format_created(self.created)} "
+            f"{name:>8s}"
+            f"{'*' if self.has_extra else ' '}"
             f"{self.caller[:20]:<20s} "
             f"{self.msg}",
-            style=f"{color}"
+            style=selected_color if self.selected else color
         )
 
     def __rich__(self) -> Text:
-        color = LevelColor[LevelName(self.level).name].value
+        name, color, _ = _LEVEL_STYLES[self.level]
         return Text(
-            f"{format_datetime(from_timestamp(self.created))} "
-            f"{LevelName(self.level).name} "
+            f"{_format_created(self.created)} "
+            f"{name} "
             f"{self.msg}",
-            style=f"{color}"
+            style=color
         )
 
 
+_LEVEL_STYLES = {
+    level.value: (level.name, LevelColor[level.name].value, LevelColorSelected[level.name].value)
+    for level in LevelName
+}
+"""Maps the logging level to its name, color and color when selected, avoids the Enum lookups."""
+
+
+def _format_created(created: Optional[float]) -> str:
+    """Returns the creation time for the timestamp column, blank when the record has no time."""
+    if created is None:
+        return " " * TIMESTAMP_WIDTH
+    return format_datetime(from_timestamp(created))
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
 def format_datetime(dt: Union[str, datetime.datetime] = None, fmt: str = None, width: int = 6, precision: int = 3):
     """Format a datetime as YYYY-mm-ddTHH:MM:SS.μs+0000.
 
@@ -153,12 +204,71 @@ def format_datetime(dt: Union[str, datetime.datetime] = None, fmt: str = None, w
     return timestamp
 
 
+def parse_datetime(text: str, reference: datetime.datetime = None) -> datetime.datetime:
+    """
+    Returns the local time for a date and time given as text.
+
+    The text is a date and time in ISO format, like '2022-04-08T10:52:20' or '2022-04-08 10:52',
+    or only a time of the day, like '10:52' or '10:52:20,371'. When only the time is given, the
+    date is taken from the reference, which is now by default.
+
+    Raises:
+        A ValueError when the text is not understood.
+    """
+    text = text.strip().replace(',', '.')
+    try:
+        return datetime.datetime.fromisoformat(text)
+    except ValueError:
+        time_of_day = datetime.time.fromisoformat(text)
+    reference = reference or datetime.datetime.now()
+    return datetime.datetime.combine(reference.date(), time_of_day)
+
+
 def from_timestamp(ts: float):
     return datetime.datetime.fromtimestamp(ts)
 
 
-def to_timestamp(ts: str):
-    return datetime.datetime.strptime(ts, '%Y-%m-%dT%H:%M:%S,%f').timestamp()
+_is_standard_timestamp = re.compile(r"[0-9]{4}-[0-9]{2}-[0-9]{2}T[0-9]{2}:[0-9]{2}:[0-5][0-9],[0-9]{6}").fullmatch
+_minute = itemgetter(slice(0, 16))
+_second = itemgetter(slice(17, 19))
+_microsecond = itemgetter(slice(20, 26))
+
+
+@lru_cache(maxsize=4096)
+def _minute_timestamp(minute: str) -> int:
+    """Returns the timestamp for the local time 'YYYY-mm-ddTHH:MM' in whole seconds."""
+    dt = datetime.datetime(int(minute[:4]), int(minute[5:7]), int(minute[8:10]), int(minute[11:13]), int(minute[14:16]))
+    return int(dt.timestamp())
+
+
+def to_timestamp(ts: str) -> float:
+    """
+    Returns the POSIX timestamp for a local time in the `LOG_FORMAT_DATE` format.
+
+    The fields are sliced from their fixed positions and the date, hour and minute are converted
+    only once per minute. Timestamps with another layout, e.g. less than six digits for the
+    microseconds, are parsed with `datetime.strptime()`. The result is identical to
+    `datetime.datetime.strptime(ts, LOG_FORMAT_DATE).timestamp()`.
+    """
+    if _is_standard_timestamp(ts):
+        return (_minute_timestamp(ts[:16]) + int(ts[17:19])) + int(ts[20:26]) / 1e6
+    return datetime.datetime.strptime(ts, LOG_FORMAT_DATE).timestamp()
+
+
+def to_timestamps(timestamps: Sequence[str]) -> array:
+    """
+    Returns the POSIX timestamps for a sequence of local times in the `LOG_FORMAT_DATE` format.
+
+    This is the bulk version of `to_timestamp()` that is used when indexing a log file, the
+    conversion of each field is mapped over all timestamps at once.
+    """
+    if not all(map(_is_standard_timestamp, timestamps)):
+        return array('d', map(to_timestamp, timestamps))
+
+    seconds = map(add, map(_minute_timestamp, map(_minute, timestamps)), map(int, map(_second, timestamps)))
+    fractions = map(truediv, map(int, map(_microsecond, timestamps)), repeat(1e6))
+
+    return array('d', map(add, seconds, fractions))
 
 
 if __name__ == "__main__":
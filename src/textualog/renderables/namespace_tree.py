@@ -1,8 +1,10 @@
 from __future__ import annotations
 
+import asyncio
 from dataclasses import dataclass
-from functools import lru_cache
-from typing import Union
+from typing import Dict
+from typing import List
+from typing import Optional
 
 import rich
 from rich.console import RenderableType
@@ -16,29 +18,61 @@ from textual.widgets import TreeClick
 from textual.widgets import TreeControl
 from textual.widgets import TreeNode
 
+from ..cache import LRUCache
+from ..index import namespace_children
+from ..index import namespace_totals
+
+RENDER_CACHE_SIZE = 1024
+"""The number of rendered labels that are cached, a few screens of nodes in their different states."""
+
 
 @dataclass
 class NamespaceEntry:
-    name: dict
+    name: str
+    """The full dotted name of the namespace, the root of the tree is the empty string."""
     is_parent: bool
+    count: int = 0
+    """The number of records in the namespace and its sub-namespaces."""
 
     def __str__(self):
-        return f"{type(self.name)=}, {self.name=}, {self.is_parent=}"
+        return f"{self.name=}, {self.is_parent=}, {self.count=}"
 
 
 @rich.repr.auto
 class EntryClick(Message, bubble=True):
-    def __init__(self, sender: MessageTarget, key: Union[dict, str]) -> None:
+    def __init__(self, sender: MessageTarget, key: Optional[str]) -> None:
         self.key = key
+        """The namespace that was clicked, None for the root of the tree."""
         super().__init__(sender)
 
 
 class NamespaceTree(TreeControl[NamespaceEntry]):
-    def __init__(self, data: dict = None, name: str = None):
+    """
+    The tree of the namespaces in the log file, i.e. the modules in the `caller=` field of the
+    records, with the number of records for each namespace and its sub-namespaces. The tree is
+    built from the namespace counts of the loader and grows while the log file is indexed.
+
+    Log files can have thousands of namespaces, so the nodes of the sub-namespaces are only
+    created when a namespace is expanded, a hover only restyles the two nodes that change and
+    the rendered labels are kept in a bounded cache that is keyed by node id.
+    """
+
+    def __init__(self, name: str = None):
         label = "log"
-        data = NamespaceEntry(data, True)
+        data = NamespaceEntry("", True)
         super().__init__(label, name=name, data=data)
         self.root.tree.guide_style = "black"
+        self.root.loaded = True
+        self._namespace_nodes: Dict[str, TreeNode[NamespaceEntry]] = {"": self.root}
+        """The nodes that were created, only the sub-namespaces of expanded namespaces have a node."""
+        self._counts: Dict[str, int] = {}
+        self._totals: Dict[str, int] = {}
+        self._children: Dict[str, List[str]] = {}
+        self._hover_id: Optional[NodeID] = None
+        self._labels = LRUCache(RENDER_CACHE_SIZE)
+        """The rendered labels keyed by node id and the state of the node."""
+        self._update_lock = asyncio.Lock()
+        """Serialises the updates, adding a node awaits and the next update must see that node."""
 
     has_focus: Reactive[bool] = Reactive(False)
     mouse_over: Reactive[bool] = Reactive(False)
@@ -52,27 +86,34 @@ class NamespaceTree(TreeControl[NamespaceEntry]):
         self.has_focus = False
 
     async def watch_hover_node(self, hover_node: NodeID) -> None:
-        for node in self.nodes.values():
-            node.tree.guide_style = (
-                "bold not dim red" if node.id == hover_node else "black"
-            )
+        for node_id in {self._hover_id, hover_node}:
+            node = self.nodes.get(node_id)
+            if node is not None:
+                node.tree.guide_style = "bold not dim red" if node_id == hover_node else "black"
+        self._hover_id = hover_node
         self.refresh(layout=True)
 
     def render_node(self, node: TreeNode[NamespaceEntry]) -> RenderableType:
-        return self.render_tree_label(
-            node,
+        state = (
             node.data.is_parent,
+            node.data.count,
             node.expanded,
             node.is_cursor,
             node.id == self.hover_node,
             self.has_focus,
         )
+        key = (node.id, *state)
+        label = self._labels.get(key)
+        if label is None:
+            label = self.render_tree_label(node, *state)
+            self._labels.put(key, label)
+        return label
 
-    @lru_cache(maxsize=1024 * 32)
     def render_tree_label(
         self,
         node: TreeNode[NamespaceEntry],
         is_parent: bool,
+        count: int,
         expanded: bool,
         is_cursor: bool,
         is_hover: bool,
@@ -83,7 +124,7 @@ class NamespaceTree(TreeControl[NamespaceEntry]):
             "tree_node": node.id,
             "cursor": node.is_cursor,
         }
-        label = Text(node.label) if isinstance(node.label, str) else node.label
+        label = Text(node.label) if isinstance(node.label, str) else node.label.copy()
         if is_hover:
             label.stylize("underline")
         if is_parent:
@@ -101,32 +142,46 @@ class NamespaceTree(TreeControl[NamespaceEntry]):
             label.stylize("reverse")
 
         icon_label = Text(f"{icon} ", no_wrap=True, overflow="ellipsis") + label
+        icon_label.append(f" {count:,}", style="dim")
         icon_label.apply_meta(meta)
         return icon_label
 
     async def on_mount(self, event: events.Mount) -> None:
-        await self.load_tree(self.root)
-
-    async def load_tree(self, node: TreeNode[NamespaceEntry]):
-        try:
-            keys = sorted(node.data.name.keys())
-        except AttributeError:
-            keys = []
-        for key in keys:
-            is_dir = isinstance(node.data.name[key], dict)
-            await node.add(key, NamespaceEntry(node.data.name[key], is_dir))
+        await self.root.expand()
+
+    async def update_counts(self, counts: Dict[str, int]) -> None:
+        """
+        Updates the tree for the number of records in each namespace, see
+        `KeyValueLoader.namespace_counts()`. Only the nodes that were created are updated, new
+        namespaces get a node when their parent namespace was expanded before.
+        """
+        async with self._update_lock:
+            if counts == self._counts:
+                return
+            self._counts = counts
+            self._totals = namespace_totals(counts)
+            self._children = namespace_children(self._totals)
+
+            for name, node in list(self._namespace_nodes.items()):
+                node.data.count = self._totals.get(name, 0)
+                node.data.is_parent = name in self._children
+                if node.loaded:
+                    await self._add_children(node)
+            self.refresh(layout=True)
+
+    async def _add_children(self, node: TreeNode[NamespaceEntry]):
+        """Adds the nodes for the sub-namespaces of the node that don't have a node yet."""
+        for name in self._children.get(node.data.name, []):
+            if name not in self._namespace_nodes:
+                entry = NamespaceEntry(name, name in self._children, self._totals[name])
+                await node.add(name.rpartition(".")[2], entry)
+                self._namespace_nodes[name] = node.children[-1]
         node.loaded = True
-        await node.expand()
-        self.refresh(layout=True)
 
     async def handle_tree_click(self, message: TreeClick[NamespaceEntry]) -> None:
         namespace_entry = message.node.data
-        if not namespace_entry.is_parent:
-            await self.emit(EntryClick(self, namespace_entry.name))
-        else:
-            await self.emit(EntryClick(self, namespace_entry.name))
+        await self.emit(EntryClick(self, namespace_entry.name or None))
+        if namespace_entry.is_parent:
             if not message.node.loaded:
-                await self.load_tree(message.node)
-                await message.node.expand()
-            else:
-                await message.node.toggle()
+                await self._add_children(message.node)
+            await message.node.toggle()
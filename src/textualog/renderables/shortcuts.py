@@ -16,8 +16,11 @@ class Shortcuts:
             "navigate": f"{UP} {DOWN} {HOME} {END} {PAGE_UP} {PAGE_DOWN}",
             "close dialog": Keys.Escape,
             "quit": f"{Keys.ControlC} or q",
-            "Show Namespaces": "n",
+            "Show Namespaces": "t",
             "Follow (reload)": "f",
+            "Go to time": "g",
+            "Search": "/",
+            "Next/previous match": "n N",
         },
         "Toggle Logging Levels": {
             "DEBUG mode": "d",
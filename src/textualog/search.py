@@ -0,0 +1,168 @@
+"""
+Full-text search over an indexed log file.
+
+The search runs directly on the bytes of the memory mapped log file, or the decompressed content
+of a compressed log file, no lines are decoded and no LogRecords are created. A match is mapped
+to its record with the line and record index, and the search continues at the start of the next
+record, so the Python work is proportional to the number of matching records, not to the size of
+the file. The result is a sorted array of the
+ids of the matching records.
+"""
+import logging
+import re
+import threading
+from array import array
+from bisect import bisect_left
+from bisect import bisect_right
+from typing import Collection
+from typing import Optional
+
+from .compressed import CompressedData
+from .index import IndexSnapshot
+from .index import LineIndex
+
+SEARCH_CHUNK_SIZE = 16 * 1024 * 1024
+"""The number of bytes that are searched in one call to `Search.run()`."""
+
+MODULE_LOGGER = logging.getLogger("Textual.search")
+
+
+class Search:
+    """
+    Searches the records of a log file for a substring or a regular expression.
+
+    The search is incremental, every call to `run()` searches the next chunk of the file, so the
+    search can run in a worker thread and report matches while it progresses. When the log file
+    grows, the next call to `run()` searches the new records. Every call searches one snapshot of
+    the index, so the search doesn't block indexing.
+    """
+
+    def __init__(self, index: LineIndex, pattern: str, regex: bool = False, ignore_case: bool = False,
+                 lock: threading.RLock = None):
+        self.pattern = pattern
+        self._index = index
+        self._lock = lock or threading.RLock()
+        self._find = self._compile(pattern, regex, ignore_case)
+        self._resets = index.resets
+        self._position = 0
+        """The byte offset where the search continues."""
+        self._searched = 0
+        """The number of indexed bytes that were searched, a last line that is not complete is searched again."""
+        self.matches = array('Q')
+        """The sorted ids of the records that match."""
+
+    @staticmethod
+    def _compile(pattern: str, regex: bool, ignore_case: bool):
+        """Returns a function (data, start, end) -> the offset of the first match or -1."""
+        needle = pattern.encode()
+        if not regex and not ignore_case:
+            return lambda data, start, end: data.find(needle, start, end)
+
+        flags = re.MULTILINE | (re.IGNORECASE if ignore_case else 0)
+        search = re.compile(needle if regex else re.escape(needle), flags).search
+
+        def find(data, start: int, end: int) -> int:
+            match = search(data, start, end)
+            return -1 if match is None else match.start()
+
+        return find
+
+    def is_done(self) -> bool:
+        """Returns True when all the indexed records have been searched."""
+        snapshot = self._index.snapshot()
+        return self._searched >= snapshot.indexed and self._resets == snapshot.resets
+
+    def run(self, max_bytes: Optional[int] = SEARCH_CHUNK_SIZE) -> int:
+        """
+        Searches the next chunk of the log file, at most `max_bytes` of the part that is indexed.
+
+        Returns:
+            The number of new matching records.
+        """
+        with self._lock:
+            index = self._index.snapshot()
+            if self._resets != index.resets:
+                MODULE_LOGGER.info("The log file was truncated or rotated, restarting the search.")
+                self._resets = index.resets
+                self._position = self._searched = 0
+                self.matches = array('Q')
+
+            data = index.data
+            matches = self.matches
+            nr_matches = len(matches)
+
+            indexed = index.indexed
+            end = indexed if max_bytes is None else min(indexed, self._position + max_bytes)
+            if end < indexed:
+                # Stop at the start of a line, so a match is never split over two chunks
+                line = index.line_at(end)
+                if index.byte_offset(line) > self._position:
+                    end = index.byte_offset(line)
+                else:
+                    end = index.byte_offset(line + 1)  # a single line that is larger than the chunk
+
+            # A regular expression needs a buffer, the decompressed chunk of a compressed log file
+            # is copied once, positions in the chunk are relative to base.
+
+            base = 0
+            if isinstance(data, CompressedData):
+                base, data = self._position, data[self._position:end]
+
+            pos = self._position
+            while pos < end:
+                found = self._find(data, pos - base, end - base)
+                if found == -1:
+                    break
+                found += base
+                line = index.line_at(found)
+                rid = index.record_of_line(line)
+                if rid < 0:
+                    pos = index.byte_offset(line + 1)
+                    continue
+                # When the file grows, lines can be added to the last record that already matched
+                if not matches or rid > matches[-1]:
+                    matches.append(rid)
+                pos = index.byte_offset(index.record_lines(rid)[1])
+
+            self._position = max(pos, end)
+            self._searched = end
+
+            # The last line might not have been completely written, the rest of it can match
+            if end == indexed and indexed and index.data[indexed - 1:indexed] != b"\n":
+                self._position = min(self._position, index.byte_offset(len(index) - 1))
+
+            return len(self.matches) - nr_matches
+
+    def __len__(self) -> int:
+        """Returns the number of matching records that were found so far."""
+        return len(self.matches)
+
+    def next(self, rid: int, levels: Optional[Collection[int]] = None,
+             namespaces: Optional[Collection[str]] = None) -> Optional[int]:
+        """
+        Returns the id of the first matching record after record `rid` that has one of the levels
+        and comes from one of the namespaces.
+        """
+        index = self._index.snapshot()
+        for idx in range(bisect_right(self.matches, rid), len(self.matches)):
+            if self._passes(index, self.matches[idx], levels, namespaces):
+                return self.matches[idx]
+        return None
+
+    def previous(self, rid: int, levels: Optional[Collection[int]] = None,
+                 namespaces: Optional[Collection[str]] = None) -> Optional[int]:
+        """
+        Returns the id of the last matching record before record `rid` that has one of the levels
+        and comes from one of the namespaces.
+        """
+        index = self._index.snapshot()
+        for idx in range(bisect_left(self.matches, rid) - 1, -1, -1):
+            if self._passes(index, self.matches[idx], levels, namespaces):
+                return self.matches[idx]
+        return None
+
+    @staticmethod
+    def _passes(index: IndexSnapshot, rid: int, levels: Optional[Collection[int]],
+                namespaces: Optional[Collection[str]]) -> bool:
+        return ((levels is None or index.level_of(rid) in levels)
+                and (namespaces is None or index.in_namespaces(rid, namespaces)))
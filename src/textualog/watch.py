@@ -0,0 +1,142 @@
+"""
+Change notification for the log files that are followed.
+
+On Linux, the directories of the log files are watched with inotify, so a change is noticed as
+soon as it is written, also when a log file is rotated or created. Elsewhere, or when inotify is
+not available, the files are polled with an adaptive interval: `POLL_MIN` while the files keep
+changing, doubling up to `POLL_MAX` while they are idle.
+
+The watcher runs on the asyncio loop of the app, there is no thread involved.
+"""
+import asyncio
+import ctypes
+import ctypes.util
+import logging
+import os
+import struct
+import sys
+from typing import List
+from typing import Optional
+from typing import Set
+from typing import Tuple
+
+POLL_MIN = 0.05
+"""The polling interval in seconds while the log files are changing."""
+POLL_MAX = 1.0
+"""The longest polling interval in seconds, also the fallback interval with inotify."""
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+"""The inotify events on a directory that can change one of the log files in it."""
+IN_EVENT = struct.Struct("iIII")
+"""The header of an inotify event: watch descriptor, mask, cookie and length of the name."""
+
+MODULE_LOGGER = logging.getLogger("Textual.watch")
+
+
+class FileWatcher:
+    """Waits for changes to a number of files."""
+
+    def __init__(self, filenames: List[str], use_inotify: bool = True):
+        self.filenames = [os.path.abspath(filename) for filename in filenames]
+        self._use_inotify = use_inotify and sys.platform.startswith("linux")
+        self._inotify: Optional[_Inotify] = None
+        self._changed: Optional[asyncio.Event] = None
+        """Set by the inotify reader when one of the files changed."""
+        self._interval = POLL_MIN
+        self._state = self._stat()
+
+    async def wait(self):
+        """Returns when one of the files changed since the previous call."""
+        if self._use_inotify and self._changed is None:
+            self._start_inotify()
+
+        while True:
+            if self._changed is not None:
+                try:
+                    await asyncio.wait_for(self._changed.wait(), POLL_MAX)
+                except asyncio.TimeoutError:
+                    pass
+                self._changed.clear()
+            else:
+                await asyncio.sleep(self._interval)
+
+            state = self._stat()
+            if state != self._state:
+                self._state = state
+                self._interval = POLL_MIN
+                return
+            self._interval = min(2 * self._interval, POLL_MAX)
+
+    def _start_inotify(self):
+        self._use_inotify = False  # only try once
+        try:
+            self._inotify = _Inotify(self.filenames)
+        except OSError as exc:
+            MODULE_LOGGER.info(f"Can not use inotify, polling the log files instead: {exc}")
+            return
+        self._changed = asyncio.Event()
+        asyncio.get_running_loop().add_reader(self._inotify.fd, self._on_inotify)
+
+    def _on_inotify(self):
+        if self._inotify.read():
+            self._changed.set()
+
+    def _stat(self) -> List[Optional[Tuple[int, int, int]]]:
+        """Returns the inode, size and modification time of each file, None when it doesn't exist."""
+        state = []
+        for filename in self.filenames:
+            try:
+                stat = os.stat(filename)
+            except OSError:
+                state.append(None)
+            else:
+                state.append((stat.st_ino, stat.st_size, stat.st_mtime_ns))
+        return state
+
+    def close(self):
+        if self._inotify is not None:
+            asyncio.get_running_loop().remove_reader(self._inotify.fd)
+            self._inotify.close()
+            self._inotify = None
+            self._changed = None
+
+
+class _Inotify:
+    """The inotify watches on the directories of the files, through the C library."""
+
+    def __init__(self, filenames: List[str]):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._names: Set[bytes] = {os.fsencode(os.path.basename(filename)) for filename in filenames}
+        for directory in {os.path.dirname(filename) for filename in filenames}:
+            if libc.inotify_add_watch(self.fd, os.fsencode(directory), IN_MASK) < 0:
+                errno = ctypes.get_errno()
+                self.close()
+                raise OSError(errno, f"inotify_add_watch failed for {directory}")
+
+    def read(self) -> bool:
+        """Reads the pending events, returns True when one of them is about one of the files."""
+        changed = False
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return changed
+            pos = 0
+            while pos < len(data):
+                _, _, _, length = IN_EVENT.unpack_from(data, pos)
+                pos += IN_EVENT.size
+                name = data[pos:pos + length].rstrip(b'\0')
+                pos += length
+                changed = changed or name in self._names
+
+    def close(self):
+        os.close(self.fd)
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+from typing import Optional
+
+from rich.panel import Panel
+from textual import events
+from textual._types import MessageTarget
+from textual.message import Message
+from textual.widget import Widget
+
+from .. import styles
+from ..histogram import TimeHistogram
+from ..renderables.activity import LABEL_WIDTH
+from ..renderables.activity import activity_chart
+from ..renderables.logrecord import from_timestamp
+
+PANEL_SIZE = 7
+
+
+class BucketClick(Message, bubble=True):
+    def __init__(self, sender: MessageTarget, timestamp: float) -> None:
+        self.timestamp = timestamp
+        """The start time of the column that was clicked."""
+        super().__init__(sender)
+
+
+class Activity(Widget):
+    """
+    The number of records per logging level over the time span of the log file, as a sparkline
+    for each level. Clicking a column shows the records from the start of that column.
+
+    The chart is drawn from a `TimeHistogram`, which is kept up to date by the loader from the
+    index, so drawing it doesn't look at any record.
+    """
+
+    def __init__(self, name: str | None = None):
+        super().__init__(name=name)
+        self.histogram: Optional[TimeHistogram] = None
+
+    async def on_mount(self) -> None:
+        self.layout_size = PANEL_SIZE
+
+    def set(self, histogram: TimeHistogram):
+        self.histogram = histogram
+        self.refresh()
+
+    async def on_click(self, event: events.Click) -> None:
+        if self.histogram is None or not len(self.histogram):
+            return
+        start, width, counts = self.histogram.columns(self._chart_width - LABEL_WIDTH)
+        column = event.x - 1 - LABEL_WIDTH  # the chart is in a Panel with a border
+        if 0 <= column < len(counts[min(counts)]):
+            await self.emit(BucketClick(self, start + column * width))
+
+    def render(self) -> Panel:
+        histogram = self.histogram or TimeHistogram()
+
+        return Panel(
+            activity_chart(histogram, self._chart_width),
+            title=f"[bold]Activity[/]{self._time_span(histogram)}",
+            border_style=styles.BORDER,
+            box=styles.BOX,
+            title_align="left",
+            padding=0,
+        )
+
+    @property
+    def _chart_width(self) -> int:
+        width = self.size.width or self.console.size.width
+        return max(width - 2, LABEL_WIDTH + 1)
+
+    def _time_span(self, histogram: TimeHistogram) -> str:
+        if not len(histogram):
+            return ""
+        start, width, counts = histogram.columns(self._chart_width - LABEL_WIDTH)
+        end = start + width * len(counts[min(counts)])
+        return f" {from_timestamp(start):%Y-%m-%d %H:%M} → {from_timestamp(end):%Y-%m-%d %H:%M}"
@@ -41,6 +41,8 @@ class Details(Widget):
         record.append(f"process ID = {self.record.process_id}\n")
         record.append(f"caller     = {self.record.caller}\n")
         record.append(f"msg        = {self.record.msg}\n")
+        if self.record.source:
+            record.append(f"source     = {self.record.source}\n")
         record.append(f"extra      = {self.record.extra}\n")
 
         return record
@@ -1,6 +1,9 @@
+from typing import Optional
+
 from rich.align import Align
 from rich.columns import Columns
 from rich.padding import Padding
+from rich.text import Text
 from textual.reactive import Reactive
 from textual.widgets import Footer
 
@@ -9,6 +12,10 @@ class Footer(Footer):
 
     log_size = Reactive(0)
     log_offset = Reactive(0)
+    indexed_bytes = Reactive(0)
+    file_bytes = Reactive(0)
+    prompt: Reactive[Optional[str]] = Reactive(None)
+    search_status = Reactive("")
 
     def on_mount(self) -> None:
         self.layout_size = 1
@@ -16,10 +23,28 @@ class Footer(Footer):
     def render(self) -> Columns:
         log_size_text = Align.right(
             Padding(
-                f"at {self.log_offset} in [bold]{self.log_size}[/] lines", pad=(0, 1, 0, 1),
+                f"{self.search_status}at {self.log_offset} in [bold]{self.log_size}[/] lines{self._indexing()}",
+                pad=(0, 1, 0, 1),
                 style="white on dark_green",
                 expand=False,
             )
         )
 
+        if self.prompt is not None:
+            prompt_text = Text(f" {self.prompt}\u2588", style="bold white on dark_blue", no_wrap=True, end="")
+            return Columns([prompt_text, log_size_text], expand=True)
+
         return Columns([super().render(), log_size_text], expand=True)
+
+    def _indexing(self) -> str:
+        if self.indexed_bytes >= self.file_bytes:
+            return ""
+        return f", indexed {_format_size(self.indexed_bytes)} of {_format_size(self.file_bytes)}"
+
+
+def _format_size(size: int) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            break
+        size /= 1024
+    return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
@@ -1,4 +1,5 @@
 import logging
+from typing import Dict
 
 from rich.panel import Panel
 from rich.table import Table
@@ -19,6 +20,7 @@ class Levels(Widget):
     warning_level: Reactive = Reactive(True)
     error_level: Reactive = Reactive(True)
     critical_level: Reactive = Reactive(True)
+    counts: Reactive[Dict[int, int]] = Reactive({})
 
     async def on_mount(self) -> None:
         self.layout_size = PANEL_SIZE
@@ -27,12 +29,13 @@ class Levels(Widget):
         table = Table(box=None, expand=False, show_header=False, show_edge=False)
         table.add_column()
         table.add_column()
+        table.add_column(justify="right", style="grey62")
 
-        table.add_row(CHECK if self.debug_level else UNCHECK, "DEBUG")
-        table.add_row(CHECK if self.info_level else UNCHECK, "INFO")
-        table.add_row(CHECK if self.warning_level else UNCHECK, "WARNING")
-        table.add_row(CHECK if self.error_level else UNCHECK, "ERROR")
-        table.add_row(CHECK if self.critical_level else UNCHECK, "CRITICAL")
+        table.add_row(CHECK if self.debug_level else UNCHECK, "DEBUG", self._count(logging.DEBUG))
+        table.add_row(CHECK if self.info_level else UNCHECK, "INFO", self._count(logging.INFO))
+        table.add_row(CHECK if self.warning_level else UNCHECK, "WARNING", self._count(logging.WARNING))
+        table.add_row(CHECK if self.error_level else UNCHECK, "ERROR", self._count(logging.ERROR))
+        table.add_row(CHECK if self.critical_level else UNCHECK, "CRITICAL", self._count(logging.CRITICAL))
 
         panel = Panel(
             table,
@@ -45,6 +48,9 @@ class Levels(Widget):
 
         return panel
 
+    def _count(self, level: int) -> str:
+        return f"{self.counts[level]:,}" if level in self.counts else ""
+
     def is_on(self, level: int):
         if level == logging.DEBUG:
             return self.debug_level
@@ -6,9 +6,8 @@ from textualog.renderables.namespace_tree import NamespaceTree
 
 
 class Namespaces(NamespaceTree):
-    def __init__(self, name=None, data: dict = None):
-        self.tree: dict = data
-        super().__init__(name=name, data=data)
+    def __init__(self, name=None):
+        super().__init__(name=name)
 
     def render(self) -> RenderableType:
         panel = Panel(
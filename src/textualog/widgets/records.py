@@ -1,8 +1,11 @@
 from __future__ import annotations
 
 import contextlib
+import logging
+from typing import TYPE_CHECKING
 from typing import List
 from typing import Optional
+from typing import Tuple
 
 from rich.console import ConsoleRenderable
 from rich.panel import Panel
@@ -12,23 +15,57 @@ from textual.reactive import Reactive
 from textual.widget import Widget
 
 from .. import styles
+from ..cache import LRUCache
+from ..renderables.logrecord import LevelName
 from ..renderables.logrecord import LogRecord
+from ..system import timer
+from .levels import Levels
+
+if TYPE_CHECKING:
+    from ..loader import KeyValueLoader
 
 PANEL_SIZE = 10
+RENDER_CACHE_SIZE = 1024
+"""The number of rendered lines that are cached, a few screens of records."""
+PREFETCH = 50
+"""The number of record ids that are fetched before and after the visible records."""
 
 
 class Records(Widget):
+    """
+    A virtual list of the records in the log file.
+
+    The widget doesn't keep a list of records, it holds a window with the ids of the visible
+    records plus a margin of `PREFETCH` record ids before and after them. The records are fetched
+    from the loader when they are rendered. Scrolling within the window only moves the position
+    of the first visible record in the window, the window is fetched again from the index of the
+    loader when scrolling beyond it, so memory and the cost per frame don't depend on the size of
+    the log file.
+    """
 
     height: Reactive[int | None] = Reactive(None)
 
     def __init__(self, height: int | None = None):
         super().__init__()
         self.height = height
-        self.records: List[LogRecord] = [
-            # LogRecord(level=logging.INFO,
-            #           msg="The log messages will be displayed here as a list or table.")
-        ]
-        self._selected_idx: Optional[int] = None
+        self.loader: Optional[KeyValueLoader] = None
+        self.levels: Optional[Levels] = None
+        self.namespace: Optional[str] = None
+        """Only records from this namespace and its sub-namespaces are shown, None shows all records."""
+        self._window: List[int] = []
+        """The ids of the visible records plus the prefetched record ids around them."""
+        self._top = 0
+        """The position of the first visible record in the window."""
+        self._at_end = True
+        """True when the window includes the last record of the log file."""
+        self._window_key: Optional[Tuple] = None
+        """The state of the loader and the levels when the window was fetched."""
+        self._top_line = 0
+        """The line number of the first visible record, or of the position in an empty window."""
+        self._selected: Optional[LogRecord] = None
+        """The selected record, it stays selected while scrolling as records are cached."""
+        self._lines = LRUCache(RENDER_CACHE_SIZE)
+        """The rendered lines keyed by (record, selected, width), only changed lines are rendered."""
 
     async def on_mount(self) -> None:
         # self.layout_size = PANEL_SIZE
@@ -37,18 +74,27 @@ class Records(Widget):
 
     async def on_click(self, event: events.Click) -> None:
 
-        if self._selected_idx is not None:
-            self.records[self._selected_idx].selected = False
-
         idx = event.y - 1  # Records is a Panel with the header as the first line
 
         with contextlib.suppress(IndexError):
             record = self.records[idx]
             self.app.record_info.set(record)
+            if self._selected is not None:
+                self._selected.selected = False
             record.selected = True
-            self._selected_idx = idx
+            self._selected = record
             self.refresh(repaint=True)
 
+    async def on_mouse_scroll_down(self, event: events.MouseScrollDown) -> None:
+        self.scroll(+1)
+        self.app.footer.log_offset = self.top_line
+        self.refresh(repaint=True)
+
+    async def on_mouse_scroll_up(self, event: events.MouseScrollUp) -> None:
+        self.scroll(-1)
+        self.app.footer.log_offset = self.top_line
+        self.refresh(repaint=True)
+
     def render(self) -> Panel:
         return Panel(
             self._generate_renderable(),
@@ -60,18 +106,108 @@ class Records(Widget):
             height=self.height,
         )
 
-    def replace(self, records: List[LogRecord]):
-        self.records = records
-        self._selected_idx = None
-
-    def update(self, records: List[LogRecord]):
-        self.records.extend(records)
-        self._selected_idx = None
-
+    def attach(self, loader: KeyValueLoader, levels: Levels = None):
+        """Shows the records of the loader, filtered by the levels, starting at the first record."""
+        self.loader = loader
+        self.levels = levels
+        self.show(0)
+
+    @property
+    def page_size(self) -> int:
+        """
+        The number of records that fit in the panel. Before the layout is known, this is based on
+        the height that was given or on the terminal height.
+        """
+        height = self.size.height or self.height
+        return max(height - 2 if height else self.console.size.height, 1)
+
+    @property
+    def top_line(self) -> int:
+        """The line number of the first visible record."""
+        return self._top_line
+
+    @property
+    def records(self) -> List[LogRecord]:
+        """The visible records."""
+        if self.loader is None:
+            return []
+        if self._is_stale():
+            self.show(self._top_line)
+        return [self.loader.get_record(rid) for rid in self._window[self._top:self._top + self.page_size]]
+
+    def show(self, line: int):
+        """Shows the records starting from the record at or after the given line number."""
+        if self.loader is None:
+            return
+        page_size = self.page_size
+        count = self.loader.record_count()  # before fetching, the log file is indexed in the background
+        self._window, self._top = self.loader.record_ids(
+            line, PREFETCH, page_size + PREFETCH, self.levels, self.namespace)
+        self._at_end = len(self._window) - self._top < page_size + PREFETCH
+        self._window_key = self._key(self._at_end, count)
+        if self._top < len(self._window):
+            self._top_line = self.loader.line_of_record(self._window[self._top])
+        else:
+            self._top_line = self.loader.size()
+
+    def scroll(self, count: int):
+        """
+        Scrolls `count` records down, or up for a negative count. Only records that pass the levels
+        are counted. The window is fetched again when the new position is outside the window.
+        """
+        if self.loader is None:
+            return
+        if self._is_stale():
+            self.show(self._top_line)
+
+        top = self._top + count
+        if 0 <= top < len(self._window) and (top + self.page_size <= len(self._window) or self._at_end):
+            self._top = top
+            self._top_line = self.loader.line_of_record(self._window[top])
+        else:
+            self.show(self.loader.seek(self._top_line, count, self.levels, self.namespace))
+
+    def scroll_to_end(self):
+        """Shows the last page of records."""
+        if self.loader is not None:
+            self.show(self.loader.seek(self.loader.size(), -self.page_size, self.levels, self.namespace))
+
+    def _key(self, at_end: bool, count: int = None) -> Tuple:
+        """Returns the state of the loader, the levels and the namespace that the window depends on."""
+        levels = self.levels
+        enabled = None if levels is None else tuple(levels.is_on(level.value) for level in LevelName)
+        # Records that are added to the log file only change a window that shows the end
+        count = (self.loader.record_count() if count is None else count) if at_end else None
+        return self.loader.resets, enabled, self.namespace, count
+
+    def _is_stale(self) -> bool:
+        """
+        Returns True when the window must be fetched again: the log file was reset, the levels
+        or the namespace changed, records were added while the window shows the end of the log file or the
+        panel became higher than the window.
+        """
+        if not self._at_end and self._top + self.page_size > len(self._window):
+            return True
+        return self._key(self._at_end) != self._window_key
+
+    @timer(level=logging.DEBUG)
     def _generate_renderable(self) -> ConsoleRenderable:
-        text = Text(no_wrap=True)
-        [
-            text.append(record.get_text()).append("\n")
-            for record in self.records
-        ]
-        return text
+        width = max(self.size.width - 2, 0) or None  # inside the borders of the panel
+        records = self.records
+        text = Text("\n", no_wrap=True).join(self._render_line(record, width) for record in records)
+        return text.append("\n") if records else text
+
+    def _render_line(self, record: LogRecord, width: Optional[int]) -> Text:
+        """
+        Returns the rendered line for the record from the cache. The records are the cached
+        records of the loader, a record that was parsed again is a new object and is rendered
+        again. The line is cropped to the width of the panel.
+        """
+        key = (record, record.selected, width)
+        line = self._lines.get(key)
+        if line is None:
+            line = record.get_text()
+            if width:
+                line.truncate(width)
+            self._lines.put(key, line)
+        return line